@@ -0,0 +1,187 @@
+"""
+CS 375
+Batch position analysis with the Othello search engines.
+
+Searches every position of a file to a fixed depth or for a fixed time,
+across a pool of worker processes, and writes one JSON line per position
+with the best move, score, depth, principal variation, nodes and seconds.
+Results come out in the order of the input, each as soon as it and every
+position before it are done. Only a bounded window of positions is in
+flight at a time, so files of any size stream through in constant memory.
+
+A position file has one position per line: 64 squares row by row, X for
+black, O for white and - for empty (x, o, B, W and . work too), then the
+player to move as X or O (or black or white). A player to move who has to
+pass is replaced by the other player. Anything after that, blank lines and
+lines starting with # are ignored:
+
+    ---------------------------OX------XO--------------------------- X
+
+    python analysis.py positions.txt --depth 8
+    python analysis.py positions.txt --seconds 2 --workers 4 --output results.jsonl
+
+Moves are written as [r, c] pairs. A line that is not a position gets a
+result with an error message instead.
+"""
+
+import argparse, collections, json, multiprocessing, os, sys
+
+from instrumentation import principal_variation
+from othello import OthelloState, opposite_color
+from project2 import AlphaBetaPlayer, OldTournamentPlayer, TournamentPlayer, PatternPlayer
+
+# Players whose engine can analyze, by name
+ANALYZERS = {
+    'AlphaBetaPlayer': AlphaBetaPlayer,
+    'OldTournamentPlayer': OldTournamentPlayer,
+    'TournamentPlayer': TournamentPlayer,
+    'PatternPlayer': PatternPlayer,
+}
+
+BLACK_SQUARES = 'XxBb'
+WHITE_SQUARES = 'OoWw'
+EMPTY_SQUARES = '-.'
+SIDES = {'x': 'black', 'b': 'black', 'black': 'black',
+         'o': 'white', 'w': 'white', 'white': 'white'}
+
+# Positions in flight per worker
+WINDOW_PER_WORKER = 4
+
+
+def parse_position(line):
+    """The OthelloState written on line; raises ValueError if it isn't a
+    position. If the player to move has to pass, the other player is to
+    move instead, as in the states make_move leaves."""
+    words = line.split()
+    if len(words) < 2 or len(words[0]) != 64:
+        raise ValueError("expected 64 squares and the player to move")
+    board, side = words[0], words[1].lower()
+    if side not in SIDES:
+        raise ValueError("unknown player to move {!r}".format(words[1]))
+
+    black = white = 0
+    for sq, square in enumerate(board):
+        if square in BLACK_SQUARES:
+            black |= 1 << sq
+        elif square in WHITE_SQUARES:
+            white |= 1 << sq
+        elif square not in EMPTY_SQUARES:
+            raise ValueError("unknown square {!r}".format(square))
+
+    move_number = max(0, bin(black | white).count('1') - 4)
+    state = OthelloState.from_bitboards(black, white, SIDES[side], move_number)
+    if not state.available_moves():
+        other = OthelloState.from_bitboards(black, white, opposite_color(SIDES[side]), move_number)
+        if other.available_moves():
+            return other
+    return state
+
+
+def read_positions(lines):
+    """Generates the position lines of lines, skipping blanks and comments."""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+class Analyzer():
+    """Searches positions with the engine of an EnginePlayer class, to
+    depth or for seconds, whichever is set."""
+
+    def __init__(self, player_class, depth=None, seconds=None, pv_length=16):
+        self.player = player_class('black')
+        self.depth = depth
+        self.seconds = seconds
+        self.pv_length = pv_length
+
+    def analyze(self, line):
+        """The result dict for one position line."""
+        try:
+            state = parse_position(line)
+        except ValueError as error:
+            return {'position': line, 'error': str(error)}
+
+        root = self.player.STATE_CLASS.from_state(state)
+        engine = self.player.engine
+        max_depth = self.depth if self.depth is not None else self.player.MAX_DEPTH
+        result = engine.search(root, max_depth, time_limit=self.seconds)
+        return {'position': line,
+                'player': root.current,
+                'move': result.move.pair if result.move is not None else None,
+                'score': result.score,
+                'depth': result.depth,
+                'pv': principal_variation(root, engine.table, self.pv_length),
+                'nodes': result.nodes,
+                'seconds': result.elapsed}
+
+
+# Set in each worker process by _start_worker
+_analyzer = None
+
+
+def _start_worker(name, depth, seconds, pv_length):
+    """Pool initializer: builds this worker's Analyzer."""
+    global _analyzer
+    _analyzer = Analyzer(ANALYZERS[name], depth, seconds, pv_length)
+
+
+def _analyze(line):
+    return _analyzer.analyze(line)
+
+
+def analyze_positions(lines, name='TournamentPlayer', depth=None, seconds=None, workers=1,
+                      pv_length=16):
+    """Generates a result dict for each position line of lines, in order.
+    With workers > 1 the searches run in a process pool, with at most
+    WINDOW_PER_WORKER positions per worker read ahead."""
+    lines = read_positions(lines)
+    if workers <= 1:
+        analyzer = Analyzer(ANALYZERS[name], depth, seconds, pv_length)
+        for line in lines:
+            yield analyzer.analyze(line)
+        return
+
+    # Pool.imap would read all of lines up front, so keep a window of
+    # pending results and always hand back the oldest first
+    with multiprocessing.Pool(workers, _start_worker, (name, depth, seconds, pv_length)) as pool:
+        pending = collections.deque()
+        for line in lines:
+            pending.append(pool.apply_async(_analyze, (line,)))
+            if len(pending) >= workers * WINDOW_PER_WORKER:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a file of positions.")
+    parser.add_argument('positions', help="position file, or - for standard input")
+    parser.add_argument('--player', choices=sorted(ANALYZERS), default='TournamentPlayer',
+                        help="player whose engine and evaluation to use")
+    parser.add_argument('--depth', type=int, help="search each position to this depth")
+    parser.add_argument('--seconds', type=float, help="search each position this long")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--pv', type=int, default=16, help="longest principal variation")
+    parser.add_argument('--output', help="write the JSON lines here instead of to stdout")
+    args = parser.parse_args()
+    if args.depth is None and args.seconds is None:
+        parser.error("give --depth, --seconds or both")
+
+    source = sys.stdin if args.positions == '-' else open(args.positions)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in analyze_positions(source, args.player, args.depth, args.seconds,
+                                        args.workers or os.cpu_count() or 1, args.pv):
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+CS 375
+Benchmark suite for the Othello board game and players.
+
+Runs perft (the number of leaves of the game tree to a fixed depth) from the
+start position and from fixed midgame and endgame positions, checking each
+count against its known value, then micro-benchmarks of move generation,
+make/unmake and evaluation, then fixed-depth searches of each player class
+reporting nodes per second and the time each depth was reached. Results are
+printed as JSON so runs can be compared:
+
+    python benchmarks.py > before.json
+    python benchmarks.py --quick --output after.json
+
+Passes are not plies here, since a state passes for the player itself: a
+pass and the move after it count as one step, and a finished game counts as
+one leaf however deep it ends.
+"""
+
+import argparse, json, platform, random, time
+
+from bitboard import BitboardState, move_mask, flip_mask
+from evaluation import SquareTableEvaluator, TOURNAMENT_WEIGHTS
+from mcts import playout
+from othello import OthelloState
+from patterns import PatternEvaluator, PatternState, default_tables
+from project2 import AlphaBetaPlayer, OldTournamentPlayer, TournamentPlayer, PatternPlayer
+
+# Leaf counts from the start position by depth
+START_PERFT = [1, 4, 12, 56, 244, 1396, 8200, 55092, 390216]
+
+# (name, black, white, player to move, move number, depth, leaf count);
+# positions reached by random moves from random.Random(375)
+POSITIONS = [
+    ('midgame-20', 0x2000080423030000, 0x101030181c740c04, 'black', 20, 5, 164189),
+    ('midgame-30', 0x0018194a40140c04, 0x002462b43f682200, 'black', 30, 5, 996083),
+    ('endgame-44', 0x4858736b4fa30188, 0x04840c14305cf432, 'black', 44, 6, 155502),
+    ('endgame-50', 0xfe66de948b8282f1, 0x00192068747c7402, 'black', 50, 8, 56880),
+]
+
+# --quick leaves out perft runs with more leaves than this
+QUICK_LEAVES = 200000
+
+# Player classes searched by the search benchmark
+PLAYERS = [OldTournamentPlayer, AlphaBetaPlayer, TournamentPlayer, PatternPlayer]
+
+
+def perft(state, depth):
+    """Leaves of the game tree under state to depth, for any state with
+    available_moves, make_move and unmake_move."""
+    if depth == 0:
+        return 1
+    moves = state.available_moves()
+    if not moves:
+        return 1
+    if depth == 1:
+        return len(moves)
+
+    leaves = 0
+    for move in moves:
+        undo = state.make_move(move)
+        leaves += perft(state, depth - 1)
+        state.unmake_move(undo)
+    return leaves
+
+
+def perft_bits(player, opponent, depth):
+    """perft straight on (player, opponent) bitboards."""
+    moves = move_mask(player, opponent)
+    if not moves:
+        if not move_mask(opponent, player):
+            return 1
+        player, opponent = opponent, player
+        moves = move_mask(player, opponent)
+    if depth == 1:
+        return bin(moves).count('1')
+
+    leaves = 0
+    while moves:
+        bit = moves & -moves
+        moves ^= bit
+        flips = flip_mask(player, opponent, bit.bit_length() - 1)
+        leaves += perft_bits(opponent & ~flips, player | flips | bit, depth - 1)
+    return leaves
+
+
+def position(black, white, current, move_number):
+    """An OthelloState for a POSITIONS entry."""
+    return OthelloState.from_bitboards(black, white, current, move_number)
+
+
+def timed(function, *args):
+    """(result, seconds) of function(*args)."""
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+
+def perft_cases(quick):
+    """(name, OthelloState, depth, expected leaves) for every perft run."""
+    depth = 5 if quick else 7
+    cases = [('start', OthelloState(), depth, START_PERFT[depth])]
+    for name, black, white, current, move_number, depth, leaves in POSITIONS:
+        if quick and leaves > QUICK_LEAVES:
+            continue
+        cases.append((name, position(black, white, current, move_number), depth, leaves))
+    return cases
+
+
+def bench_perft(quick):
+    """Runs perft on each backend; raises AssertionError on a wrong count."""
+    results = []
+    for name, state, depth, expected in perft_cases(quick):
+        bits = BitboardState.from_state(state)
+        backends = [('OthelloState', perft, state),
+                    ('BitboardState', perft, bits),
+                    ('bitboards', lambda s, d: perft_bits(s.player, s.opponent, d), bits)]
+        for backend, function, root in backends:
+            leaves, seconds = timed(function, root, depth)
+            assert leaves == expected, "perft {} depth {} on {}: {} != {}".format(
+                name, depth, backend, leaves, expected)
+            results.append({'position': name, 'backend': backend, 'depth': depth,
+                            'leaves': leaves, 'seconds': seconds,
+                            'leaves_per_second': leaves / seconds if seconds else None})
+    return results
+
+
+def sample_states(count, seed=375):
+    """count OthelloStates from random games, spread over the whole game."""
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        state = OthelloState()
+        for _ in range(rng.randint(4, 55)):
+            if state.game_over():
+                break
+            state = state.apply_move(rng.choice(state.available_moves()))
+        if not state.game_over():
+            states.append(state)
+    return states
+
+
+def rate(function, items, repeat):
+    """Calls of function per second over items, repeat times."""
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            function(item)
+    return len(items) * repeat / (time.perf_counter() - start_time)
+
+
+def bench_micro(quick):
+    """Operations per second of the basic operations on both backends."""
+    states = sample_states(100)
+    repeat = 5 if quick else 50
+    bits = [BitboardState.from_state(state) for state in states]
+    patterns = [PatternState.from_state(state) for state in states]
+
+    def fresh_moves(state):
+        state._moves = None
+        return state.available_moves()
+
+    def make_unmake(state):
+        state.unmake_move(state.make_move(state.available_moves()[0]))
+
+    def apply(state):
+        return state.apply_move(state.available_moves()[0])
+
+    def flip(state):
+        # Flips the run of discs east of the center and puts it back
+        squares, key = state.squares[:], state.zobrist
+        state.flip(3, 3, 0, 1, squares[27])
+        state.squares, state.zobrist, state._moves = squares, key, None
+
+    rng = random.Random(375)
+    square_table = SquareTableEvaluator(TOURNAMENT_WEIGHTS)
+    pattern = PatternEvaluator(default_tables())
+
+    return {
+        'OthelloState.available_moves': rate(fresh_moves, states, repeat),
+        'OthelloState.make_unmake': rate(make_unmake, states, repeat),
+        'OthelloState.apply_move': rate(apply, states, max(1, repeat // 5)),
+        'OthelloState.flip': rate(flip, states, repeat),
+        'BitboardState.available_moves': rate(lambda s: s.available_moves(), bits, repeat),
+        'BitboardState.make_unmake': rate(make_unmake, bits, repeat),
+        'BitboardState.apply_move': rate(apply, bits, repeat),
+        'PatternState.make_unmake': rate(make_unmake, patterns, repeat),
+        'mcts.playout': rate(lambda s: playout(s.player, s.opponent, rng), bits, max(1, repeat // 5)),
+        'SquareTableEvaluator': rate(square_table, bits, repeat),
+        'SquareTableEvaluator.evaluate_batch': rate(square_table.evaluate_batch, [bits], repeat) * len(bits),
+        'PatternEvaluator': rate(pattern, patterns, repeat),
+        'PatternEvaluator.evaluate_batch': rate(pattern.evaluate_batch, [patterns], repeat) * len(patterns),
+    }
+
+
+class DepthClock():
+    """Stands in for a TimeManager so a search to a fixed depth records
+    the time and nodes at which each iteration finished."""
+
+    def __init__(self):
+        self.deadline = None
+        self.start_time = time.time()
+        self.iterations = []
+
+    def iteration_done(self, depth, nodes):
+        self.iterations.append({'depth': depth, 'seconds': time.time() - self.start_time,
+                                'nodes': nodes})
+
+    def can_start_next(self):
+        return True
+
+
+def bench_search(quick):
+    """Fixed-depth searches of a few positions by every player class."""
+    depth = 5 if quick else 7
+    states = sample_states(2 if quick else 4, seed=376)
+    results = []
+    for player_class in PLAYERS:
+        for index, state in enumerate(states):
+            player = player_class('black')
+            root = player.STATE_CLASS.from_state(state)
+            clock = DepthClock()
+            result = player.engine.search(root, depth, clock=clock)
+            results.append({'player': player_class.__name__, 'position': index,
+                            'depth': result.depth, 'nodes': result.nodes,
+                            'seconds': result.elapsed,
+                            'nodes_per_second': result.nodes / result.elapsed if result.elapsed else None,
+                            'iterations': clock.iterations})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument('--quick', action='store_true', help="smaller depths and fewer repeats")
+    parser.add_argument('--output', help="write the JSON here instead of to stdout")
+    parser.add_argument('--only', choices=['perft', 'micro', 'search'], action='append',
+                        help="run only these parts; may be repeated")
+    args = parser.parse_args()
+    parts = args.only or ['perft', 'micro', 'search']
+
+    report = {'python': platform.python_version(), 'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'quick': args.quick}
+    if 'perft' in parts:
+        report['perft'] = bench_perft(args.quick)
+    if 'micro' in parts:
+        report['micro'] = bench_micro(args.quick)
+    if 'search' in parts:
+        report['search'] = bench_search(args.quick)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
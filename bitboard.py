@@ -0,0 +1,400 @@
+"""
+CS 375
+Bitboard backend for the Othello board game.
+
+The board is kept as two 64-bit integers, one for the player to move and one
+for the opponent. Square (r, c) is bit r * 8 + c. Legal moves are found
+for every square at once with shift-and-mask fills; the discs a single move
+flips come from precomputed rays out of its square.
+"""
+
+from othello import opposite_color, MOVES, ZOBRIST, ZOBRIST_WHITE_TO_MOVE
+from symmetry import canonical_boards, symmetry
+
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_A_FILE = 0xFEFEFEFEFEFEFEFE   # Every square except column 0
+NOT_H_FILE = 0x7F7F7F7F7F7F7F7F   # Every square except column 7
+
+# (shift, mask) for each of the 8 directions. Positive shifts move towards
+# higher square numbers. The mask is applied after shifting and clears the
+# column a piece would wrap into.
+DIRECTIONS = [
+    (1, NOT_A_FILE),    # east
+    (-1, NOT_H_FILE),   # west
+    (8, FULL),          # south
+    (-8, FULL),         # north
+    (9, NOT_A_FILE),    # south-east
+    (7, NOT_H_FILE),    # south-west
+    (-7, NOT_A_FILE),   # north-east
+    (-9, NOT_H_FILE),   # north-west
+]
+
+BLACK_START = (1 << 28) | (1 << 35)
+WHITE_START = (1 << 27) | (1 << 36)
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(bits):
+        """The number of set bits in bits."""
+        return bin(bits).count('1')
+
+
+def _zobrist_rows(color):
+    """ZOBRIST keys for color combined per row: entry [r][byte] is the xor of
+    the keys of every column set in byte on row r."""
+    rows = []
+    for r in range(8):
+        row = []
+        for byte in range(256):
+            key = 0
+            for c in range(8):
+                if byte >> c & 1:
+                    key ^= ZOBRIST[r][c][color]
+            row.append(key)
+        rows.append(row)
+    return rows
+
+ZOBRIST_BLACK_ROWS = _zobrist_rows('black')
+ZOBRIST_WHITE_ROWS = _zobrist_rows('white')
+
+
+def square(r, c):
+    """The square index of (r, c)."""
+    return r * 8 + c
+
+
+def squares(bits):
+    """Yields the square index of every set bit in bits, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def zobrist(black, white, current):
+    """The same Zobrist hash OthelloState keeps, computed one row at a time."""
+    key = ZOBRIST_WHITE_TO_MOVE if current == 'white' else 0
+    for r in range(8):
+        shift = r * 8
+        key ^= ZOBRIST_BLACK_ROWS[r][(black >> shift) & 0xFF] ^ \
+               ZOBRIST_WHITE_ROWS[r][(white >> shift) & 0xFF]
+    return key
+
+
+def canonical(black, white, current):
+    """The Zobrist hash of the position's canonical form (see
+    symmetry.canonical_boards). Returns (key, index of the symmetry that
+    gives the canonical form)."""
+    black, white, index = canonical_boards(black, white)
+    return zobrist(black, white, current), index
+
+
+def neighbors(bits):
+    """Bitmask of every square next to a set bit in bits, in any of the 8
+    directions."""
+    result = 0
+    for shift, mask in DIRECTIONS:
+        if shift > 0:
+            result |= (bits << shift) & mask
+        else:
+            result |= (bits >> -shift) & mask
+    return result & FULL
+
+
+def move_mask(player, opponent):
+    """Bitmask of all the squares where player can legally play."""
+    empty = ~(player | opponent) & FULL
+    moves = 0
+
+    for shift, mask in DIRECTIONS:
+        # Only opponent pieces that can't have wrapped around may be flanked
+        flank = opponent & mask
+
+        if shift > 0:
+            x = (player << shift) & flank
+            x |= (x << shift) & flank
+            x |= (x << shift) & flank
+            x |= (x << shift) & flank
+            x |= (x << shift) & flank
+            x |= (x << shift) & flank
+            moves |= (x << shift) & mask & empty
+        else:
+            shift = -shift
+            x = (player >> shift) & flank
+            x |= (x >> shift) & flank
+            x |= (x >> shift) & flank
+            x |= (x >> shift) & flank
+            x |= (x >> shift) & flank
+            x |= (x >> shift) & flank
+            moves |= (x >> shift) & mask & empty
+
+    return moves
+
+
+def _rays():
+    """RAYS_UP[sq] and RAYS_DOWN[sq]: bitmasks of the squares from sq to the
+    edge in each direction towards higher and lower square numbers, for the
+    directions with room for a flank (two squares or more)."""
+    up, down = [], []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        up_rays, down_rays = [], []
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                if not dr and not dc:
+                    continue
+                ray, length = 0, 0
+                rr, cc = r + dr, c + dc
+                while 0 <= rr < 8 and 0 <= cc < 8:
+                    ray |= 1 << square(rr, cc)
+                    length += 1
+                    rr, cc = rr + dr, cc + dc
+                if length >= 2:
+                    (up_rays if dr * 8 + dc > 0 else down_rays).append(ray)
+        up.append(tuple(up_rays))
+        down.append(tuple(down_rays))
+    return up, down
+
+RAYS_UP, RAYS_DOWN = _rays()
+
+
+def flip_mask(player, opponent, sq):
+    """Bitmask of the opponent pieces flipped when player plays at sq.
+    Zero if the move is not legal.
+
+    Along each ray from sq the first square that isn't the opponent's ends
+    the run: the lowest such bit on rays going up, the highest going down.
+    If it is the player's, every ray square before it flips."""
+    flips = 0
+    stops = ~opponent
+    for ray in RAYS_UP[sq]:
+        stop = ray & stops
+        stop &= -stop
+        if stop & player:
+            flips |= ray & (stop - 1)
+    for ray in RAYS_DOWN[sq]:
+        stop = ray & stops
+        if stop:
+            stop = 1 << (stop.bit_length() - 1)
+            if stop & player:
+                flips |= ray & -(stop << 1)
+    return flips
+
+
+class BitboardState():
+    """Represents the state of an Othello game using two bitboards.
+    Has the same public interface as OthelloState, so players can use the
+    two interchangeably. States are equal when their position is, and can be
+    used as dict keys as long as they aren't changed while they are one."""
+
+    __slots__ = ('player', 'opponent', 'current', 'move_number', '_moves')
+
+    def __init__(self):
+        self.player = BLACK_START
+        self.opponent = WHITE_START
+        self.current = 'black'
+        self.move_number = 0
+
+        # Move mask of the player to move, or None until it is needed. A
+        # move finds the opponent's while checking for a pass and keeps it
+        self._moves = None
+
+    @classmethod
+    def from_state(cls, state):
+        """Builds a BitboardState from an OthelloState."""
+        black, white = state.bitboards()
+
+        new_state = cls.__new__(cls)
+        new_state.current = state.current
+        new_state.move_number = state.move_number
+        new_state._moves = None
+        if state.current == 'black':
+            new_state.player, new_state.opponent = black, white
+        else:
+            new_state.player, new_state.opponent = white, black
+        return new_state
+
+    def __eq__(self, other):
+        return isinstance(other, BitboardState) and self.player == other.player and \
+            self.opponent == other.opponent and self.current == other.current
+
+    def __hash__(self):
+        return hash((self.player, self.opponent, self.current))
+
+    def transform(self, index):
+        """This position under board symmetry index; see symmetry.py."""
+        new_state = self.copy()
+        new_state.player = symmetry(self.player, index)
+        new_state.opponent = symmetry(self.opponent, index)
+        new_state._moves = None
+        return new_state
+
+    def canonical(self):
+        """The canonical orientation of this position and the symmetry that
+        maps this state onto it, as (state, index)."""
+        black, white, index = canonical_boards(*self.bitboards())
+        new_state = self.copy()
+        new_state._moves = None
+        if self.current == 'black':
+            new_state.player, new_state.opponent = black, white
+        else:
+            new_state.player, new_state.opponent = white, black
+        return new_state, index
+
+    def copy(self):
+        """A shallow copy of this state; two ints are all there is to copy."""
+        new_state = BitboardState.__new__(BitboardState)
+        new_state.player = self.player
+        new_state.opponent = self.opponent
+        new_state.current = self.current
+        new_state.move_number = self.move_number
+        new_state._moves = self._moves
+        return new_state
+
+    def bitboards(self):
+        """The (black, white) bitboards."""
+        if self.current == 'black':
+            return self.player, self.opponent
+        return self.opponent, self.player
+
+    @property
+    def zobrist(self):
+        """Zobrist hash of this state, equal to OthelloState.zobrist for the
+        same position."""
+        black, white = self.bitboards()
+        return zobrist(black, white, self.current)
+
+    @property
+    def board(self):
+        """An 8x8 grid of 'empty'/'black'/'white', like OthelloState.board.
+        Built on every access, so search code should use the bitboards."""
+        black, white = self.bitboards()
+        board = [['empty'] * 8 for _ in range(8)]
+        for sq in squares(black):
+            board[sq >> 3][sq & 7] = 'black'
+        for sq in squares(white):
+            board[sq >> 3][sq & 7] = 'white'
+        return board
+
+    def move_mask(self):
+        """Bitmask of the legal squares for the current player."""
+        moves = self._moves
+        if moves is None:
+            moves = self._moves = move_mask(self.player, self.opponent)
+        return moves
+
+    def flip_mask(self, sq):
+        """Bitmask of the pieces flipped by the current player playing sq."""
+        return flip_mask(self.player, self.opponent, sq)
+
+    def evaluation(self):
+        """Difference between black and white pieces on board."""
+        return self.count('black') - self.count('white')
+
+    def game_over(self):
+        """True if the game is over; false otherwise"""
+        return self.move_mask() == 0
+
+    def winner(self):
+        """ PRE:  self.game_over().  Return color of winner or 'draw' """
+        assert self.game_over()
+        ev = self.evaluation()
+        return 'draw' if ev == 0 else 'black' if ev > 0 else 'white'
+
+    def available_moves(self):
+        """Returns a list of all available moves by current player for the
+        current state."""
+        moves = MOVES[self.current]
+        return [moves[sq] for sq in squares(self.move_mask())]
+
+    def apply_square(self, sq):
+        """Plays the current player at square sq, which must be legal.
+        Returns a new state."""
+        flips = flip_mask(self.player, self.opponent, sq)
+        assert flips, "illegal move at square {}".format(sq)
+
+        player = self.player | flips | (1 << sq)
+        opponent = self.opponent & ~flips
+
+        new_state = BitboardState.__new__(BitboardState)
+        new_state.move_number = self.move_number + 1
+
+        # If the opponent has no legal moves, the same player goes again
+        moves = move_mask(opponent, player)
+        if moves:
+            new_state.player, new_state.opponent = opponent, player
+            new_state.current = opposite_color(self.current)
+            new_state._moves = moves
+        else:
+            new_state.player, new_state.opponent = player, opponent
+            new_state.current = self.current
+            new_state._moves = None
+
+        return new_state
+
+    def make_square(self, sq):
+        """Plays the current player at square sq on this state in place.
+        Returns an undo record for unmake_move."""
+        undo = (self.player, self.opponent, self.current, self.move_number, self._moves)
+        flips = flip_mask(self.player, self.opponent, sq)
+        assert flips, "illegal move at square {}".format(sq)
+
+        player = self.player | flips | (1 << sq)
+        opponent = self.opponent & ~flips
+        self.move_number += 1
+
+        # If the opponent has no legal moves, the same player goes again
+        moves = move_mask(opponent, player)
+        if moves:
+            self.player, self.opponent = opponent, player
+            self.current = opposite_color(self.current)
+            self._moves = moves
+        else:
+            self.player, self.opponent = player, opponent
+            self._moves = None
+
+        return undo
+
+    def make_move(self, move):
+        """ Plays move on this state in place. Returns an undo record. """
+        r, c = move.pair
+        assert move.player == self.current
+        return self.make_square(square(r, c))
+
+    def unmake_move(self, undo):
+        """ Takes back the move that returned undo. """
+        self.player, self.opponent, self.current, self.move_number, self._moves = undo
+
+    def apply_move(self, move):
+        """ move is an othello move that is applicable. Returns a new state. """
+        r, c = move.pair
+        assert r >= 0 and c >= 0 and r < 8 and c < 8 and move.player == self.current
+        return self.apply_square(square(r, c))
+
+    def count(self, color):
+        """The number of pieces belonging to color on the board."""
+        if color == 'empty':
+            return 64 - popcount(self.player | self.opponent)
+        if color == self.current:
+            return popcount(self.player)
+        return popcount(self.opponent)
+
+    def __str__(self):
+        black, white = self.bitboards()
+        result =  "    0   1   2   3   4   5   6   7  \n"
+        result += "  +---+---+---+---+---+---+---+---+\n"
+        for r in range(8):
+            result += "{} |".format(r)
+            for c in range(8):
+                bit = 1 << square(r, c)
+                result += ' X |' if black & bit else \
+                          ' O |' if white & bit else \
+                          '   |'
+            result += '\n'
+            result += "  +---+---+---+---+---+---+---+---+\n"
+
+        result += "============== STATUS ==============\n"
+        result += "current player: {}\n".format(self.current)
+        result += "black (X): {}\nwhite (O): {}".format(self.count('black'), self.count('white'))
+        return result
@@ -0,0 +1,206 @@
+"""
+CS 375
+Opening book for the Othello search players.
+
+The book maps opening positions to a move. Positions are keyed by the
+Zobrist hash of their canonical form over the 8 board symmetries (see
+bitboard.canonical), so a position and its rotations and reflections share
+one entry; the move is stored in the canonical orientation and turned back
+on lookup.
+
+The file is sorted by key, little-endian:
+
+    4s    magic b'OTHB'
+    H     format version, 1
+    I     number of entries N
+    N x   Q key, B square of the move, h score, I games (0 if searched)
+
+OpeningBook memory-maps the file and binary searches it, so the book is
+not read into memory and a lookup touches a handful of pages. Books are
+built from a game archive (the move that scored best over enough games)
+or by searching every position of the first few plies:
+
+    python book.py games games.othg book.bin --plies 12 --min-games 4
+    python book.py search book.bin --plies 4 --depth 6
+"""
+
+import argparse, mmap, struct
+
+from bitboard import BitboardState, canonical
+from othello import OthelloMove
+from symmetry import SYMMETRY_SQUARES, INVERSE_SYMMETRY_SQUARES
+
+MAGIC = b'OTHB'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+ENTRY = struct.Struct('<QBhI')
+
+
+def position_key(state):
+    """(canonical key, symmetry index) of an OthelloState or BitboardState."""
+    black, white = state.bitboards()
+    return canonical(black, white, state.current)
+
+
+def write_book(path, entries):
+    """Writes entries, a dict of key -> (square, score, games), to path."""
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for key in sorted(entries):
+            f.write(ENTRY.pack(key, *entries[key]))
+
+
+class OpeningBook():
+    """A memory-mapped book file; see the format above."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self.mapped, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a version {} opening book".format(path, VERSION))
+
+        # Lookups and hits, for this process
+        self.lookups = 0
+        self.hits = 0
+
+    # A map can't be pickled, so copies and other processes reopen the file
+    def __getstate__(self):
+        return {'path': self.path, 'lookups': self.lookups, 'hits': self.hits}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+        self.lookups = state['lookups']
+        self.hits = state['hits']
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, index):
+        """The (key, square, score, games) at index."""
+        return ENTRY.unpack_from(self.mapped, HEADER.size + index * ENTRY.size)
+
+    def find(self, key):
+        """The (square, score, games) stored for key, or None."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            found = struct.unpack_from('<Q', self.mapped, HEADER.size + middle * ENTRY.size)[0]
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return self.entry(middle)[1:]
+        return None
+
+    def lookup(self, state):
+        """The book move for state, an OthelloState or BitboardState, or
+        None if the position isn't in the book."""
+        self.lookups += 1
+        key, index = position_key(state)
+        found = self.find(key)
+        if found is None:
+            return None
+
+        sq = INVERSE_SYMMETRY_SQUARES[index][found[0]]
+        move = OthelloMove(sq >> 3, sq & 7, state.current)
+        if move not in state.available_moves():
+            # A hash collision with some other position
+            return None
+        self.hits += 1
+        return move
+
+    def close(self):
+        self.mapped.close()
+
+
+def book_entry(state, pair, score, games):
+    """(key, entry) storing pair as the move for state."""
+    key, index = position_key(state)
+    return key, (SYMMETRY_SQUARES[index][pair[0] * 8 + pair[1]], score, games)
+
+
+def build_from_games(records, plies=12, min_games=2):
+    """Book entries from game records: for every position in the first
+    plies moves, the move with the best average result for the player who
+    made it, among moves played in at least min_games games."""
+    # key -> canonical square -> [games, points]; points count a win as 2
+    # and a draw as 1 so they stay integers
+    stats = {}
+    for record in records:
+        if record.winner is None:
+            continue
+        state = BitboardState.from_state(record.start_state())
+        for sq in record.moves[:plies]:
+            key, index = position_key(state)
+            points = 1 if record.winner == 'draw' else 2 if record.winner == state.current else 0
+            counts = stats.setdefault(key, {}).setdefault(SYMMETRY_SQUARES[index][sq], [0, 0])
+            counts[0] += 1
+            counts[1] += points
+            state = state.apply_square(sq)
+
+    entries = {}
+    for key, moves in stats.items():
+        played = [(points / games, games, sq) for sq, (games, points) in moves.items()
+                  if games >= min_games]
+        if played:
+            rate, games, sq = max(played)
+            entries[key] = (sq, int(round(rate * 500)), min(games, 0xFFFFFFFF))
+    return entries
+
+
+def build_from_search(engine, plies=4, depth=6):
+    """Book entries from searching every position of the first plies moves
+    to depth with engine, a SearchEngine. Symmetric positions are searched
+    once."""
+    entries = {}
+    frontier = [BitboardState()]
+    for ply in range(plies):
+        children = []
+        for state in frontier:
+            key, index = position_key(state)
+            if key in entries:
+                continue
+            result = engine.search(state, depth)
+            if result.move is None:
+                continue
+            score = max(-0x8000, min(0x7FFF, result.score))
+            entries[key] = book_entry(state, result.move.pair, score, 0)[1]
+            children.extend(state.apply_move(move) for move in state.available_moves())
+        frontier = children
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    games = commands.add_parser('games', help="build from a game archive")
+    games.add_argument('archive')
+    games.add_argument('book')
+    games.add_argument('--plies', type=int, default=12)
+    games.add_argument('--min-games', type=int, default=2)
+
+    search = commands.add_parser('search', help="build by searching the first plies")
+    search.add_argument('book')
+    search.add_argument('--plies', type=int, default=4)
+    search.add_argument('--depth', type=int, default=6)
+    args = parser.parse_args()
+
+    if args.command == 'games':
+        from records import read_games
+        entries = build_from_games(read_games(args.archive), args.plies, args.min_games)
+    else:
+        from evaluation import SquareTableEvaluator, TOURNAMENT_WEIGHTS
+        from search import SearchEngine
+        engine = SearchEngine(SquareTableEvaluator(TOURNAMENT_WEIGHTS), aspiration_window=500)
+        entries = build_from_search(engine, args.plies, args.depth)
+
+    write_book(args.book, entries)
+    print("{} positions written to {}".format(len(entries), args.book))
+
+
+if __name__ == "__main__":
+    main()
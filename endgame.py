@@ -0,0 +1,318 @@
+"""
+CS 375
+Perfect endgame solver for the Othello board game.
+
+Once few enough squares are empty the game can be searched to the end, so
+positions are scored by the exact final disc difference instead of a
+heuristic. The solver works directly on bitboards and keeps a list of the
+empty squares instead of scanning the board. Moves are ordered fastest
+first (fewest replies for the opponent) while many squares are empty and by
+parity (squares in regions with an odd number of empties first) near the
+end. The last four empties are handled by hand-unrolled routines.
+"""
+
+import time
+
+from bitboard import BitboardState, move_mask, flip_mask, popcount, squares
+from othello import OthelloMove
+from search import SearchTimeout
+
+# Scores are disc differences, so this is larger than any of them
+INFINITY = 65
+
+# Fastest-first ordering costs a move generation per child, which only pays
+# off while this many squares or more are empty
+FASTEST_FIRST_EMPTIES = 7
+
+# How many nodes to search between looks at the clock
+NODES_PER_TIME_CHECK = 1024
+
+# QUADRANT[sq] is the 4x4 corner region of square sq, used for parity
+QUADRANT = [((sq >> 5) << 1) | ((sq & 7) >> 2) for sq in range(64)]
+
+
+class EndgameResult():
+    """The outcome of a solve: the best move, its exact score (or just
+    1/0/-1 in win/loss/draw mode), the nodes searched and the seconds
+    taken."""
+
+    def __init__(self, move, score, nodes, elapsed, exact):
+        self.move = move
+        self.score = score
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.exact = exact
+
+    def nodes_per_second(self):
+        """Search speed."""
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return "EndgameResult({}, score={}, nodes={}, {:0.2f}s, {:0.0f} nodes/s)".format(
+            self.move, self.score, self.nodes, self.elapsed, self.nodes_per_second())
+
+
+def parity_order(empties):
+    """empties reordered so squares in regions with an odd number of empty
+    squares come first."""
+    parity = 0
+    for sq in empties:
+        parity ^= 1 << QUADRANT[sq]
+    odd = [sq for sq in empties if parity >> QUADRANT[sq] & 1]
+    if not odd or len(odd) == len(empties):
+        return empties
+    return odd + [sq for sq in empties if not parity >> QUADRANT[sq] & 1]
+
+
+class EndgameSolver():
+    """Searches positions to the end of the game.
+
+    With exact=True scores are the final disc difference for the player to
+    move; with exact=False only win (1), draw (0) or loss (-1) is proved,
+    which is much faster."""
+
+    def __init__(self, exact=True):
+        self.exact = exact
+        self.nodes = 0
+        self.deadline = None
+
+        # Stops the solve early once set, like SearchEngine.cancel
+        self.cancel = None
+
+    def stopped(self):
+        """True once the deadline has passed or the solve was cancelled."""
+        if self.cancel is not None and self.cancel.is_set():
+            return True
+        return self.deadline is not None and time.time() > self.deadline
+
+    def solve(self, state, exact=None, time_limit=None):
+        """Solves state, an OthelloState or BitboardState. Returns an
+        EndgameResult. Raises SearchTimeout if time_limit seconds pass
+        first."""
+        if exact is None:
+            exact = self.exact
+        if not isinstance(state, BitboardState):
+            state = BitboardState.from_state(state)
+
+        start_time = time.time()
+        self.deadline = start_time + time_limit if time_limit is not None else None
+        self.nodes = 0
+
+        player, opponent = state.player, state.opponent
+        empties = parity_order(list(squares(~(player | opponent) & 0xFFFFFFFFFFFFFFFF)))
+        alpha, beta = (-INFINITY, INFINITY) if exact else (-1, 1)
+
+        moves = move_mask(player, opponent)
+        if not moves:
+            score = self.solve_bits(player, opponent, empties, alpha, beta)
+            return self.result(None, score, start_time, exact)
+
+        best_sq, best_score = None, -INFINITY
+        for sq in self.order(player, opponent, empties, moves):
+            flips = flip_mask(player, opponent, sq)
+            rest = [e for e in empties if e != sq]
+            score = -self.solve_bits(opponent & ~flips, player | flips | (1 << sq),
+                                     rest, -beta, -alpha)
+            if score > best_score:
+                best_sq, best_score = sq, score
+                alpha = max(alpha, score)
+                if alpha >= beta:
+                    break
+
+        move = OthelloMove(best_sq >> 3, best_sq & 7, state.current)
+        return self.result(move, best_score, start_time, exact)
+
+    def result(self, move, score, start_time, exact):
+        """Packs up an EndgameResult."""
+        if not exact:
+            score = (score > 0) - (score < 0)
+        return EndgameResult(move, score, self.nodes, time.time() - start_time, exact)
+
+    def order(self, player, opponent, empties, moves):
+        """The legal squares in moves, best first."""
+        legal = [sq for sq in empties if moves >> sq & 1]
+        if len(empties) < FASTEST_FIRST_EMPTIES or len(legal) < 2:
+            return legal
+
+        def replies(sq):
+            flips = flip_mask(player, opponent, sq)
+            return popcount(move_mask(opponent & ~flips, player | flips | (1 << sq)))
+
+        return sorted(legal, key=replies)
+
+    def solve_bits(self, player, opponent, empties, alpha, beta):
+        """Exact value for player of the position with the given empty
+        squares, searched with window (alpha, beta)."""
+        n = len(empties)
+        if n == 4:
+            return self.last4(player, opponent, empties[0], empties[1],
+                              empties[2], empties[3], alpha, beta)
+        if n == 3:
+            return self.last3(player, opponent, empties[0], empties[1],
+                              empties[2], alpha, beta)
+        if n == 2:
+            return self.last2(player, opponent, empties[0], empties[1], alpha, beta)
+        if n == 1:
+            return self.last1(player, opponent, empties[0])
+        if n == 0:
+            return popcount(player) - popcount(opponent)
+
+        self.nodes += 1
+        if self.nodes % NODES_PER_TIME_CHECK == 0 and self.stopped():
+            raise SearchTimeout()
+
+        moves = move_mask(player, opponent)
+        if not moves:
+            if not move_mask(opponent, player):
+                return popcount(player) - popcount(opponent)
+            return -self.solve_bits(opponent, player, empties, -beta, -alpha)
+
+        if n < FASTEST_FIRST_EMPTIES:
+            empties = parity_order(empties)
+
+        best = -INFINITY
+        for sq in self.order(player, opponent, empties, moves):
+            flips = flip_mask(player, opponent, sq)
+            rest = [e for e in empties if e != sq]
+            score = -self.solve_bits(opponent & ~flips, player | flips | (1 << sq),
+                                     rest, -beta, -alpha)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def last1(self, player, opponent, sq):
+        """Exact value for player with only sq empty."""
+        self.nodes += 1
+        diff = popcount(player) - popcount(opponent)
+
+        flips = flip_mask(player, opponent, sq)
+        if flips:
+            return diff + 2 * popcount(flips) + 1
+
+        flips = flip_mask(opponent, player, sq)
+        if flips:
+            return diff - 2 * popcount(flips) - 1
+
+        return diff
+
+    def last2(self, player, opponent, a, b, alpha, beta):
+        """Exact value for player with only a and b empty."""
+        self.nodes += 1
+        best = -INFINITY
+
+        flips = flip_mask(player, opponent, a)
+        if flips:
+            best = -self.last1(opponent & ~flips, player | flips | (1 << a), b)
+            if best >= beta:
+                return best
+
+        flips = flip_mask(player, opponent, b)
+        if flips:
+            score = -self.last1(opponent & ~flips, player | flips | (1 << b), a)
+            if score > best:
+                best = score
+
+        if best > -INFINITY:
+            return best
+
+        # Player passes
+        if flip_mask(opponent, player, a) or flip_mask(opponent, player, b):
+            return -self.last2(opponent, player, a, b, -beta, -alpha)
+        return popcount(player) - popcount(opponent)
+
+    def last3(self, player, opponent, a, b, c, alpha, beta):
+        """Exact value for player with only a, b and c empty."""
+        self.nodes += 1
+        best = -INFINITY
+
+        flips = flip_mask(player, opponent, a)
+        if flips:
+            best = -self.last2(opponent & ~flips, player | flips | (1 << a),
+                               b, c, -beta, -alpha)
+            if best >= beta:
+                return best
+            if best > alpha:
+                alpha = best
+
+        flips = flip_mask(player, opponent, b)
+        if flips:
+            score = -self.last2(opponent & ~flips, player | flips | (1 << b),
+                                a, c, -beta, -alpha)
+            if score > best:
+                best = score
+                if best >= beta:
+                    return best
+                if best > alpha:
+                    alpha = best
+
+        flips = flip_mask(player, opponent, c)
+        if flips:
+            score = -self.last2(opponent & ~flips, player | flips | (1 << c),
+                                a, b, -beta, -alpha)
+            if score > best:
+                best = score
+
+        if best > -INFINITY:
+            return best
+
+        # Player passes
+        if flip_mask(opponent, player, a) or flip_mask(opponent, player, b) or \
+                flip_mask(opponent, player, c):
+            return -self.last3(opponent, player, a, b, c, -beta, -alpha)
+        return popcount(player) - popcount(opponent)
+
+    def last4(self, player, opponent, a, b, c, d, alpha, beta):
+        """Exact value for player with only a, b, c and d empty."""
+        self.nodes += 1
+        best = -INFINITY
+
+        flips = flip_mask(player, opponent, a)
+        if flips:
+            best = -self.last3(opponent & ~flips, player | flips | (1 << a),
+                               b, c, d, -beta, -alpha)
+            if best >= beta:
+                return best
+            if best > alpha:
+                alpha = best
+
+        flips = flip_mask(player, opponent, b)
+        if flips:
+            score = -self.last3(opponent & ~flips, player | flips | (1 << b),
+                                a, c, d, -beta, -alpha)
+            if score > best:
+                best = score
+                if best >= beta:
+                    return best
+                if best > alpha:
+                    alpha = best
+
+        flips = flip_mask(player, opponent, c)
+        if flips:
+            score = -self.last3(opponent & ~flips, player | flips | (1 << c),
+                                a, b, d, -beta, -alpha)
+            if score > best:
+                best = score
+                if best >= beta:
+                    return best
+                if best > alpha:
+                    alpha = best
+
+        flips = flip_mask(player, opponent, d)
+        if flips:
+            score = -self.last3(opponent & ~flips, player | flips | (1 << d),
+                                a, b, c, -beta, -alpha)
+            if score > best:
+                best = score
+
+        if best > -INFINITY:
+            return best
+
+        # Player passes
+        if flip_mask(opponent, player, a) or flip_mask(opponent, player, b) or \
+                flip_mask(opponent, player, c) or flip_mask(opponent, player, d):
+            return -self.last4(opponent, player, a, b, c, d, -beta, -alpha)
+        return popcount(player) - popcount(opponent)
@@ -0,0 +1,188 @@
+"""
+CS 375
+Position evaluation for the Othello search players.
+
+A square-table evaluation gives every disc the weight of its square plus
+one for the disc itself; a position scores the player to move's total
+minus the opponent's. The tables are turned into lookup tables once, so a
+single evaluation is a few table lookups on the bitboards, and many leaf
+positions can be scored together in one vectorized NumPy call.
+
+Fitted weights (see training.py) are stored in a small binary file,
+little-endian:
+
+    4s    magic b'OTHW'
+    H     format version, 1
+    64i   the weight of each square, row by row
+"""
+
+import random, struct, time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# CITE: https://othellomaster.com/OM/Report/HTML/report.html
+# HESC: A score for the othello grid that I can model mine after
+TOURNAMENT_WEIGHTS = [
+    [10000, -10000, 1000,  800, 800, 1000,  -10000, 10000],
+    [-10000, -10000, -450, -500, -500, -450, -10000, -10000],
+    [1000,  -450,  30,  10,  10,  30,  -450, 1000],
+    [800,  -500,  10,  50,  50,  10,  -500,  800],
+    [800,  -500,  10,  50,  50,  10,  -500,  800],
+    [1000,  -450,  30,  10,  10,  30,  -450, 1000],
+    [-10000, -10000, -450, -500, -500, -450, -10000, -10000],
+    [10000, -10000, 1000,  800, 800, 1000,  -10000, 10000]]
+
+# The same table with milder X and C squares, as AlphaBetaPlayer uses
+ALPHA_BETA_WEIGHTS = [
+    [10000, -5000, 1000,  800, 800, 1000,  -5000, 10000],
+    [-5000, -5000, -450, -500, -500, -450, -5000, -5000],
+    [1000,  -450,  30,  10,  10,  30,  -450, 1000],
+    [800,  -500,  10,  50,  50,  10,  -500,  800],
+    [800,  -500,  10,  50,  50,  10,  -500,  800],
+    [1000,  -450,  30,  10,  10,  30,  -450, 1000],
+    [-5000, -5000, -450, -500, -500, -450, -5000, -5000],
+    [10000, -5000, 100,  800, 800, 100,  -5000, 10000]]
+
+WEIGHTS_MAGIC = b'OTHW'
+WEIGHTS_VERSION = 1
+WEIGHTS_FORMAT = struct.Struct('<4sH64i')
+
+
+def write_weights(path, weights):
+    """Writes an 8x8 table of square weights to path."""
+    with open(path, 'wb') as f:
+        f.write(WEIGHTS_FORMAT.pack(WEIGHTS_MAGIC, WEIGHTS_VERSION,
+                                  *[w for row in weights for w in row]))
+
+
+def load_weights(path):
+    """The 8x8 table of square weights in the file at path."""
+    with open(path, 'rb') as f:
+        magic, version, *values = WEIGHTS_FORMAT.unpack(f.read(WEIGHTS_FORMAT.size))
+    if magic != WEIGHTS_MAGIC or version != WEIGHTS_VERSION:
+        raise ValueError("{} is not a version {} weights file".format(path, WEIGHTS_VERSION))
+    return [values[r * 8:r * 8 + 8] for r in range(8)]
+
+
+def loop_score(state, weights):
+    """Scores state for the player to move by walking all 64 squares, the
+    way project2.py's score_board used to. Kept as the reference the
+    benchmark compares against."""
+    black_number = state.count('black')
+    white_number = state.count('white')
+
+    board = state.board
+    for i in range(8):
+        for j in range(8):
+            if board[i][j] == 'black':
+                black_number += weights[i][j]
+            if board[i][j] == 'white':
+                white_number += weights[i][j]
+
+    if state.current == 'black':
+        return black_number - white_number
+    return white_number - black_number
+
+
+class SquareTableEvaluator():
+    """Square-table evaluation of states that have a bitboards() method.
+
+    Called with a state it returns the score for the player to move, so an
+    instance can be handed to SearchEngine as its evaluate function."""
+
+    def __init__(self, weights):
+        # Every disc also counts once for itself
+        self.weights = [[w + 1 for w in row] for row in weights]
+
+        # rows[r][byte] is the total weight of the columns set in byte on row r
+        self.rows = []
+        for r in range(8):
+            row = []
+            for byte in range(256):
+                row.append(sum(self.weights[r][c] for c in range(8) if byte >> c & 1))
+            self.rows.append(row)
+
+        if np is not None:
+            self.vector = np.array(self.weights, dtype=np.int64).reshape(64)
+
+    def __call__(self, state):
+        return self.evaluate(state)
+
+    def score_bits(self, black, white):
+        """Score of the (black, white) bitboards for black."""
+        rows = self.rows
+        return (rows[0][black & 0xFF] - rows[0][white & 0xFF] +
+                rows[1][black >> 8 & 0xFF] - rows[1][white >> 8 & 0xFF] +
+                rows[2][black >> 16 & 0xFF] - rows[2][white >> 16 & 0xFF] +
+                rows[3][black >> 24 & 0xFF] - rows[3][white >> 24 & 0xFF] +
+                rows[4][black >> 32 & 0xFF] - rows[4][white >> 32 & 0xFF] +
+                rows[5][black >> 40 & 0xFF] - rows[5][white >> 40 & 0xFF] +
+                rows[6][black >> 48 & 0xFF] - rows[6][white >> 48 & 0xFF] +
+                rows[7][black >> 56] - rows[7][white >> 56])
+
+    def evaluate(self, state):
+        """Score of state for the player to move."""
+        black, white = state.bitboards()
+        score = self.score_bits(black, white)
+        return score if state.current == 'black' else -score
+
+    def evaluate_batch(self, states):
+        """Scores of many states, each for its own player to move, computed
+        in one vectorized call when NumPy is available."""
+        if np is None or len(states) < 2:
+            return [self.evaluate(state) for state in states]
+
+        # Unpack each state's two bitboards into a row of 128 0/1 squares and
+        # take the dot product with the weights
+        boards = np.array([state.bitboards() for state in states], dtype='<u8')
+        bits = np.unpackbits(boards.view(np.uint8), axis=1, bitorder='little')
+        discs = bits[:, :64].astype(np.int64) - bits[:, 64:]
+        scores = discs @ self.vector
+
+        signs = np.array([1 if state.current == 'black' else -1 for state in states])
+        return (scores * signs).tolist()
+
+
+def benchmark(positions=200, repeat=20):
+    """Prints evaluations per second of loop_score against
+    SquareTableEvaluator, single and batched, on random positions."""
+    from bitboard import BitboardState
+    from othello import OthelloState
+
+    rng = random.Random(375)
+    states = []
+    while len(states) < positions:
+        state = OthelloState()
+        for _ in range(rng.randint(4, 55)):
+            if state.game_over():
+                break
+            state = state.apply_move(rng.choice(state.available_moves()))
+        states.append(state)
+    bitboard_states = [BitboardState.from_state(state) for state in states]
+
+    evaluator = SquareTableEvaluator(TOURNAMENT_WEIGHTS)
+    for state, fast in zip(states, bitboard_states):
+        assert loop_score(state, TOURNAMENT_WEIGHTS) == evaluator(fast)
+
+    def rate(function):
+        start_time = time.time()
+        for _ in range(repeat):
+            function()
+        return positions * repeat / (time.time() - start_time)
+
+    print("loop_score (OthelloState): {:12.0f} evals/s".format(
+        rate(lambda: [loop_score(s, TOURNAMENT_WEIGHTS) for s in states])))
+    print("evaluate (OthelloState):   {:12.0f} evals/s".format(
+        rate(lambda: [evaluator(s) for s in states])))
+    print("evaluate (BitboardState):  {:12.0f} evals/s".format(
+        rate(lambda: [evaluator(s) for s in bitboard_states])))
+    print("evaluate_batch:            {:12.0f} evals/s{}".format(
+        rate(lambda: evaluator.evaluate_batch(bitboard_states)),
+        "" if np is not None else " (NumPy not installed)"))
+
+
+if __name__ == "__main__":
+    benchmark()
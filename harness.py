@@ -0,0 +1,168 @@
+"""
+CS 375
+End-to-end harness for the engine server.
+
+Starts server.py as a subprocess listening on a local TCP port, then
+talks to it over its standard input and over two socket connections at
+once: readiness, setting positions, fixed-depth searches with info lines,
+a side to move that must pass, stopping a long search, error replies, two
+clients queueing searches, the info counters, and quitting. Prints one line per check and exits with
+status 1 if any fails.
+
+    python harness.py
+    python harness.py --player PatternPlayer
+"""
+
+import argparse, asyncio, os, sys, time
+
+from server import parse_setup, parse_square
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+
+# Seconds to wait for any one reply
+REPLY_TIMEOUT = 30.0
+
+
+class Client():
+    """Either end of the server's protocol: lines are written to writer
+    and read from reader."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, line):
+        self.writer.write((line + '\n').encode())
+        await self.writer.drain()
+
+    async def read(self):
+        line = await asyncio.wait_for(self.reader.readline(), REPLY_TIMEOUT)
+        if not line:
+            raise EOFError("server closed the connection")
+        return line.decode().strip()
+
+    async def read_until(self, prefix):
+        """Every line up to and including the first one starting with
+        prefix."""
+        lines = []
+        while True:
+            lines.append(await self.read())
+            if lines[-1].startswith(prefix):
+                return lines
+
+
+class Harness():
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, name, passed, detail=''):
+        print("{} {}{}".format('ok  ' if passed else 'FAIL', name,
+                               ": " + detail if detail and not passed else ''))
+        if not passed:
+            self.failures += 1
+
+    def check_bestmove(self, name, lines, setup):
+        """Checks that lines end in a legal bestmove for the position."""
+        words = lines[-1].split()
+        state = parse_setup(setup.split())
+        legal = [move.pair for move in state.available_moves()]
+        try:
+            passed = len(words) == 2 and parse_square(words[1]) in legal
+        except ValueError:
+            passed = False
+        self.check(name, passed, lines[-1])
+
+    async def run(self, player):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, SERVER, '--port', '0', '--player', player,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+        stdio = Client(process.stdout, process.stdin)
+        try:
+            await self.run_checks(stdio)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    async def run_checks(self, stdio):
+        words = (await stdio.read()).split()
+        self.check("announces its port", words[:3] == ['info', 'listening', 'tcp'], ' '.join(words))
+        host, port = words[3], int(words[4])
+
+        await stdio.send('isready')
+        self.check("isready", await stdio.read() == 'readyok')
+
+        setup = 'startpos moves f5 d6'
+        await stdio.send('position ' + setup)
+        await stdio.send('go depth 4')
+        lines = await stdio.read_until('bestmove')
+        depths = [line.split()[2] for line in lines if line.startswith('info depth')]
+        self.check("info line for each depth", depths == ['1', '2', '3', '4'], repr(lines))
+        self.check_bestmove("bestmove after go depth", lines, setup)
+
+        board = '-' * 27 + 'OX' + '-' * 6 + 'XO' + '-' * 27
+        await stdio.send('position {} X moves f5'.format(board))
+        await stdio.send('go depth 2')
+        self.check_bestmove("position from squares", await stdio.read_until('bestmove'),
+                            '{} X moves f5'.format(board))
+
+        # White has no move, so black plays h8
+        board = 'O' * 61 + 'X' + 'O' + '-'
+        await stdio.send('position {} O'.format(board))
+        await stdio.send('go depth 2')
+        lines = await stdio.read_until('bestmove')
+        self.check("position where the side to move must pass", lines[-1] == 'bestmove h8',
+                   lines[-1])
+
+        await stdio.send('bogus')
+        self.check("error for unknown command", (await stdio.read()).startswith('error'))
+        await stdio.send('position startpos moves a1')
+        self.check("error for illegal move", (await stdio.read()).startswith('error'))
+
+        await stdio.send('position startpos')
+        await stdio.send('go movetime 60')
+        await asyncio.sleep(0.2)
+        start_time = time.time()
+        await stdio.send('stop')
+        lines = await stdio.read_until('bestmove')
+        self.check("stop ends a search", time.time() - start_time < 5.0,
+                   "{:0.1f}s".format(time.time() - start_time))
+        self.check_bestmove("bestmove after stop", lines, 'startpos')
+
+        # Two socket clients searching at once take turns
+        first = Client(*await asyncio.open_connection(host, port))
+        second = Client(*await asyncio.open_connection(host, port))
+        for client, setup in [(first, 'startpos moves f5'), (second, 'startpos moves f5 f6')]:
+            await client.send('position ' + setup)
+            await client.send('go depth 5')
+        results = await asyncio.gather(first.read_until('bestmove'), second.read_until('bestmove'))
+        self.check_bestmove("first socket client", results[0], 'startpos moves f5')
+        self.check_bestmove("second socket client", results[1], 'startpos moves f5 f6')
+
+        await first.send('info')
+        info = (await first.read()).split()
+        counters = dict(zip(info[1::2], info[2::2]))
+        self.check("info counters", counters.get('searches') == '6' and
+                   counters.get('clients') == '3', ' '.join(info))
+        for client in (first, second):
+            await client.send('quit')
+            client.writer.close()
+
+        await stdio.send('quit')
+        closed = await asyncio.wait_for(stdio.reader.read(), REPLY_TIMEOUT)
+        self.check("quit stops the server", closed == b'', repr(closed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the engine server end to end.")
+    parser.add_argument('--player', default='TournamentPlayer')
+    args = parser.parse_args()
+
+    harness = Harness()
+    asyncio.run(harness.run(args.player))
+    print("{} checks failed".format(harness.failures) if harness.failures else "all checks passed")
+    sys.exit(1 if harness.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
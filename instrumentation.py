@@ -0,0 +1,185 @@
+"""
+CS 375
+Search instrumentation for the Othello search players.
+
+A SearchTracer attached to a SearchEngine (engine.tracer = tracer) is told
+when each search starts, when each iteration of iterative deepening
+finishes and when the search stops. For every move it records the nodes,
+cutoffs and transposition table hits of each depth, the effective
+branching factor, the time of each iteration, the principal variation and
+why the search stopped. The engine already keeps the counters it reads, so
+nothing is done per node; with no tracer attached the cost is one check
+per iteration.
+
+Traces are written as JSON lines, one line per move, so a game's trace can
+be read back while the game is still going. Profiler wraps any code in
+cProfile and/or tracemalloc:
+
+    with Profiler('search.prof', memory=True) as profiler:
+        engine.search(state, 8)
+    print(profiler.report())
+"""
+
+import cProfile, io, json, pstats, time, tracemalloc
+
+from othello import OthelloMove
+
+
+def principal_variation(state, table, length=32):
+    """The line of hash moves from state, read from the transposition
+    table. state is restored before returning."""
+    line, undos = [], []
+    try:
+        while len(line) < length:
+            entry = table.probe(state.zobrist)
+            if entry is None or entry[4] is None:
+                break
+            r, c = entry[4]
+            move = OthelloMove(r, c, state.current)
+            if move not in state.available_moves():
+                break
+            line.append(move.pair)
+            undos.append(state.make_move(move))
+    finally:
+        for undo in reversed(undos):
+            state.unmake_move(undo)
+    return line
+
+
+class SearchTracer():
+    """Records what happened in every search of an engine it is attached
+    to. moves holds one dict per search; with path set each one is also
+    appended to that file as a JSON line as soon as the search ends."""
+
+    def __init__(self, path=None, pv_length=32):
+        self.path = path
+        self.pv_length = pv_length
+        self.moves = []
+        self.current = None
+
+    def counters(self, engine):
+        """The engine's cumulative counters."""
+        return (engine.nodes, engine.table.probes, engine.table.hits,
+                engine.orderer.cutoffs, engine.orderer.first_move_cutoffs)
+
+    def search_started(self, engine, state):
+        black, white = state.bitboards()
+        self.start_time = time.time()
+        self.last = self.counters(engine)
+        self.current = {'move_number': state.move_number, 'player': state.current,
+                        'black': black, 'white': white, 'iterations': []}
+
+    def iteration_done(self, engine, state, depth, move, score):
+        counters = self.counters(engine)
+        nodes, probes, hits, cutoffs, first_cutoffs = [now - before for now, before
+                                                       in zip(counters, self.last)]
+        self.last = counters
+
+        iterations = self.current['iterations']
+        previous = iterations[-1]['nodes'] if iterations else 0
+        iterations.append({
+            'depth': depth,
+            'seconds': time.time() - self.start_time,
+            'nodes': nodes,
+            'branching_factor': nodes / previous if previous else None,
+            'table_probes': probes,
+            'table_hits': hits,
+            'cutoffs': cutoffs,
+            'first_move_cutoffs': first_cutoffs,
+            'move': move.pair,
+            'score': score,
+            'pv': principal_variation(state, engine.table, self.pv_length),
+        })
+
+    def search_done(self, engine, state, result, reason):
+        self.current.update({
+            'move': result.move.pair if result.move is not None else None,
+            'score': result.score,
+            'depth': result.depth,
+            'nodes': result.nodes,
+            'seconds': result.elapsed,
+            'stop_reason': reason,
+        })
+        self.finish()
+
+    def record(self, state, move, reason):
+        """Records a move that was chosen without a search, such as a book
+        move or an endgame solve."""
+        black, white = state.bitboards()
+        self.current = {'move_number': state.move_number, 'player': state.current,
+                        'black': black, 'white': white, 'iterations': [],
+                        'move': move.pair if move is not None else None,
+                        'stop_reason': reason}
+        self.finish()
+
+    def finish(self):
+        self.moves.append(self.current)
+        if self.path is not None:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(self.current) + '\n')
+        self.current = None
+
+    def summary(self):
+        """Totals over every recorded search."""
+        searched = [move for move in self.moves if 'nodes' in move]
+        nodes = sum(move['nodes'] for move in searched)
+        seconds = sum(move['seconds'] for move in searched)
+        reasons = {}
+        for move in self.moves:
+            reasons[move['stop_reason']] = reasons.get(move['stop_reason'], 0) + 1
+        return {'moves': len(self.moves), 'searches': len(searched), 'nodes': nodes,
+                'seconds': seconds, 'nodes_per_second': nodes / seconds if seconds else None,
+                'average_depth': (sum(move['depth'] for move in searched) / len(searched)
+                                  if searched else None),
+                'stop_reasons': reasons}
+
+
+def read_trace(path):
+    """Generates the moves of a trace file."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Profiler():
+    """Context manager that runs its block under cProfile (profile=True)
+    and tracemalloc (memory=True). With path the cProfile stats are also
+    dumped there for pstats or snakeviz."""
+
+    def __init__(self, path=None, profile=True, memory=False):
+        self.path = path
+        self.profile = cProfile.Profile() if profile else None
+        self.memory = memory
+        self.snapshot = None
+        self.peak = None
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.start()
+        if self.profile is not None:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *args):
+        if self.profile is not None:
+            self.profile.disable()
+            if self.path is not None:
+                self.profile.dump_stats(self.path)
+        if self.memory:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def report(self, limit=15):
+        """The hottest functions by cumulative time and, with memory, the
+        lines that allocated the most."""
+        out = io.StringIO()
+        if self.profile is not None:
+            stats = pstats.Stats(self.profile, stream=out)
+            stats.sort_stats('cumulative').print_stats(limit)
+        if self.snapshot is not None:
+            out.write("Peak traced memory: {} bytes\n".format(self.peak))
+            for stat in self.snapshot.statistics('lineno')[:limit]:
+                out.write("{}\n".format(stat))
+        return out.getvalue()
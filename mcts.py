@@ -0,0 +1,260 @@
+"""
+CS 375
+Monte Carlo tree search for the Othello board game.
+
+UCT over a tree of bitboard positions. Each iteration walks down the tree
+picking the child with the best upper confidence bound, adds one child for
+an untried move, plays random moves from there to the end of the game, and
+credits the result to every node on the way back up. Playouts work on plain
+integers: no OthelloMove or state objects are made and nothing is copied.
+
+The tree is kept between moves; the next search starts from the node for
+the new position if the tree has reached it. With workers > 1, leaves are
+chosen in batches and their playouts are run in a process pool. A virtual
+loss on the path of each chosen leaf steers the rest of the batch towards
+other lines until the real results come back.
+"""
+
+import math, multiprocessing, random, time
+
+from bitboard import move_mask, flip_mask, popcount
+
+COLORS = ['black', 'white']
+
+
+def random_square(moves, rng):
+    """A random set bit of moves, as a square index."""
+    for _ in range(rng.randrange(popcount(moves))):
+        moves &= moves - 1
+    return (moves & -moves).bit_length() - 1
+
+
+def playout(player, opponent, rng):
+    """Plays random moves to the end of the game. Returns the final disc
+    difference for the player to move at the start."""
+    sign = 1
+    while True:
+        moves = move_mask(player, opponent)
+        if not moves:
+            moves = move_mask(opponent, player)
+            if not moves:
+                break
+            player, opponent, sign = opponent, player, -sign
+
+        count = popcount(moves)
+        if count > 1:
+            for _ in range(rng.randrange(count)):
+                moves &= moves - 1
+        bit = moves & -moves
+        flips = flip_mask(player, opponent, bit.bit_length() - 1)
+        player, opponent, sign = opponent & ~flips, player | flips | bit, -sign
+    return sign * (popcount(player) - popcount(opponent))
+
+
+def _playouts(task):
+    """Pool worker: runs count playouts from (player, opponent). Returns
+    (wins, draws) for the player to move."""
+    player, opponent, count, seed = task
+    rng = random.Random(seed)
+    wins = draws = 0
+    for _ in range(count):
+        result = playout(player, opponent, rng)
+        if result > 0:
+            wins += 1
+        elif result == 0:
+            draws += 1
+    return wins, draws
+
+
+class Node():
+    """A position in the tree. player and opponent are the bitboards of
+    color, the player to move; a pass is folded into the node, so color
+    only has no moves at the end of the game. score is the total reward
+    (1 for a win, 0.5 for a draw) of mover, the player whose move led
+    here."""
+
+    __slots__ = ('player', 'opponent', 'color', 'mover', 'square', 'parent',
+                 'children', 'untried', 'visits', 'score')
+
+    def __init__(self, player, opponent, color, mover=None, square=None, parent=None):
+        moves = move_mask(player, opponent)
+        if not moves:
+            moves = move_mask(opponent, player)
+            if moves:
+                player, opponent, color = opponent, player, 1 - color
+        self.player = player
+        self.opponent = opponent
+        self.color = color
+        self.mover = mover
+        self.square = square
+        self.parent = parent
+        self.children = []
+        self.untried = moves
+        self.visits = 0
+        self.score = 0.0
+
+    def terminal(self):
+        return not self.untried and not self.children
+
+    def expand(self, rng):
+        """Adds the child for a random untried move and returns it."""
+        sq = random_square(self.untried, rng)
+        bit = 1 << sq
+        self.untried &= ~bit
+        flips = flip_mask(self.player, self.opponent, sq)
+        child = Node(self.opponent & ~flips, self.player | flips | bit,
+                     1 - self.color, self.color, sq, self)
+        self.children.append(child)
+        return child
+
+    def select(self, exploration):
+        """The child with the best upper confidence bound. A child without
+        visits (one picked earlier in a batch with no virtual loss) comes
+        first; otherwise every child has some, so this node has too."""
+        for child in self.children:
+            if not child.visits:
+                return child
+        log_visits = math.log(self.visits)
+        best, best_value = None, -1.0
+        for child in self.children:
+            value = child.score / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+
+class MCTS():
+    """A UCT search tree. exploration is the UCB constant;
+    playouts_per_leaf playouts are run from every new leaf. With workers > 1
+    the playouts of batch_size leaves at a time run in a process pool, and
+    each chosen leaf adds virtual_loss visits along its path meanwhile."""
+
+    def __init__(self, exploration=1.4, playouts_per_leaf=1, workers=1, batch_size=16,
+                 virtual_loss=1, seed=None):
+        self.exploration = exploration
+        self.playouts_per_leaf = playouts_per_leaf
+        self.workers = workers
+        self.batch_size = batch_size
+        self.virtual_loss = virtual_loss
+        self.rng = random.Random(seed)
+        self.root = None
+        self.pool = None
+
+        # Statistics of the last search
+        self.playouts = 0
+        self.elapsed = 0.0
+        self.reused = False
+
+    def __getstate__(self):
+        """The pool stays with the process that started it."""
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
+
+    def close(self):
+        """Stops the worker pool, if there is one."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def set_root(self, black, white, current, reuse=True):
+        """Moves the root to the given position, keeping the subtree under
+        it if the old tree reached it within two moves."""
+        color = COLORS.index(current)
+        player, opponent = (black, white) if color == 0 else (white, black)
+        self.reused = False
+        if reuse and self.root is not None:
+            for child in self.root.children:
+                for node in [child] + child.children:
+                    if node.color == color and node.player == player and node.opponent == opponent:
+                        node.parent = None
+                        self.root = node
+                        self.reused = True
+                        return
+        self.root = Node(player, opponent, color)
+
+    def search(self, time_limit=None, iterations=None, cancel=None):
+        """Runs iterations until time_limit seconds pass, iterations
+        playouts are done or cancel (anything with is_set()) is set."""
+        start_time = time.time()
+        deadline = start_time + time_limit if time_limit is not None else None
+        self.playouts = 0
+        while True:
+            if iterations is not None and self.playouts >= iterations:
+                break
+            if deadline is not None and time.time() > deadline:
+                break
+            if cancel is not None and cancel.is_set():
+                break
+            if self.workers > 1:
+                self.run_batch()
+            else:
+                self.run_one()
+        self.elapsed = time.time() - start_time
+
+    def descend(self):
+        """Selects and expands a leaf. Returns the path from the root."""
+        node = self.root
+        path = [node]
+        while not node.untried and node.children:
+            node = node.select(self.exploration)
+            path.append(node)
+        if node.untried:
+            node = node.expand(self.rng)
+            path.append(node)
+        return path
+
+    def backup(self, path, visits, wins, draws):
+        """Credits visits playouts with wins and draws for the player to move
+        at the leaf of path."""
+        color = path[-1].color
+        for node in path:
+            node.visits += visits
+            if node.mover == color:
+                node.score += wins + 0.5 * draws
+            elif node.mover is not None:
+                node.score += visits - wins - 0.5 * draws
+
+    def run_one(self):
+        path = self.descend()
+        leaf = path[-1]
+        wins = draws = 0
+        for _ in range(self.playouts_per_leaf):
+            result = playout(leaf.player, leaf.opponent, self.rng)
+            if result > 0:
+                wins += 1
+            elif result == 0:
+                draws += 1
+        self.backup(path, self.playouts_per_leaf, wins, draws)
+        self.playouts += self.playouts_per_leaf
+
+    def run_batch(self):
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers)
+
+        # Pick the leaves, with a virtual loss on each path so the next
+        # pick goes elsewhere
+        paths = []
+        for _ in range(self.batch_size):
+            path = self.descend()
+            paths.append(path)
+            for node in path:
+                node.visits += self.virtual_loss
+
+        tasks = [(path[-1].player, path[-1].opponent, self.playouts_per_leaf,
+                  self.rng.getrandbits(64)) for path in paths]
+        for path, (wins, draws) in zip(paths, self.pool.map(_playouts, tasks)):
+            for node in path:
+                node.visits -= self.virtual_loss
+            self.backup(path, self.playouts_per_leaf, wins, draws)
+        self.playouts += self.playouts_per_leaf * len(paths)
+
+    def best_square(self):
+        """The square of the root's most visited child, or None."""
+        if not self.root.children:
+            return None
+        return max(self.root.children, key=lambda child: child.visits).square
+
+    def playouts_per_second(self):
+        return self.playouts / self.elapsed if self.elapsed > 0 else 0.0
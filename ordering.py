@@ -0,0 +1,96 @@
+"""
+CS 375
+Move ordering for the Othello search engine.
+
+Alpha-beta prunes the most when the best move is searched first. Moves are
+ranked by, in order: the hash move (the best move stored in the
+transposition table or found by the previous iteration), the killer moves
+that caused cutoffs at the same ply, and then a history score plus a static
+value for the square.
+"""
+
+# Static value of each square: corners first, the squares next to the
+# corners (X and C squares) last.
+SQUARE_PRIOR = [
+    [90, -30, 20, 10, 10, 20, -30, 90],
+    [-30, -60, -5, -5, -5, -5, -60, -30],
+    [20, -5, 15, 3, 3, 15, -5, 20],
+    [10, -5, 3, 3, 3, 3, -5, 10],
+    [10, -5, 3, 3, 3, 3, -5, 10],
+    [20, -5, 15, 3, 3, 15, -5, 20],
+    [-30, -60, -5, -5, -5, -5, -60, -30],
+    [90, -30, 20, 10, 10, 20, -30, 90]]
+
+HASH_MOVE_SCORE = 1 << 40
+KILLER_SCORE = 1 << 30
+
+# Killer moves kept per ply
+KILLERS_PER_PLY = 2
+
+
+class MoveOrderer():
+    """Ranks moves for the search and learns from the cutoffs it reports.
+
+    Also counts how many cutoffs happen and how many of them were caused by
+    the first move searched, which is the measure of ordering quality."""
+
+    def __init__(self):
+        self.killers = []
+        self.history = {'black': [[0] * 8 for _ in range(8)],
+                        'white': [[0] * 8 for _ in range(8)]}
+
+        # Statistics
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        """Forgets the killers, which are tied to plies from the old root,
+        and ages the history so recent cutoffs count more."""
+        self.killers = []
+        for table in self.history.values():
+            for row in table:
+                for c in range(8):
+                    row[c] >>= 1
+
+    def order(self, moves, ply, hash_pair=None):
+        """Returns moves sorted best first. hash_pair is the (r, c) of the
+        hash move, if any."""
+        if len(moves) < 2:
+            return moves
+
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history[moves[0].player]
+
+        def rank(move):
+            pair = move.pair
+            if pair == hash_pair:
+                return HASH_MOVE_SCORE
+            if pair in killers:
+                return KILLER_SCORE
+            r, c = pair
+            return history[r][c] + SQUARE_PRIOR[r][c]
+
+        return sorted(moves, key=rank, reverse=True)
+
+    def cutoff(self, move, ply, depth, index):
+        """Records that move, searched index-th at ply with depth remaining,
+        caused a beta cutoff."""
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move.pair not in killers:
+            killers.insert(0, move.pair)
+            del killers[KILLERS_PER_PLY:]
+
+        r, c = move.pair
+        self.history[move.player][r][c] += depth * depth
+
+    def first_move_cutoff_rate(self):
+        """Fraction of cutoffs caused by the first move searched."""
+        if self.cutoffs == 0:
+            return 0.0
+        return self.first_move_cutoffs / self.cutoffs
@@ -3,7 +3,44 @@ CS 375
 Support code for Othello board game.
 """
 
-import copy, time, multiprocessing
+import copy, time, multiprocessing, random
+
+from symmetry import canonical_boards, symmetry, SYMMETRY_SQUARES, INVERSE_SYMMETRY_SQUARES
+
+# The (dr, dc) step for each of the 8 directions on the board
+DIRECTIONS = [(dr, dc) for dr in [-1, 0, 1] for dc in [-1, 0, 1]
+              if dr != 0 or dc != 0]
+DIRECTION_INDEX = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+def _ray(sq, dr, dc):
+    """The squares from sq (not included) in direction (dr, dc) to the edge
+    of the board."""
+    r, c = (sq >> 3) + dr, (sq & 7) + dc
+    ray = []
+    while 0 <= r < 8 and 0 <= c < 8:
+        ray.append(r * 8 + c)
+        r, c = r + dr, c + dc
+    return tuple(ray)
+
+# Squares are numbered r * 8 + c. RAYS[sq][i] is the ray from sq in
+# DIRECTIONS[i]; FLANK_RAYS[sq] keeps only the rays long enough to flank
+# (an opponent disc and then one of the player's), which is all that move
+# generation and make_move walk.
+RAYS = tuple(tuple(_ray(sq, dr, dc) for dr, dc in DIRECTIONS) for sq in range(64))
+FLANK_RAYS = tuple(tuple(ray for ray in rays if len(ray) >= 2) for rays in RAYS)
+
+# Zobrist keys: ZOBRIST[r][c][color] is xor-ed into a state's hash while color
+# sits on (r, c), and ZOBRIST_WHITE_TO_MOVE while white is the current player.
+# A fixed seed keeps hashes identical across processes and runs.
+_zobrist_random = random.Random(375)
+ZOBRIST = [[{'black': _zobrist_random.getrandbits(64),
+             'white': _zobrist_random.getrandbits(64)}
+            for c in range(8)] for r in range(8)]
+ZOBRIST_WHITE_TO_MOVE = _zobrist_random.getrandbits(64)
+
+# The same keys by square number, and the xor that flips a disc on sq
+ZOBRIST_SQUARES = [ZOBRIST[sq >> 3][sq & 7] for sq in range(64)]
+ZOBRIST_FLIP = [keys['black'] ^ keys['white'] for keys in ZOBRIST_SQUARES]
 
 def opposite_color(color):
     """Returns the other color"""
@@ -13,11 +50,41 @@ def opposite_color(color):
 
 class OthelloMove():
     """Represents a move in Othello with a (r, c) pair and the player who
-    is playing that move."""
-
-    def __init__(self, r, c, player):
-        self.pair = (r, c)
-        self.player = player
+    is playing that move.
+
+    Moves on the board are interned: OthelloMove(r, c, player) returns the
+    one shared instance from MOVES instead of allocating, so moves compare
+    and hash cheaply and must never be modified."""
+
+    __slots__ = ('pair', 'player', 'code')
+
+    def __new__(cls, r, c, player):
+        if 0 <= r < 8 and 0 <= c < 8 and player in MOVES:
+            return MOVES[player][r * 8 + c]
+        return cls.create(r, c, player)
+
+    @classmethod
+    def create(cls, r, c, player):
+        """A new move that isn't interned."""
+        move = object.__new__(cls)
+        move.pair = (r, c)
+        move.player = player
+        move.code = (r * 8 + c) * 2 + (player == 'white')
+        return move
+
+    def __reduce__(self):
+        # Unpickled and copied moves are interned too
+        return (OthelloMove, (self.pair[0], self.pair[1], self.player))
+
+    def transform(self, index):
+        """This move under board symmetry index; see symmetry.py."""
+        sq = SYMMETRY_SQUARES[index][self.pair[0] * 8 + self.pair[1]]
+        return OthelloMove(sq >> 3, sq & 7, self.player)
+
+    def untransform(self, index):
+        """The move that transform(index) maps onto this one."""
+        sq = INVERSE_SYMMETRY_SQUARES[index][self.pair[0] * 8 + self.pair[1]]
+        return OthelloMove(sq >> 3, sq & 7, self.player)
 
     def __str__(self):
         return "{} placing at {}".format(self.player, self.pair)
@@ -26,21 +93,204 @@ class OthelloMove():
         return "({} {})".format(self.pair[0], self.pair[1])
 
     def __eq__(self, other):
-        return self.pair == other.pair and self.player == other.player
+        if self is other:
+            return True
+        return isinstance(other, OthelloMove) and self.pair == other.pair and \
+            self.player == other.player
+
+    def __hash__(self):
+        return self.code
+
+# MOVES[color][r * 8 + c] is the interned move for color at (r, c)
+MOVES = {}
+MOVES.update((color, [OthelloMove.create(sq >> 3, sq & 7, color) for sq in range(64)])
+             for color in ['black', 'white'])
+
+
+class BoardRow():
+    """One row of a BoardView, read and written like a list of 8 colors."""
+
+    __slots__ = ('state', 'start')
+
+    def __init__(self, state, start):
+        self.state = state
+        self.start = start
+
+    def __getitem__(self, c):
+        if isinstance(c, slice):
+            return self.state.squares[self.start:self.start + 8][c]
+        if not -8 <= c < 8:
+            raise IndexError("board column out of range")
+        return self.state.squares[self.start + c % 8]
+
+    def __setitem__(self, c, color):
+        if not -8 <= c < 8:
+            raise IndexError("board column out of range")
+        self.state.set_square(self.start + c % 8, color)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        return iter(self.state.squares[self.start:self.start + 8])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def count(self, color):
+        return self[:].count(color)
+
+    def __repr__(self):
+        return repr(self[:])
+
+
+class BoardView():
+    """The 8x8 grid view of a state's flat 64-square board: view[r][c] is
+    squares[r * 8 + c]. Kept so code written against the old list of rows
+    still works; writes go through set_square, so the state's move cache
+    and Zobrist hash follow them."""
+
+    __slots__ = ('state',)
+
+    def __init__(self, state):
+        self.state = state
+
+    def __getitem__(self, r):
+        if isinstance(r, slice):
+            return [self[i] for i in range(8)[r]]
+        if not -8 <= r < 8:
+            raise IndexError("board row out of range")
+        return BoardRow(self.state, r % 8 * 8)
+
+    def __setitem__(self, r, row):
+        if not -8 <= r < 8:
+            raise IndexError("board row out of range")
+        row = list(row)
+        if len(row) != 8:
+            raise ValueError("a board row has 8 squares")
+        start = r % 8 * 8
+        for c, color in enumerate(row):
+            self.state.set_square(start + c, color)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        return (BoardRow(self.state, r * 8) for r in range(8))
+
+    def __eq__(self, other):
+        return [list(row) for row in self] == [list(row) for row in other]
+
+    def __repr__(self):
+        return repr([row[:] for row in self])
 
 
 class OthelloState():
     """Represents the state of an Othello game.
-    The state includes the board (an 8x8 grid) and the current player."""
+    The state includes the board and the current player. The board is kept
+    as squares, a flat list of 64 'empty'/'black'/'white' strings with
+    (r, c) at r * 8 + c; board is an 8x8 view of it.
+
+    States compare equal when they have the same board and player to move,
+    and hash by their Zobrist key, so they can be used as dict keys as long
+    as they aren't changed while they are one."""
+
+    __slots__ = ('squares', 'current', 'move_number', '_moves', 'zobrist')
 
     def __init__(self):
-        self.board = [['empty'] * 8 for _ in range(8)]
+        self.squares = ['empty'] * 64
         self.current = 'black'
         self.move_number = 0
-        self.board[3][3] = 'white'
-        self.board[4][4] = 'white'
-        self.board[3][4] = 'black'
-        self.board[4][3] = 'black'
+        self.squares[27] = 'white'
+        self.squares[36] = 'white'
+        self.squares[28] = 'black'
+        self.squares[35] = 'black'
+
+        # Legal moves for the current player, computed lazily by
+        # available_moves and cleared whenever the board changes
+        self._moves = None
+
+        # Zobrist hash of the board and current player, kept up to date by
+        # make_move, unmake_move and flip
+        self.zobrist = self.compute_zobrist()
+
+    @property
+    def board(self):
+        """The board as an 8x8 grid: board[r][c] is the color at (r, c)."""
+        return BoardView(self)
+
+    @board.setter
+    def board(self, rows):
+        """Replaces the whole board; the move cache and hash follow it."""
+        self.squares = [col for row in rows for col in row]
+        self._moves = None
+        self.zobrist = self.compute_zobrist()
+
+    def set_square(self, sq, color):
+        """Puts color ('empty', 'black' or 'white') on square sq, keeping
+        the Zobrist hash up to date and dropping the cached moves."""
+        old = self.squares[sq]
+        if old == color:
+            return
+        if old != 'empty':
+            self.zobrist ^= ZOBRIST_SQUARES[sq][old]
+        if color != 'empty':
+            self.zobrist ^= ZOBRIST_SQUARES[sq][color]
+        self.squares[sq] = color
+        self._moves = None
+
+    @classmethod
+    def from_bitboards(cls, black, white, current='black', move_number=0):
+        """Builds a state from (black, white) masks as returned by
+        bitboards()."""
+        state = cls()
+        state.squares = ['black' if black >> sq & 1 else 'white' if white >> sq & 1 else 'empty'
+                         for sq in range(64)]
+        state.current = current
+        state.move_number = move_number
+        state.zobrist = state.compute_zobrist()
+        return state
+
+    def __eq__(self, other):
+        return isinstance(other, OthelloState) and self.zobrist == other.zobrist and \
+            self.current == other.current and self.squares == other.squares
+
+    def __hash__(self):
+        return self.zobrist
+
+    def compute_zobrist(self):
+        """Computes the Zobrist hash of this state from scratch."""
+        key = ZOBRIST_WHITE_TO_MOVE if self.current == 'white' else 0
+        for sq, col in enumerate(self.squares):
+            if col != 'empty':
+                key ^= ZOBRIST_SQUARES[sq][col]
+        return key
+
+    def bitboards(self):
+        """The (black, white) pieces as 64-bit masks; square (r, c) is bit
+        r * 8 + c."""
+        black, white = 0, 0
+        bit = 1
+        for col in self.squares:
+            if col == 'black':
+                black |= bit
+            elif col == 'white':
+                white |= bit
+            bit <<= 1
+        return black, white
+
+    def transform(self, index):
+        """This position under board symmetry index; see symmetry.py."""
+        black, white = self.bitboards()
+        return OthelloState.from_bitboards(symmetry(black, index), symmetry(white, index),
+                                           self.current, self.move_number)
+
+    def canonical(self):
+        """The canonical orientation of this position and the symmetry that
+        maps this state onto it, as (state, index). Moves in the returned
+        state map back with move.untransform(index)."""
+        black, white, index = canonical_boards(*self.bitboards())
+        return OthelloState.from_bitboards(black, white, self.current, self.move_number), index
 
     def evaluation(self):
         """Difference between black and white pieces on board."""
@@ -48,7 +298,7 @@ class OthelloState():
 
     def game_over(self):
         """True if the game is over; false otherwise"""
-        return self.available_moves() == []
+        return not self.available_moves()
 
     def winner(self):
         """ PRE:  self.game_over().  Return color of winner or 'draw' """
@@ -58,96 +308,163 @@ class OthelloState():
 
     def available_moves(self):
         """Returns a list of all available moves by current player for the
-        current state."""
-
-        # Contains (r, c) moves; not actual moves until turned into OthelloMove objects
-        protomoves = []
-
-        for r in range(8):
-            for c in range(8):
-
-                # Can only play in an empty square
-                if self.board[r][c] == 'empty':
-
-                    legal_move = False # We'll set to true to break out of loops when necessary
-
-                    # We'll check in each direction for row and column
-                    for dr in [-1, 0, 1]:
-                        for dc in [-1, 0, 1]:
-                            if dr==0 and dc==0:
-                                continue
-
-                            if self.flanking(r + dr, c + dc, dr, dc,
-                                             opposite_color(self.current),
-                                             self.current):
-                                protomoves.append((r, c))
-                                legal_move = True
-                                break
-
-                        if legal_move:
-                            break
-
-        # Turn all protomoves into OthelloMoves
-        return [OthelloMove(r, c, self.current) for r, c in protomoves]
+        current state. The moves are only generated once per position, so
+        anything that edits self.squares directly must reset self._moves;
+        edits through self.board do."""
+        if self._moves is None:
+            self._moves = self.generate_moves()
+        return list(self._moves)
+
+    def generate_moves(self):
+        """Scans the whole board for the current player's legal moves,
+        walking the rays from each empty square."""
+        squares = self.squares
+        player = self.current
+        other = opposite_color(player)
+        moves = MOVES[player]
+        result = []
+
+        for sq in range(64):
+            if squares[sq] != 'empty':
+                continue
+            for ray in FLANK_RAYS[sq]:
+                # An unbroken run of other's discs ended by one of player's
+                if squares[ray[0]] != other:
+                    continue
+                for x in ray:
+                    col = squares[x]
+                    if col != other:
+                        break
+                if col == player:
+                    result.append(moves[sq])
+                    break
+        return result
 
     def flip(self, r, c, dr, dc, color):
         """ starting at r, c, moving in direction dr, dc, flip all of color found"""
-        if r < 0 or c < 0 or r >= 8 or c >= 8 or self.board[r][c] != color:
+        if r < 0 or c < 0 or r >= 8 or c >= 8:
+            return
+        squares = self.squares
+        sq = r * 8 + c
+        if squares[sq] != color:
             return
-        self.board[r][c] = opposite_color(self.board[r][c])
-        self.flip(r + dr, c + dc, dr, dc, color)
+        other = opposite_color(color)
+        key = self.zobrist
+        for x in (sq,) + RAYS[sq][DIRECTION_INDEX[dr, dc]]:
+            if squares[x] != color:
+                break
+            squares[x] = other
+            key ^= ZOBRIST_FLIP[x]
+        self._moves = None
+        self.zobrist = key
+
+    def copy(self):
+        """A copy of this state that shares nothing mutable with it."""
+        new_state = OthelloState.__new__(OthelloState)
+        new_state.squares = self.squares[:]
+        new_state.current = self.current
+        new_state.move_number = self.move_number
+        new_state._moves = self._moves
+        new_state.zobrist = self.zobrist
+        return new_state
 
     def apply_move(self, move):
         """ move is an othello move that is applicable. Returns a new state. """
-        new_state = copy.deepcopy(self)
+        new_state = self.copy()
+        new_state.make_move(move)
+        return new_state
+
+    def make_move(self, move):
+        """ Plays move, which must be applicable, on this state in place.
+        Returns an undo record (square, flipped squares, previous player,
+        previous move_number, previous legal moves, previous hash) to pass
+        to unmake_move. """
         r,c = move.pair
         assert r >= 0 and c >= 0 and r < 8 and c < 8 and move.player == self.current
-        assert self.board[r][c] == 'empty'
-        directions = []
+        sq = r * 8 + c
+        squares = self.squares
+        assert squares[sq] == 'empty'
+        player = self.current
+        other = opposite_color(player)
+        flipped = []
+        key = self.zobrist ^ ZOBRIST_SQUARES[sq][player]
+
+        for ray in FLANK_RAYS[sq]:
+            if squares[ray[0]] != other:
+                continue
+            run = 0
+            for x in ray:
+                col = squares[x]
+                if col != other:
+                    break
+                run += 1
+            if col == player:
+                for x in ray[:run]:
+                    squares[x] = player
+                    key ^= ZOBRIST_FLIP[x]
+                    flipped.append(x)
+
+        undo = (sq, flipped, player, self.move_number, self._moves,
+                self.zobrist)
+
+        squares[sq] = player
+        self.current = other
+        self.zobrist = key ^ ZOBRIST_WHITE_TO_MOVE
+
+        # The opponent's moves are needed to detect a pass anyway, so they
+        # are kept for the next available_moves call
+        self._moves = self.generate_moves()
 
-        for dr in [-1, 0, 1]:
-            for dc in [-1, 0, 1]:
-                if dr==0 and dc==0:
-                    continue
-                if self.flanking(r + dr, c + dc,
-                                 dr, dc, opposite_color(self.current),
-                                 self.current):
-                    directions.append((dr, dc))
+        # If no legal moves, switch back to other player
+        if not self._moves:
+            self.current = player
+            self.zobrist = key
+            self._moves = None
 
-        for dr, dc in directions:
-            new_state.flip(r + dr, c + dc, dr, dc, opposite_color(self.current))
+        self.move_number += 1
 
-        new_state.board[r][c] = move.player
-        new_state.current = opposite_color(self.current)
+        return undo
 
-        # If no legal moves, switch back to other player
-        if new_state.available_moves() == []:
-            new_state.current = move.player
+    def unmake_move(self, undo):
+        """ Takes back the move that returned undo from make_move. Moves must
+        be unmade in the reverse order they were made. """
+        sq, flipped, player, move_number, moves, key = undo
+        other = opposite_color(player)
 
-        # Increment move_number in new_state
-        new_state.move_number += 1
+        squares = self.squares
+        squares[sq] = 'empty'
+        for x in flipped:
+            squares[x] = other
 
-        return new_state
+        self.current = player
+        self.move_number = move_number
+        self._moves = moves
+        self.zobrist = key
 
     def flank_help(self, r, c, dr, dc, row_color, end_color):
         """ True iff there is an unbroken sequence of row_color
         from (r,c) to a cell with end_color"""
-        if r < 0 or r >= 8 or c < 0 or c >= 8 or self.board[r][c] == 'empty':
+        if r < 0 or r >= 8 or c < 0 or c >= 8:
             return False
-        if self.board[r][c] == end_color:
-            return True
-        return self.flank_help(r+dr, c+dc, dr, dc, row_color, end_color)
+        squares = self.squares
+        sq = r * 8 + c
+        for x in (sq,) + RAYS[sq][DIRECTION_INDEX[dr, dc]]:
+            if squares[x] == end_color:
+                return True
+            if squares[x] != row_color:
+                return False
+        return False
 
     def flanking(self, r, c, dr, dc, row_color, end_color):
         """True if (r, c) is row_color and there is an unbroken sequence of
         row_color from (r, c) to a cell with end_color"""
         return r >= 0 and c >= 0 and r < 8 and c < 8 and \
-            self.board[r][c] == row_color and \
+            self.squares[r * 8 + c] == row_color and \
             self.flank_help(r + dr, c + dc, dr, dc, row_color, end_color)
 
     def count(self, color):
         """The number of pieces belonging to color on the board."""
-        return sum([row.count(color) for row in self.board])
+        return self.squares.count(color)
 
     def __str__(self):
         result =  "    0   1   2   3   4   5   6   7  \n"
@@ -155,7 +472,7 @@ class OthelloState():
         for r in range(8):
             result += "{} |".format(r)
             for c in range(8):
-                col = self.board[r][c]
+                col = self.squares[r * 8 + c]
                 result += '   |' if col == 'empty' else \
                           ' X |' if col == 'black' else \
                           ' O |'
@@ -176,18 +493,121 @@ def timed_make_move(player, board, remaining_time, return_list):
     move = player.make_move(board, remaining_time)
     return_list.append(move)
 
+def worker_loop(player, connection, cancel):
+    """Runs in a PlayerWorker's process until it receives None. Answers
+    each ('move', (black, white, current, move_number, remaining_time))
+    request with the (r, c) of the player's move, and passes each
+    ('notify', (black, white, current, move_number, (r, c, player))) on
+    to the player's notify_move. The player keeps its state between moves;
+    cancel is handed to it as player.cancel."""
+    player.cancel = cancel
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        kind, (black, white, current, move_number, extra) = request
+        state = OthelloState.from_bitboards(black, white, current, move_number)
+        if kind == 'notify':
+            notify_move(player, state, OthelloMove(*extra))
+            continue
+        move = player.make_move(state, extra)
+        connection.send(move.pair if move is not None else None)
+
+    cancel_background(player)
+    connection.close()
+
+
+def notify_move(player, state, move):
+    """Calls player.notify_move(state, move), if the player has one."""
+    notify = getattr(player, 'notify_move', None)
+    if notify is not None:
+        notify(state, move)
+
+
+def cancel_background(player):
+    """Calls player.cancel_background(), if the player has one."""
+    cancel = getattr(player, 'cancel_background', None)
+    if cancel is not None:
+        cancel()
+
+
+class PlayerWorker():
+    """A player running in its own process for a whole game. Each move
+    sends the process only the bitboards, player to move, move number and
+    remaining time over a pipe."""
+
+    # Seconds a cancelled player gets to answer before its process is killed
+    CANCEL_GRACE = 1.0
+
+    def __init__(self, player):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.cancel = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=worker_loop,
+                                               args=(player, child_connection, self.cancel))
+        self.process.start()
+        child_connection.close()
+
+    def request(self, state, remaining_time):
+        """Asks the player for a move in state."""
+        self.cancel.clear()
+        black, white = state.bitboards()
+        self.connection.send(('move', (black, white, state.current, state.move_number,
+                                       remaining_time)))
+
+    def notify(self, state, move):
+        """Tells the player that move was just made, leading to state."""
+        black, white = state.bitboards()
+        self.connection.send(('notify', (black, white, state.current, state.move_number,
+                                         move.pair + (move.player,))))
+
+    def result(self, state, timeout):
+        """Waits up to timeout seconds for the move asked for by request.
+        Returns the OthelloMove, or None if the player ran out of time."""
+        if self.connection.poll(timeout):
+            pair = self.connection.recv()
+            return OthelloMove(pair[0], pair[1], state.current)
+
+        # Out of time: tell the player to stop and throw its answer away
+        self.cancel.set()
+        if self.connection.poll(self.CANCEL_GRACE):
+            self.connection.recv()
+        else:
+            self.process.terminate()
+        return None
+
+    def close(self):
+        """Stops the process."""
+        if self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(self.CANCEL_GRACE)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        self.connection.close()
+
+
 class OthelloGame:
     """Stores the game information as the game is played."""
 
     SECONDS_PER_PLAYER = 150.0
 
-    def __init__(self, black, white, verbose=True):
+    def __init__(self, black, white, verbose=True, recorder=None):
         """Setup the game. If verbose=True, will print info about the game
-        as it is played. Otherwise, play_game will simply return the winner."""
+        as it is played. Otherwise, play_game will simply return the winner.
+        recorder, such as a records.GameWriter, is told about the start,
+        every move and the end of the game."""
 
         self.black_player = black
         self.white_player = white
         self.verbose = verbose
+        self.recorder = recorder
 
         self.black_time = OthelloGame.SECONDS_PER_PLAYER
         self.white_time = OthelloGame.SECONDS_PER_PLAYER
@@ -201,6 +621,41 @@ class OthelloGame:
         if self.verbose:
             print(*args)
 
+    def log_move(self, move):
+        """Logs move and the state after it if verbose=True. Nothing is
+        formatted otherwise."""
+        if self.verbose:
+            print("\n{}. {}".format(self.board.move_number, move))
+            print(self.board)
+            print("black time: {:0.2f}".format(self.black_time))
+            print("white time: {:0.2f}".format(self.white_time))
+            print("====================================")
+
+    def start(self):
+        """Called before the first move."""
+        if self.recorder is not None:
+            self.recorder.start_game(self)
+
+    def record_move(self, move):
+        """Called after each move is made."""
+        if self.recorder is not None:
+            self.recorder.add_move(move)
+
+    def notify_players(self, move):
+        """Called after each move is made; tells both players about it so
+        they can start or stop thinking on the opponent's time."""
+        for player in (self.black_player, self.white_player):
+            notify_move(player, self.board, move)
+
+    def finish(self, winner):
+        """Called with the winner when the game ends. Returns winner."""
+        for player in (self.black_player, self.white_player):
+            cancel_background(player)
+        self.log("Winner is", winner)
+        if self.recorder is not None:
+            self.recorder.end_game(self, winner)
+        return winner
+
     def timeout(self):
         """Called when a player runs out of time"""
         raise OthelloTimeOut()
@@ -210,6 +665,7 @@ class OthelloGame:
         and interupts game if someone runs out of time.
         NOTE: Doesn't work with HumanPlayer."""
 
+        self.start()
         while not self.board.game_over():
             # Get the current player
             if self.board.current == 'black':
@@ -223,6 +679,10 @@ class OthelloGame:
             manager = multiprocessing.Manager()
             move_list = manager.list()
 
+            # The move is made in a copy of the player, so whatever it is
+            # doing in the background here has to stop first
+            cancel_background(player)
+
             # The process that will let the player look for a move
             timer_process = multiprocessing.Process(target=timed_make_move,
                               args=(player, self.board, remaining_time, move_list))
@@ -242,8 +702,7 @@ class OthelloGame:
 
                 # End the game
                 self.log("{} timed out!".format(self.board.current))
-                self.log("Winner is", opposite_color(self.board.current))
-                return opposite_color(self.board.current)
+                return self.finish(opposite_color(self.board.current))
 
             # Calculate the time for the move
             end_time = time.time()
@@ -258,23 +717,72 @@ class OthelloGame:
             # Get the move out of the move_list and make the move
             move = move_list[0]
             self.board = self.board.apply_move(move)
+            self.record_move(move)
+            self.notify_players(move)
 
             # Log the state of the game
-            self.log("\n{}. {}".format(self.board.move_number, move))
-            self.log(self.board)
-            self.log("black time: {:0.2f}".format(self.black_time))
-            self.log("white time: {:0.2f}".format(self.white_time))
-            self.log("====================================")
+            self.log_move(move)
+
+        return self.finish(self.board.winner())
 
-        self.log("Winner is", self.board.winner())
+    def play_game_workers(self):
+        """Like play_game_timed, but each player runs in one PlayerWorker
+        process for the whole game, so whatever it learns (such as a
+        transposition table) carries over from move to move. A player that
+        runs out of time is cancelled instead of killed.
+        NOTE: Doesn't work with HumanPlayer."""
 
-        return self.board.winner()
+        self.start()
+        workers = {'black': PlayerWorker(self.black_player),
+                   'white': PlayerWorker(self.white_player)}
+        try:
+            while not self.board.game_over():
+                # Get the current player
+                worker = workers[self.board.current]
+                if self.board.current == 'black':
+                    remaining_time = self.black_time
+                else:
+                    remaining_time = self.white_time
+
+                # Start getting a move
+                start_time = time.time()
+                worker.request(self.board, remaining_time)
+                move = worker.result(self.board, remaining_time)
+
+                # The player ran out of time
+                if move is None:
+                    self.log("{} timed out!".format(self.board.current))
+                    return self.finish(opposite_color(self.board.current))
+
+                # Calculate the time for the move
+                end_time = time.time()
+                move_time = end_time - start_time
+
+                # Adjust the time
+                if self.board.current == 'black':
+                    self.black_time -= move_time
+                else:
+                    self.white_time -= move_time
+
+                self.board = self.board.apply_move(move)
+                self.record_move(move)
+                for other in workers.values():
+                    other.notify(self.board, move)
+
+                # Log the state of the game
+                self.log_move(move)
+        finally:
+            for worker in workers.values():
+                worker.close()
+
+        return self.finish(self.board.winner())
 
     def play_game(self):
         """Plays move until the game is over. Tracks time used by each player,
         but does not interrupt game if someone runs out of time.
         NOTE: Works with HumanPlayer"""
 
+        self.start()
         while not self.board.game_over():
             # Get the current player
             if self.board.current == 'black':
@@ -300,14 +808,10 @@ class OthelloGame:
 
             # Make the move
             self.board = self.board.apply_move(move)
+            self.record_move(move)
+            self.notify_players(move)
 
             # Log the state of the game
-            self.log("\n{}. {}".format(self.board.move_number, move))
-            self.log(self.board)
-            self.log("black time: {:0.2f}".format(self.black_time))
-            self.log("white time: {:0.2f}".format(self.white_time))
-            self.log("====================================")
-
-        self.log("Winner is", self.board.winner())
+            self.log_move(move)
 
-        return self.board.winner()
+        return self.finish(self.board.winner())
@@ -0,0 +1,243 @@
+"""
+CS 375
+Parallel root search for the Othello search players.
+
+The root moves are dealt out round-robin to a pool of worker processes.
+Every worker runs iterative deepening over its own share of the moves with
+its own SearchEngine, and the workers share the best score found so far at
+each depth as the alpha bound for the rest. Workers can also share one
+transposition table in shared memory.
+"""
+
+import multiprocessing, os, time
+
+from othello import OthelloMove
+from ordering import MoveOrderer
+from search import SearchResult, SearchTimeout, INFINITY, WIN_SCORE
+from transposition import TranspositionTable, DEFAULT_MAX_BYTES
+
+# Deepest search the shared alpha bounds have room for
+MAX_DEPTH = 64
+
+# Seconds to wait for the workers past the deadline before giving up on them
+GRACE_SECONDS = 0.2
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """A TranspositionTable stored in shared memory so several processes can
+    use it at once.
+
+    Each slot is two unsigned 64-bit words: the entry packed into one word,
+    and the key xor-ed with that word. Slots are written without locks;
+    a slot torn by two processes writing at once fails the key check and
+    reads as empty."""
+
+    # Bytes per slot
+    SLOT_BYTES = 16
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        size = 1
+        while size * 2 * self.SLOT_BYTES <= max_bytes:
+            size *= 2
+        self.max_bytes = max_bytes
+        self.size = size
+        self.mask = size - 1
+        self.words = multiprocessing.RawArray('Q', size * 2)
+        self.generation = 0
+
+        # Statistics, for this process only
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def __getstate__(self):
+        """Pickled whole, so worker processes get the same shared memory."""
+        return self.__dict__
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def __len__(self):
+        return sum(1 for i in range(1, len(self.words), 2) if self.words[i])
+
+    def clear(self):
+        """Removes every entry."""
+        for i in range(len(self.words)):
+            self.words[i] = 0
+
+    def new_search(self):
+        """Marks the start of a new search so entries from older searches
+        are replaced first."""
+        self.generation = (self.generation + 1) & 0xFF
+
+    @staticmethod
+    def pack(depth, value, flag, move, generation):
+        """One word holding value (32 bits), depth (8), flag (2), move
+        square or 64 for none (7) and generation (8)."""
+        square = 64 if move is None else move[0] * 8 + move[1]
+        return ((value + (1 << 31)) << 25) | (depth << 17) | (flag << 15) | \
+            (square << 8) | generation
+
+    def probe(self, key):
+        """Returns the entry stored for key as (key, depth, value, flag,
+        move, generation), or None."""
+        self.probes += 1
+        index = (key & self.mask) * 2
+        data = self.words[index + 1]
+        if data == 0 or self.words[index] ^ data != key:
+            return None
+        self.hits += 1
+        square = (data >> 8) & 0x7F
+        move = None if square == 64 else (square >> 3, square & 7)
+        return (key, (data >> 17) & 0xFF, (data >> 25) - (1 << 31),
+                (data >> 15) & 0x3, move, data & 0xFF)
+
+    def store(self, key, depth, value, flag, move=None):
+        """Stores the result of a depth deep search of the position key."""
+        index = (key & self.mask) * 2
+        old = self.words[index + 1]
+
+        # Depth-preferred replacement
+        if old == 0 or old & 0xFF != self.generation or depth >= (old >> 17) & 0xFF:
+            data = self.pack(min(depth, 0xFF), value, flag, move, self.generation)
+            self.words[index] = key ^ data
+            self.words[index + 1] = data
+            self.stores += 1
+
+
+# Set in each worker process by _start_worker
+_engine = None
+_alphas = None
+
+
+def _start_worker(make_engine, alphas, table):
+    """Pool initializer: builds this worker's engine."""
+    global _engine, _alphas
+    _engine = make_engine()
+    if table is not None:
+        _engine.table = table
+    _alphas = alphas
+
+
+def _search_share(state, pairs, max_depth, soft_deadline, deadline):
+    """Runs iterative deepening over the root moves in pairs. Returns
+    (results, nodes) where results[d - 1] is (best pair, score, exact) for
+    every depth d that was finished. exact is False when the score only
+    bounds a move that failed low against another worker's alpha."""
+    engine = _engine
+    engine.deadline = deadline
+    engine.nodes = 0
+    engine.table.new_search()
+    engine.orderer.new_search()
+
+    moves = [OthelloMove(r, c, state.current) for r, c in pairs]
+    results = []
+    best_pair = pairs[0]
+
+    for depth in range(1, max_depth + 1):
+        if results and time.time() > soft_deadline:
+            break
+        try:
+            best_score = -INFINITY
+            for i, move in enumerate(engine.orderer.order(moves, 0, best_pair)):
+                alpha = _alphas[depth]
+                score = engine.search_move(state, move, depth - 1, 1, alpha, INFINITY, i == 0)
+                if score > best_score:
+                    best_score, depth_best, exact = score, move.pair, score > alpha
+
+                # Racing writers can only leave alpha too low, which is safe
+                if score > _alphas[depth]:
+                    _alphas[depth] = score
+        except SearchTimeout:
+            break
+
+        best_pair = depth_best
+        results.append((best_pair, best_score, exact))
+        if abs(best_score) >= WIN_SCORE or depth >= state.count('empty'):
+            break
+
+    return results, engine.nodes
+
+
+class ParallelSearch():
+    """Searches with a pool of worker processes.
+
+    make_engine is a picklable callable returning a fresh SearchEngine for
+    each worker. With shared_table the workers use one shared-memory
+    transposition table instead of one each."""
+
+    def __init__(self, make_engine, workers=None, shared_table=False,
+                 table_bytes=DEFAULT_MAX_BYTES):
+        self.make_engine = make_engine
+        self.workers = workers or os.cpu_count() or 1
+        self.shared_table = shared_table
+        self.table_bytes = table_bytes
+        self.pool = None
+        self.alphas = None
+        self.table = None
+
+    def __getstate__(self):
+        """The pool stays with the process that started it."""
+        state = self.__dict__.copy()
+        state['pool'] = state['alphas'] = state['table'] = None
+        return state
+
+    def start(self):
+        """Starts the worker pool, if it isn't running."""
+        if self.pool is None:
+            self.alphas = multiprocessing.RawArray('q', MAX_DEPTH + 1)
+            if self.shared_table:
+                self.table = SharedTranspositionTable(self.table_bytes)
+            self.pool = multiprocessing.Pool(self.workers, _start_worker,
+                                             (self.make_engine, self.alphas, self.table))
+
+    def close(self):
+        """Stops the worker pool."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def search(self, state, max_depth, clock):
+        """Searches state with every worker until clock's deadline. Returns a
+        SearchResult for the deepest depth every worker finished."""
+        self.start()
+        start_time = time.time()
+        max_depth = min(max_depth, MAX_DEPTH)
+
+        moves = state.available_moves()
+        if len(moves) < 2:
+            return SearchResult(moves[0] if moves else None, 0, 0, 0, 0.0)
+
+        for depth in range(len(self.alphas)):
+            self.alphas[depth] = -INFINITY
+
+        # Deal the moves out, best first by the static ordering
+        moves = MoveOrderer().order(moves, 0)
+        shares = [[move.pair for move in moves[i::self.workers]]
+                  for i in range(min(self.workers, len(moves)))]
+        soft_deadline = clock.start_time + clock.soft
+        jobs = [self.pool.apply_async(_search_share, (state, share, max_depth,
+                                                      soft_deadline, clock.deadline))
+                for share in shares]
+
+        results, nodes = [], 0
+        for job in jobs:
+            try:
+                share_results, share_nodes = job.get(max(0.0, clock.deadline - time.time()) + GRACE_SECONDS)
+            except multiprocessing.TimeoutError:
+                # A stuck worker; its share can't be trusted, so start over
+                self.close()
+                share_results, share_nodes = [], 0
+            results.append(share_results)
+            nodes += share_nodes
+
+        # The deepest depth all shares finished decides the move
+        depth = min(len(share_results) for share_results in results)
+        if depth == 0:
+            return SearchResult(moves[0], None, 0, nodes, time.time() - start_time)
+
+        best_pair, best_score, exact = max((share_results[depth - 1] for share_results in results),
+                                           key=lambda result: (result[1], result[2]))
+        move = OthelloMove(best_pair[0], best_pair[1], state.current)
+        return SearchResult(move, best_score, depth, nodes, time.time() - start_time)
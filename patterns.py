@@ -0,0 +1,341 @@
+"""
+CS 375
+Pattern-based evaluation for the Othello search players.
+
+The board is covered by pattern instances (edges, third lines, 3x3 corners
+and the two diagonals). Each instance reads its squares as a base-3 number,
+0 for empty, 1 for black and 2 for white, with the first square as the
+lowest digit. That code indexes a table of scores for black, shared by all
+instances of the same pattern. Mobility, potential mobility and frontier
+discs are added on top with a weight each.
+
+Tables are stored in a binary file, little-endian:
+
+    4s    magic b'OTHP'
+    H     format version, 1
+    H     number of pattern tables N
+    i     scale; every stored value is multiplied by it
+    3h    mobility, potential mobility and frontier weights
+    N x   16s name, H number of squares
+    then the N tables in the same order, 3 ** squares int16 values each
+
+load_tables memory-maps the file, so the tables are read lazily by the OS
+instead of being parsed at startup. Running this module writes a default
+file built from the tournament square weights:
+
+    python patterns.py patterns.bin
+"""
+
+import mmap, struct, sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bitboard import BitboardState, move_mask, neighbors, popcount, squares, FULL
+from evaluation import TOURNAMENT_WEIGHTS
+
+MAGIC = b'OTHP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHi3h')
+TABLE_ENTRY = struct.Struct('<16sH')
+
+
+def _corner(r0, c0):
+    """The 3x3 block at the corner (r0, c0), corner square first."""
+    dr = 1 if r0 == 0 else -1
+    dc = 1 if c0 == 0 else -1
+    return [(r0 + i * dr) * 8 + c0 + j * dc for i in range(3) for j in range(3)]
+
+# Pattern name -> the squares of each of its instances. Instances of a
+# pattern list their squares in matching order so they can share a table.
+PATTERNS = [
+    ('edge', [[c for c in range(8)],
+              [56 + c for c in range(8)],
+              [r * 8 for r in range(8)],
+              [r * 8 + 7 for r in range(8)]]),
+    ('line3', [[16 + c for c in range(8)],
+               [40 + c for c in range(8)],
+               [r * 8 + 2 for r in range(8)],
+               [r * 8 + 5 for r in range(8)]]),
+    ('corner', [_corner(0, 0), _corner(0, 7), _corner(7, 0), _corner(7, 7)]),
+    ('diagonal', [[i * 9 for i in range(8)],
+                  [i * 7 + 7 for i in range(8)]]),
+]
+
+# Every instance in one flat list, with its pattern name
+INSTANCES = [(name, sqs) for name, instances in PATTERNS for sqs in instances]
+
+# SQUARE_INSTANCES[sq] lists (instance index, 3 ** position) for every
+# instance sq belongs to; used to update codes as discs change
+SQUARE_INSTANCES = [[] for _ in range(64)]
+for _index, (_name, _squares) in enumerate(INSTANCES):
+    for _position, _sq in enumerate(_squares):
+        SQUARE_INSTANCES[_sq].append((_index, 3 ** _position))
+
+# Weights for mobility, potential mobility and frontier discs
+DEFAULT_FEATURE_WEIGHTS = (80, 20, -20)
+DEFAULT_SCALE = 4
+
+
+def compute_codes(black, white):
+    """The pattern code of every instance for the (black, white) bitboards."""
+    codes = []
+    for name, sqs in INSTANCES:
+        code = 0
+        power = 1
+        for sq in sqs:
+            bit = 1 << sq
+            if black & bit:
+                code += power
+            elif white & bit:
+                code += 2 * power
+            power *= 3
+        codes.append(code)
+    return codes
+
+
+class PatternTables():
+    """Pattern tables and feature weights. tables maps each pattern name to
+    an indexable sequence of 3 ** squares stored values."""
+
+    def __init__(self, tables, scale=DEFAULT_SCALE, feature_weights=DEFAULT_FEATURE_WEIGHTS):
+        for name, instances in PATTERNS:
+            assert len(tables[name]) == 3 ** len(instances[0]), name
+        self.tables = tables
+        self.scale = scale
+        self.feature_weights = tuple(feature_weights)
+
+        # Set by load_tables when the tables are views of a mapped file
+        self.mapped = None
+        self.path = None
+
+    # Views of a map can't be pickled, so copies and other processes of
+    # loaded tables map the file again
+    def __getstate__(self):
+        if self.mapped is None:
+            return self.__dict__.copy()
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        if 'tables' in state:
+            self.__dict__.update(state)
+        else:
+            self.__dict__.update(load_tables(state['path']).__dict__)
+
+    def write(self, path):
+        """Writes the tables to path in the format described above."""
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(PATTERNS), self.scale,
+                                *self.feature_weights))
+            for name, instances in PATTERNS:
+                f.write(TABLE_ENTRY.pack(name.encode(), len(instances[0])))
+            for name, instances in PATTERNS:
+                f.write(struct.pack('<{}h'.format(len(self.tables[name])),
+                                    *self.tables[name]))
+
+
+def load_tables(path):
+    """Memory-maps the pattern file at path. Returns PatternTables."""
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, count, scale, *weights = HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("{} is not a version {} pattern file".format(path, VERSION))
+
+    offset = HEADER.size
+    layout = []
+    for _ in range(count):
+        name, length = TABLE_ENTRY.unpack_from(mapped, offset)
+        layout.append((name.rstrip(b'\0').decode(), length))
+        offset += TABLE_ENTRY.size
+
+    tables = {}
+    view = memoryview(mapped)
+    for name, length in layout:
+        size = 3 ** length * 2
+        table = view[offset:offset + size]
+        if sys.byteorder == 'little':
+            tables[name] = table.cast('h')
+        else:
+            tables[name] = struct.unpack('<{}h'.format(3 ** length), table)
+        offset += size
+
+    result = PatternTables(tables, scale, weights)
+    result.mapped = mapped
+    result.path = path
+    return result
+
+
+def default_tables(weights=TOURNAMENT_WEIGHTS, scale=DEFAULT_SCALE):
+    """Pattern tables that add up to the square-table evaluation of weights:
+    each square's weight (plus one for the disc) is split evenly between the
+    instances that contain it."""
+    coverage = [len(SQUARE_INSTANCES[sq]) for sq in range(64)]
+    tables = {}
+    for name, instances in PATTERNS:
+        sqs = instances[0]
+        shares = [(weights[sq >> 3][sq & 7] + 1) / coverage[sq] / scale for sq in sqs]
+        table = []
+        for code in range(3 ** len(sqs)):
+            value = 0.0
+            for share in shares:
+                digit = code % 3
+                code //= 3
+                if digit == 1:
+                    value += share
+                elif digit == 2:
+                    value -= share
+            table.append(int(round(value)))
+        tables[name] = table
+    return PatternTables(tables, scale)
+
+
+class PatternState(BitboardState):
+    """A BitboardState that also keeps the code of every pattern instance,
+    updated as moves are made and unmade."""
+
+    __slots__ = ('codes',)
+
+    def __init__(self):
+        BitboardState.__init__(self)
+        self.codes = compute_codes(*self.bitboards())
+
+    @classmethod
+    def from_state(cls, state):
+        """Builds a PatternState from an OthelloState or BitboardState."""
+        if isinstance(state, BitboardState):
+            new_state = cls.__new__(cls)
+            new_state.player, new_state.opponent = state.player, state.opponent
+            new_state.current, new_state.move_number = state.current, state.move_number
+            new_state._moves = state._moves
+        else:
+            new_state = super().from_state(state)
+        new_state.codes = compute_codes(*new_state.bitboards())
+        return new_state
+
+    def copy(self):
+        new_state = PatternState.__new__(PatternState)
+        new_state.player = self.player
+        new_state.opponent = self.opponent
+        new_state.current = self.current
+        new_state.move_number = self.move_number
+        new_state._moves = self._moves
+        new_state.codes = self.codes[:]
+        return new_state
+
+    def apply_square(self, sq):
+        new_state = self.copy()
+        new_state.make_square(sq)
+        return new_state
+
+    def make_square(self, sq):
+        """Plays the current player at square sq on this state in place.
+        Returns an undo record for unmake_move."""
+        codes = self.codes
+        player, mover = self.player, self.current
+        undo = BitboardState.make_square(self, sq)
+
+        # The flipped discs are whatever the mover gained besides sq
+        new_player = self.player if self.current == mover else self.opponent
+        flips = new_player & ~player & ~(1 << sq)
+
+        # A black disc adds 1 and a white one 2 at its position, so placing
+        # adds once or twice the power and flipping moves it by one power
+        placed, flipped = (1, -1) if mover == 'black' else (2, 1)
+        new_codes = codes[:]
+        for index, power in SQUARE_INSTANCES[sq]:
+            new_codes[index] += placed * power
+        for flip in squares(flips):
+            for index, power in SQUARE_INSTANCES[flip]:
+                new_codes[index] += flipped * power
+        self.codes = new_codes
+
+        return undo + (codes,)
+
+    def unmake_move(self, undo):
+        (self.player, self.opponent, self.current, self.move_number, self._moves,
+         self.codes) = undo
+
+
+class PatternEvaluator():
+    """Pattern evaluation for the player to move, callable like
+    SquareTableEvaluator. Uses the codes a PatternState keeps; other states
+    have theirs computed from scratch."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.instance_tables = [tables.tables[name] for name, sqs in INSTANCES]
+        self.scale = tables.scale
+        self.mobility, self.potential, self.frontier = tables.feature_weights
+
+        if np is not None:
+            # All instance tables end to end, for fancy indexing in batches
+            self.flat = np.concatenate([np.asarray(t, dtype=np.int64)
+                                        for t in self.instance_tables])
+            offsets, offset = [], 0
+            for table in self.instance_tables:
+                offsets.append(offset)
+                offset += len(table)
+            self.offsets = np.array(offsets, dtype=np.int64)
+
+    # instance_tables may be views of a mapped file; they are rebuilt from
+    # the tables, which know how to pickle themselves
+    def __getstate__(self):
+        return {'tables': self.tables}
+
+    def __setstate__(self, state):
+        self.__init__(state['tables'])
+
+    def __call__(self, state):
+        return self.evaluate(state)
+
+    def features(self, player, opponent):
+        """Weighted mobility, potential mobility and frontier for player."""
+        empty = ~(player | opponent) & FULL
+        mobility = popcount(move_mask(player, opponent)) - popcount(move_mask(opponent, player))
+        potential = popcount(empty & neighbors(opponent)) - popcount(empty & neighbors(player))
+        frontier = popcount(player & neighbors(empty)) - popcount(opponent & neighbors(empty))
+        return self.mobility * mobility + self.potential * potential + self.frontier * frontier
+
+    def evaluate(self, state):
+        """Score of state for the player to move."""
+        if not isinstance(state, BitboardState):
+            state = BitboardState.from_state(state)
+        codes = getattr(state, 'codes', None)
+        if codes is None:
+            codes = compute_codes(*state.bitboards())
+
+        score = 0
+        for table, code in zip(self.instance_tables, codes):
+            score += table[code]
+        if state.current == 'white':
+            score = -score
+
+        return (score + self.features(state.player, state.opponent)) * self.scale
+
+    def evaluate_batch(self, states):
+        """Scores of many states, each for its own player to move. The table
+        lookups are done in one vectorized call when NumPy is available."""
+        if np is None or len(states) < 2:
+            return [self.evaluate(state) for state in states]
+
+        states = [state if isinstance(state, BitboardState) else
+                  BitboardState.from_state(state) for state in states]
+        codes = np.array([state.codes if hasattr(state, 'codes') else
+                          compute_codes(*state.bitboards()) for state in states],
+                         dtype=np.int64)
+        pattern_scores = self.flat[codes + self.offsets].sum(axis=1).tolist()
+
+        scores = []
+        for state, score in zip(states, pattern_scores):
+            if state.current == 'white':
+                score = -score
+            scores.append((score + self.features(state.player, state.opponent)) * self.scale)
+        return scores
+
+
+if __name__ == "__main__":
+    default_tables().write(sys.argv[1] if len(sys.argv) > 1 else 'patterns.bin')
@@ -5,8 +5,17 @@ Project 2: Othello
 """
 
 from othello import *
-import random, sys
-import math
+from bitboard import BitboardState
+from book import OpeningBook
+from endgame import EndgameSolver
+from evaluation import SquareTableEvaluator, TOURNAMENT_WEIGHTS, ALPHA_BETA_WEIGHTS, load_weights
+from instrumentation import SearchTracer, principal_variation
+from mcts import MCTS
+from parallel import ParallelSearch
+from patterns import PatternEvaluator, PatternState, default_tables, load_tables
+from search import SearchEngine, SearchTimeout
+from timecontrol import TimeManager, PonderClock
+import os, random, threading
 import time
 
 class MoveNotAvailableError(Exception):
@@ -30,6 +39,17 @@ class OthelloPlayer():
         has to finish the game."""
         pass
 
+    def notify_move(self, state, move):
+        """Called by OthelloGame after every move, by either player, with
+        the state after it. Players that think on the opponent's time start
+        and stop that here."""
+        pass
+
+    def cancel_background(self):
+        """Called by OthelloGame to stop any work the player is doing in
+        the background, such as at the end of the game."""
+        pass
+
 class RandomPlayer(OthelloPlayer):
     """Plays a random move."""
 
@@ -61,410 +81,315 @@ class HumanPlayer(OthelloPlayer):
             print("({}) is not a legal move for {}. Try again\n".format(move_string, state.current))
             return self.make_move(state, remaining_time)
 
-class OldTournamentPlayer(OthelloPlayer):
-    """You should implement this class as your entry into the AI Othello tournament.
-    You should implement other OthelloPlayers to try things out during your
-    experimentation, but this is the only one that will be tested against your
-    classmates' players."""
-
-    def score_board(self, state):
-        """ Give a score for ach gird as a heurstic """
-
-        # CITE: https://othellomaster.com/OM/Report/HTML/report.html
-        # HESC: A score for the othello grid that I can model mine after
-        board_heurstic =[
-        [10000, -10000, 1000,  800, 800, 1000,  -10000, 10000], \
-        [-10000, -10000, -450, -500, -500, -450, -10000, -10000], \
-        [1000,  -450,  30,  10,  10,  30,  -450, 1000], \
-        [800,  -500,  10,  50,  50,  10,  -500,  800], \
-        [800,  -500,  10,  50,  50,  10,  -500,  800], \
-        [1000,  -450,  30,  10,  10,  30,  -450, 1000], \
-        [-10000, -10000, -450, -500, -500, -450, -10000, -10000], \
-        [10000, -10000, 1000,  800, 800, 1000,  -10000, 10000]]
-
-        black_number = OthelloState.count(state, 'black')
-        white_number = OthelloState.count(state, 'white')
-
-        # Check each square and for each color, add the score of that cell to the number
-        for i in range(8):
-            for j in range(8):
-                if state.board[i][j] == 'black':
-                    black_number += board_heurstic[i][j]
-
-                if state.board[i][j] == 'white':
-                    white_number += board_heurstic[i][j]
-
-        return black_number, white_number
-
-    def alpha_beta_max_node(self, state, color, depth, alpha, beta, start_time):
-        """ Traverse through the available moves and look down the depth moves
-        ahead. So once you reach at the depth wanted, return the number of each color
-        and choose the move that maximizes the current nodes number. """
-
-        available = state.available_moves()
-
-        # The value we want to compare against
-        max_value = -math.inf
-
-        # Variable to keep track of the best move
-        end_time = time.time()
-
-        # Once you either reach the depth we want to be searched deep, or
-        # once you've used your time for each move, return the count of each color
-        if depth == 0 or len(available) == 0 or (time.time() - start_time) > 6:
-            black_number, white_number = self.score_board(state)
-
-            if state.current == 'black': return black_number
-            if state.current == 'white': return white_number
-
-        else:
-            # Traverse through each move and look to the depth given and always update
-            # the biggest score you find for the color
-            for move in available:
-                new_state = OthelloState.apply_move(copy.deepcopy(state), move)
-
-                # next_color = opposite_color(state.current)
-                new_score = self.alpha_beta_min_node(new_state, new_state.current, depth - 1, alpha, beta, start_time)
-
-                max_value = max(max_value, new_score)
-                alpha = max(new_score, alpha)
+class EnginePlayer(OthelloPlayer):
+    """ Parent class for players that search with the shared SearchEngine.
+    Subclasses choose the evaluation weights and the engine's settings. """
+
+    # The deepest search to try; the TimeManager decides how long to search
+    MAX_DEPTH = 30
+
+    # Square weights for the evaluation; see evaluation.py. Weights fitted
+    # by training.py are used instead if WEIGHTS_FILE exists; None turns
+    # that off.
+    WEIGHTS = TOURNAMENT_WEIGHTS
+    WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights.bin')
+
+    # The state class searched; it must suit the evaluation
+    STATE_CLASS = BitboardState
+
+    # Engine settings; see SearchEngine
+    PVS = True
+    ASPIRATION_WINDOW = None
+
+    # Score the children of frontier nodes in one batch. With the cheap
+    # square-table evaluation, pruning leaves one at a time is faster.
+    BATCH_LEAVES = False
+
+    # Solve the rest of the game exactly once this few squares are empty,
+    # given ENDGAME_SECONDS of soft budget; each halving of the budget below
+    # that takes a square off. The solver gets ENDGAME_FRACTION of the soft
+    # budget, and the heuristic search the rest if it doesn't finish.
+    ENDGAME_EMPTIES = 14
+    ENDGAME_SECONDS = 2.0
+    ENDGAME_FRACTION = 0.5
+
+    # Worker processes to split the root moves between; 1 searches in this
+    # process. SHARED_TABLE gives the workers one shared-memory table.
+    WORKERS = 1
+    SHARED_TABLE = False
+
+    # Opening book to play from before searching, if the file exists; see
+    # book.py. None turns the book off.
+    BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')
+
+    # File to append a JSON line to for every move, describing the search;
+    # see instrumentation.py. None turns tracing off.
+    TRACE_FILE = None
+
+    # Search on the opponent's time: guess their reply and search the
+    # position after it in a background thread. If the guess was right the
+    # search goes on as this move's search. Pays off when the players run
+    # in separate processes (play_game_timed, play_game_workers); in
+    # play_game it takes the opponent's time. PONDER_PREDICT_DEPTH is how
+    # deep to search for the guess when the table has none.
+    PONDER = False
+    PONDER_PREDICT_DEPTH = 4
 
-                if (time.time() - start_time) > 4.5: return max_value
-
-                # Keep update the alpha value until the you get a value that is big enough to be greater than the other
-                # colors, in which case, don't look at the other moves in the available list
-                if beta <= alpha:
-                    break
-
-            return max_value
-
-    def alpha_beta_min_node(self, state, color, depth, alpha, beta, start_time):
-        """ Traverse through the available moves and look down the depth moves
-        ahead. So once you reach at the depth wanted, return the number of each color
-        and choose the move that maximizes the current nodes number. """
-
-        available = state.available_moves()
-
-        # The value we want to compare against
-        max_value = math.inf
-        end_time = time.time()
-
-        # Once you either reach the depth we want to be searched deep, or
-        # once you've used your time for each move, return the count of each color
-        if depth == 0 or len(available) == 0 or (time.time() - start_time) > 6:
-            black_number, white_number = self.score_board(state)
-
-            if state.current == 'black': return black_number
-            if state.current == 'white': return white_number
-
-        else:
-            # Traverse through each move and look to the depth given and always update
-            # the biggest score you find for the color
-            for move in available:
-                new_state = OthelloState.apply_move(copy.deepcopy(state), move)
-
-                new_score = self.alpha_beta_max_node(new_state, new_state.current, depth - 1, alpha, beta, start_time)
-
-                max_value = min(new_score, max_value)
-                beta = min(new_score, beta)
-
-                if (time.time() - start_time) > 4.5: return max_value
-
-                # Keep update the alpha value until the you get a value that is big enough to be greater than the other
-                # colors, in which case, don't look at the other moves in the available list
-                if beta <= alpha:
-                    break
-
-            return max_value
+    def __init__(self, color):
+        OthelloPlayer.__init__(self, color)
+        self.evaluator = self.make_evaluator()
+
+        # The engine and its transposition table are kept for the whole game
+        self.engine = self.make_engine()
+        self.clock = TimeManager()
+        self.solver = EndgameSolver()
+        self.parallel = None
+        if self.WORKERS > 1:
+            self.parallel = ParallelSearch(self.make_engine, self.WORKERS, self.SHARED_TABLE)
+
+        # Set by OthelloGame.play_game_workers to cut a search short
+        self.cancel = None
+
+        self.book = None
+        if self.BOOK_FILE is not None and os.path.exists(self.BOOK_FILE):
+            self.book = OpeningBook(self.BOOK_FILE)
+
+        self.tracer = None
+        if self.TRACE_FILE is not None:
+            self.tracer = self.engine.tracer = SearchTracer(self.TRACE_FILE)
+
+        # The search on the opponent's time, if one is running
+        self.ponder_thread = None
+        self.ponder_cancel = None
+        self.ponder_clock = None
+        self.ponder_position = None
+        self.ponder_result = None
+
+    def weights(self):
+        """ The square weights from WEIGHTS_FILE, or WEIGHTS """
+        if self.WEIGHTS_FILE is not None and os.path.exists(self.WEIGHTS_FILE):
+            return load_weights(self.WEIGHTS_FILE)
+        return self.WEIGHTS
+
+    def make_evaluator(self):
+        """ The evaluation the engine scores leaves with """
+        return SquareTableEvaluator(self.weights())
+
+    def make_engine(self):
+        """ A SearchEngine with this player's settings """
+        return SearchEngine(self.evaluator, pvs=self.PVS,
+                            aspiration_window=self.ASPIRATION_WINDOW,
+                            evaluate_batch=self.evaluator.evaluate_batch if self.BATCH_LEAVES else None)
 
     def make_move(self, state, remaining_time):
         """Given a game state, return a move to make."""
 
-        # Give the curent time so that the functions can know how long to spend on each move
-
+        # A search on the opponent's time that guessed this position goes on
+        # as this move's search
         start_time = time.time()
-        available = state.available_moves()
-        max_value = -math.inf
-        best_move = None
-        for move in available:
-            state = OthelloState.apply_move(copy.deepcopy(state), move)
-
-            for i in range(1, 30):
-                if state.current == 'white':
-                    new_score = self.alpha_beta_min_node(state, state.current, i, -math.inf, math.inf, start_time)
-                else:
-                    new_score = self.alpha_beta_max_node(state, state.current, i, -math.inf, math.inf, start_time)
-
-            if new_score > max_value:
-                max_value = new_score
-                best_move = move
-                break
-
-        return best_move
-
-class AlphaBetaPlayer(OthelloPlayer):
-
-    def score_board(self, state):
-        """ Give a score for ach gird as a heurstic """
-
-        # CITE: https://othellomaster.com/OM/Report/HTML/report.html
-        # HESC: A score for the othello grid that I can model mine after
-        board_heurstic =[
-        [10000, -5000, 1000,  800, 800, 1000,  -5000, 10000], \
-        [-5000, -5000, -450, -500, -500, -450, -5000, -5000], \
-        [1000,  -450,  30,  10,  10,  30,  -450, 1000], \
-        [800,  -500,  10,  50,  50,  10,  -500,  800], \
-        [800,  -500,  10,  50,  50,  10,  -500,  800], \
-        [1000,  -450,  30,  10,  10,  30,  -450, 1000], \
-        [-5000, -5000, -450, -500, -500, -450, -5000, -5000], \
-        [10000, -5000, 100,  800, 800, 100,  -5000, 10000]]
-
-        black_number = OthelloState.count(state, 'black')
-        white_number = OthelloState.count(state, 'white')
-
-        # Check each square and for each color, add the score of that cell to the number
-        for i in range(8):
-            for j in range(8):
-                if state.board[i][j] == 'black':
-                    black_number += board_heurstic[i][j]
-
-                if state.board[i][j] == 'white':
-                    white_number += board_heurstic[i][j]
-
-        return black_number, white_number
-
-    def alpha_beta_max_node(self, state, color, depth, alpha, beta, start_time):
-        """ Traverse through the available moves and look down the depth moves
-        ahead. So once you reach at the depth wanted, return the number of each color
-        and choose the move that maximizes the current nodes number. """
-
-        new_state = None
-        available = state.available_moves()
-
-        # The value we want to compare against
-        max_value = -math.inf
-
-        # Variable to keep track of the best move
-        best_move = None
-        end_time = time.time()
-
-        # Once you either reach the depth we want to be searched deep, or
-        # once you've used your time for each move, return the count of each color
-        if depth == 0 or len(available) == 0:
-            black_number, white_number = self.score_board(state)
+        move = self.finish_pondering(state, remaining_time)
+        if move is not None:
+            return move
+        remaining_time -= time.time() - start_time
+
+        # Book moves cost no search time
+        if self.book is not None:
+            move = self.book.lookup(state)
+            if move is not None:
+                if self.tracer is not None:
+                    self.tracer.record(state, move, 'book')
+                return move
 
-            if state.current == 'black': return best_move, black_number - white_number
-            if state.current == 'white': return best_move, white_number - black_number
+        # Plan this move's time from what is left of the game clock
+        self.clock.start(remaining_time, state.move_number, state.count('empty'))
+        self.engine.cancel = self.solver.cancel = self.cancel
 
+        if state.count('empty') <= self.endgame_empties():
+            try:
+                budget = self.clock.soft * self.ENDGAME_FRACTION
+                move = self.solver.solve(state, time_limit=budget).move
+                if self.tracer is not None:
+                    self.tracer.record(state, move, 'endgame solved')
+                return move
+            except SearchTimeout:
+                # Too many lines to finish in time; use the heuristic search
+                pass
+
+        # Search a compact copy; the moves it returns are the same
+        root = self.STATE_CLASS.from_state(state)
+        if self.parallel is not None:
+            result = self.parallel.search(root, self.MAX_DEPTH, self.clock)
         else:
-            # Traverse through each move and look to the depth given and always update
-            # the biggest score you find for the color
-            for move in available:
-                new_state = OthelloState.apply_move(copy.deepcopy(state), move)
-
-                # next_color = opposite_color(state.current)
-                new_move, new_score = self.alpha_beta_min_node(new_state, new_state.current, depth - 1, alpha, beta, start_time)
-
-                if new_score > max_value:
-                    max_value = new_score
-                    best_move = move
-
-                alpha = max(new_score, alpha)
-
-                if (time.time() - start_time) > 4.5: return best_move, max_value
-
-                # Keep update the alpha value until the you get a value that is big enough to be greater than the other
-                # colors, in which case, don't look at the other moves in the available list
-                if beta <= alpha:
-                    break
-
-            return best_move, max_value
-
-    def alpha_beta_min_node(self, state, color, depth, alpha, beta, start_time):
-        """ Traverse through the available moves and look down the depth moves
-        ahead. So once you reach at the depth wanted, return the number of each color
-        and choose the move that maximizes the current nodes number. """
-
-        new_state = None
-        available = state.available_moves()
-
-        # The value we want to compare against
-        max_value = math.inf
-        best_move = None
-        end_time = time.time()
-
-        # Once you either reach the depth we want to be searched deep, or
-        # once you've used your time for each move, return the count of each color
-        if depth == 0 or len(available) == 0:
-            black_number, white_number = self.score_board(state)
-
-            if  state.current == 'black': return best_move, black_number - white_number
-            else: return best_move, white_number - black_number
-
+            result = self.engine.search(root, self.MAX_DEPTH, clock=self.clock)
+        return result.move
+
+    def endgame_empties(self):
+        """The most empty squares to solve exactly with this move's soft
+        budget; the clock must be started."""
+        empties, seconds = self.ENDGAME_EMPTIES, self.ENDGAME_SECONDS
+        while empties > 0 and self.clock.soft < seconds:
+            empties -= 1
+            seconds /= 2
+        return empties
+
+    def notify_move(self, state, move):
+        """Starts pondering once the opponent is to move, and stops it if
+        the opponent played something other than the guess."""
+        if not self.PONDER or self.parallel is not None:
+            return
+        if self.ponder_thread is not None and not self.ponder_hit(state):
+            self.cancel_background()
+        if (self.ponder_thread is None and state.current != self.color and
+                not state.game_over() and state.count('empty') > self.ENDGAME_EMPTIES):
+            self.ponder_cancel = threading.Event()
+            self.ponder_clock = PonderClock()
+            self.ponder_thread = threading.Thread(target=self.ponder,
+                                                  args=(self.STATE_CLASS.from_state(state),))
+            self.ponder_thread.daemon = True
+            self.ponder_thread.start()
+
+    def ponder(self, root):
+        """Runs in the pondering thread: guesses the opponent's reply in
+        root and searches the position after it."""
+        engine = self.engine
+        engine.cancel = self.ponder_cancel
+        guess = principal_variation(root, engine.table, 1)
+        if guess:
+            r, c = guess[0]
+            move = OthelloMove(r, c, root.current)
         else:
-            # Traverse through each move and look to the depth given and always update
-            # the biggest score you find for the color
-            for move in available:
-                new_state = OthelloState.apply_move(copy.deepcopy(state), move)
-
-                # next_color = opposite_color(state.current)
-
-                new_move, new_score = self.alpha_beta_max_node(new_state, new_state.current, depth - 1, alpha, beta, start_time)
-
-                if new_score < max_value:
-                    max_value = new_score
-                    best_move = move
-
-                beta = min(new_score, beta)
-
-                if (time.time() - start_time) > 4.5: return best_move, max_value
-
-                # Keep update the alpha value until the you get a value that is big enough to be greater than the other
-                # colors, in which case, don't look at the other moves in the available list
-                if beta <= alpha:
-                    break
-
-            return best_move, max_value
-
-    def make_move(self, state, remaining_time):
-        """Given a game state, return a move to make."""
-
-        # Give the curent time so that the functions can know how long to spend on each move
+            move = engine.search(root, self.PONDER_PREDICT_DEPTH).move
+        if move is None or self.ponder_cancel.is_set():
+            return
+
+        root.make_move(move)
+        if root.current != self.color:
+            # We would have to pass; nothing to search
+            return
+        self.ponder_position = (root.bitboards(), root.current)
+        self.ponder_result = engine.search(root, self.MAX_DEPTH, clock=self.ponder_clock)
+
+    def ponder_hit(self, state):
+        """True if state is the position being pondered."""
+        return self.ponder_position == (state.bitboards(), state.current)
+
+    def finish_pondering(self, state, remaining_time):
+        """Returns the pondering search's move if it was for state, letting
+        it run on within this move's time; otherwise stops it and returns
+        None. Also None if the search was stopped before it had a move."""
+        if self.ponder_thread is None:
+            return None
+        if not self.ponder_hit(state):
+            self.cancel_background()
+            return None
+
+        self.clock.start(remaining_time, state.move_number, state.count('empty'))
+        self.ponder_clock.attach(self.clock)
+        self.engine.deadline = self.clock.deadline
+
+        # Cancelling keeps the deadline even if the search read it before
+        # the clock was attached
+        self.ponder_thread.join(max(0.0, self.clock.deadline - time.time()))
+        self.ponder_cancel.set()
+        self.ponder_thread.join()
+        result = self.ponder_result
+        self.cancel_background()
+        if result is None or result.move is None:
+            return None
+        if self.tracer is not None:
+            self.tracer.record(state, result.move, 'ponder hit')
+        return result.move
+
+    def cancel_background(self):
+        """Stops pondering, if it is running."""
+        if self.ponder_thread is not None:
+            self.ponder_cancel.set()
+            self.ponder_thread.join()
+        self.ponder_thread = self.ponder_cancel = self.ponder_clock = None
+        self.ponder_position = self.ponder_result = None
+        self.engine.cancel = self.cancel
+
+class OldTournamentPlayer(EnginePlayer):
+    """You should implement this class as your entry into the AI Othello tournament.
+    You should implement other OthelloPlayers to try things out during your
+    experimentation, but this is the only one that will be tested against your
+    classmates' players."""
 
-        start_time = time.time()
+    # Plain alpha-beta on the hand-made weights, as this player has always
+    # searched
+    PVS = False
+    WEIGHTS_FILE = None
 
-        for i in range(1, 30):
-            state = copy.deepcopy(state)
-            if state.current == 'black':
-                best_move, best_score = self.alpha_beta_max_node(state, state.current, i, -math.inf, math.inf, start_time)
-            if state.current == 'white':
-                best_move, best_score = self.alpha_beta_min_node(state, state.current, i, -math.inf, math.inf, start_time)
+class AlphaBetaPlayer(EnginePlayer):
+    """ Alpha-beta player with principal variation search """
 
-                return best_move
+    WEIGHTS = ALPHA_BETA_WEIGHTS
 
-class TournamentPlayer(OthelloPlayer):
+class TournamentPlayer(EnginePlayer):
     """ An intelligent player to play the game """
 
-    def count_numbers(self, state):
-        """ Count and return the number of each color on the board """
+    # Principal variation search inside an aspiration window
+    ASPIRATION_WINDOW = 500
 
-        board_heurstic =[
-        [10000, -10000, 1000,  800, 800, 1000,  -10000, 10000], \
-        [-10000, -10000, -450, -500, -500, -450, -10000, -10000], \
-        [1000,  -450,  30,  10,  10,  30,  -450, 1000], \
-        [800,  -500,  10,  50,  50,  10,  -500,  800], \
-        [800,  -500,  10,  50,  50,  10,  -500,  800], \
-        [1000,  -450,  30,  10,  10,  30,  -450, 1000], \
-        [-10000, -10000, -450, -500, -500, -450, -10000, -10000], \
-        [10000, -10000, 1000,  800, 800, 1000,  -10000, 10000]]
+class PonderingPlayer(TournamentPlayer):
+    """ TournamentPlayer that also searches on the opponent's time """
 
-        black_number = OthelloState.count(state, 'black')
-        white_number = OthelloState.count(state, 'white')
+    PONDER = True
 
-        # Check each square and for each color, add the score of that cell to the number
-        for i in range(8):
-            for j in range(8):
-                if state.board[i][j] == 'black':
-                    black_number += board_heurstic[i][j]
+class PatternPlayer(EnginePlayer):
+    """ Searches with the pattern evaluation from patterns.py """
 
-                if state.board[i][j] == 'white':
-                    white_number += board_heurstic[i][j]
+    STATE_CLASS = PatternState
+    ASPIRATION_WINDOW = 500
 
-        return black_number, white_number
+    # Pattern tables to load; the defaults are used if the file is missing
+    PATTERN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patterns.bin')
 
+    def make_evaluator(self):
+        """ Pattern evaluation from PATTERN_FILE """
+        if os.path.exists(self.PATTERN_FILE):
+            return PatternEvaluator(load_tables(self.PATTERN_FILE))
+        return PatternEvaluator(default_tables(self.weights()))
 
-    def minimax_max_node(self, state, color, depth, alpha, beta, start_time):
-        """ Traverse through the available moves and look down the depth moves
-        ahead. So once you reach at the depth wanted, return the number of each color
-        and choose the move that maximizes the current nodes number. """
+class MCTSPlayer(OthelloPlayer):
+    """ Monte Carlo tree search with UCT; see mcts.py """
 
-        available = state.available_moves()
+    # UCB exploration constant; higher tries weaker-looking moves more
+    EXPLORATION = 1.4
 
-        # The value we want to compare against
-        max_value = -math.inf
+    # Random games played from each new leaf
+    PLAYOUTS_PER_LEAF = 1
 
-        # Variable to keep track of the best move
-        best_move = None
-        end_time = time.time()
-
-        # Once you either reach the depth we want to be searched deep, or
-        # once you've used your time for each move, return the count of each color
-        if depth == 0 or len(available) == 0:
-            black_number, white_number = self.count_numbers(state)
-            if state.current == 'black': return best_move, black_number
-            if state.current == 'white': return best_move, white_number
-
-        else:
-            # Traverse through each move and look to the depth given and always update
-            # the biggest score you find for the color
-            for move in available:
-                new_state = OthelloState.apply_move(copy.deepcopy(state), move)
+    # Worker processes for the playouts; 1 plays them in this process.
+    # Leaves are sent to the workers BATCH_SIZE at a time, each adding
+    # VIRTUAL_LOSS lost visits to its path until its result comes back.
+    WORKERS = 1
+    BATCH_SIZE = 16
+    VIRTUAL_LOSS = 1
 
-                new_move, new_score = self.minimax_min_node(new_state, new_state.current, depth - 1, alpha, beta, start_time)
-
-                if new_score >= max_value:
-                    max_value = new_score
-                    best_move = move
-                alpha = max(alpha, new_score)
-
-                if alpha >= beta or (time.time() - start_time) > 4.5:
-                    break
-
-            return best_move, max_value
-
-    def minimax_min_node(self, state, color, depth, alpha, beta, start_time):
-        """ Traverse through the available moves and look down the depth moves
-        ahead. So once you reach at the depth wanted, return the number of each color
-        and choose the move that maximizes the current nodes number. """
-
-        # new_state = copy.deepcopy(state)
-        available = state.available_moves()
+    # Keep the subtree of the position reached from the last search
+    REUSE_TREE = True
 
-        # The value we want to compare against
-        max_value = math.inf
-
-        # Variable to keep track of the best move
-        best_move = None
-        end_time = time.time()
-
-        # Once you either reach the depth we want to be searched deep, or
-        # once you've used your time for each move, return the count of each color
-        if depth == 0 or len(available) == 0:
-            black_number, white_number = self.count_numbers(state)
-            if state.current == 'black': return best_move, black_number
-            if state.current == 'white': return best_move, white_number
-
-        else:
-            # Traverse through each move and look to the depth given and always update
-            # the biggest score you find for the color
-            for move in available:
-                new_state = OthelloState.apply_move(copy.deepcopy(state), move)
-
-                new_move, new_score = self.minimax_max_node(new_state, new_state.current, depth - 1, alpha, beta, start_time)
-
-                if new_score <= max_value:
-                    max_value = new_score
-                    best_move = move
-                beta = min(beta, new_score)
-
-                if alpha >= beta or (time.time() - start_time) > 4.5:
-                    break
+    def __init__(self, color):
+        OthelloPlayer.__init__(self, color)
+        self.tree = MCTS(self.EXPLORATION, self.PLAYOUTS_PER_LEAF, self.WORKERS,
+                         self.BATCH_SIZE, self.VIRTUAL_LOSS)
+        self.clock = TimeManager()
 
-            return best_move, max_value
+        # Set by OthelloGame.play_game_workers to cut a search short
+        self.cancel = None
 
     def make_move(self, state, remaining_time):
         """Given a game state, return a move to make."""
-
-        # Give the curent time so that the functions can know how long to spend on each move
-        start_time = time.time()
-        for i in range(30):
-            state = copy.deepcopy(state)
-            if state.current == 'white':
-                best_move, best_score = self.minimax_max_node(state, state.current, i, -math.inf, math.inf, start_time)
-            else:
-                best_move, best_score = self.minimax_max_node(state, state.current, i, -math.inf, math.inf, start_time)
-
-        return best_move
+        self.clock.start(remaining_time, state.move_number, state.count('empty'))
+        black, white = state.bitboards()
+        self.tree.set_root(black, white, state.current, self.REUSE_TREE)
+        self.tree.search(time_limit=self.clock.soft, cancel=self.cancel)
+        sq = self.tree.best_square()
+        if sq is None:
+            # Cancelled or out of time before the root had a child
+            return state.available_moves()[0]
+        return OthelloMove(sq >> 3, sq & 7, state.current)
 ################################################################################
 
 def main():
@@ -485,7 +410,7 @@ def main():
     for _ in range(10):
         game = copy.deepcopy(OthelloGame(black_player, white_player, verbose=True))
 
-        winner = game.play_game_timed()
+        winner = game.play_game_workers()
         result.append(winner)
         # if winner is 'white': break
 
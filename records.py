@@ -0,0 +1,267 @@
+"""
+CS 375
+Compact binary game records for the Othello board game.
+
+An archive is a file of games back to back, little-endian:
+
+    4s    magic b'OTHG'
+    H     format version, 1
+    then for every game:
+    H     number of moves N
+    16s   black player's name
+    16s   white player's name
+    Q Q   black and white discs of the starting position
+    B     player to move at the start, 0 for black and 1 for white
+    B     move number at the start
+    B     result: 0 draw, 1 black won, 2 white won, 255 unknown
+    f f   black's and white's remaining seconds at the end
+    N x   B square of each move, r * 8 + c
+
+Passes are not stored; the player to move after each move follows from the
+rules. GameWriter appends games as they finish and keeps an index file
+next to the archive (the archive's path plus '.idx') holding the offset of
+every game as a Q. GameArchive memory-maps both, so any game can be read by
+its index and iterating over an archive of millions of games needs only a
+page or two of memory at a time.
+"""
+
+import array, mmap, os, struct, sys
+
+from bitboard import BLACK_START, WHITE_START
+from othello import OthelloMove, OthelloState
+
+MAGIC = b'OTHG'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sH')
+GAME_HEADER = struct.Struct('<H16s16sQQBBBff')
+OFFSET = struct.Struct('<Q')
+
+RESULTS = ['draw', 'black', 'white']
+UNKNOWN_RESULT = 255
+
+
+class GameRecord():
+    """One game: the players' names, the starting position, the moves as
+    a bytes of squares, the winner ('black', 'white', 'draw' or None) and
+    the remaining times at the end."""
+
+    def __init__(self, black, white, moves=b'', winner=None, black_time=0.0, white_time=0.0,
+                 start=(BLACK_START, WHITE_START, 'black', 0)):
+        self.black = black
+        self.white = white
+        self.moves = bytes(moves)
+        self.winner = winner
+        self.black_time = black_time
+        self.white_time = white_time
+
+        # (black, white, current, move_number) of the starting position
+        self.start = start
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __eq__(self, other):
+        return isinstance(other, GameRecord) and self.pack() == other.pack()
+
+    def __repr__(self):
+        return "GameRecord({} vs {}, {} moves, winner={})".format(
+            self.black, self.white, len(self.moves), self.winner)
+
+    def pack(self):
+        """The record as bytes in the archive format."""
+        black, white, current, move_number = self.start
+        result = UNKNOWN_RESULT if self.winner is None else RESULTS.index(self.winner)
+        return GAME_HEADER.pack(len(self.moves), self.black.encode()[:16], self.white.encode()[:16],
+                                black, white, current == 'white', move_number, result,
+                                self.black_time, self.white_time) + self.moves
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        """Reads the record at offset in buffer. Returns (record, offset of
+        the next record)."""
+        (count, black_name, white_name, black, white, white_to_move, move_number,
+         result, black_time, white_time) = GAME_HEADER.unpack_from(buffer, offset)
+        offset += GAME_HEADER.size
+        record = cls(black_name.rstrip(b'\0').decode(), white_name.rstrip(b'\0').decode(),
+                     buffer[offset:offset + count],
+                     None if result == UNKNOWN_RESULT else RESULTS[result],
+                     black_time, white_time,
+                     (black, white, 'white' if white_to_move else 'black', move_number))
+        return record, offset + count
+
+    def start_state(self):
+        """The OthelloState the game started from."""
+        return OthelloState.from_bitboards(*self.start)
+
+    def pairs(self):
+        """The (r, c) of each move."""
+        return [(sq >> 3, sq & 7) for sq in self.moves]
+
+    def states(self):
+        """Generates the state before the first move and after each move,
+        replaying the moves one at a time."""
+        state = self.start_state()
+        yield state
+        for sq in self.moves:
+            state = state.apply_move(OthelloMove(sq >> 3, sq & 7, state.current))
+            yield state
+
+
+class GameRecorder():
+    """Builds a GameRecord of a game as it is played; pass one to
+    OthelloGame as its recorder. record is the last finished game."""
+
+    def __init__(self):
+        self.record = None
+        self.moves = None
+        self.start = None
+
+    def start_game(self, game):
+        black, white = game.board.bitboards()
+        self.start = (black, white, game.board.current, game.board.move_number)
+        self.moves = bytearray()
+
+    def add_move(self, move):
+        r, c = move.pair
+        self.moves.append(r * 8 + c)
+
+    def end_game(self, game, winner):
+        self.record = GameRecord(type(game.black_player).__name__,
+                                 type(game.white_player).__name__,
+                                 self.moves, winner, game.black_time, game.white_time,
+                                 self.start)
+        self.moves = None
+        self.finished(self.record)
+
+    def finished(self, record):
+        """Called with every finished record."""
+        pass
+
+
+class GameWriter(GameRecorder):
+    """Appends games to the archive at path, creating it if needed. Games
+    are written as soon as they finish, so memory use doesn't grow with the
+    number of games. Use as a context manager or call close()."""
+
+    def __init__(self, path):
+        GameRecorder.__init__(self)
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            check_header(path)
+            if not os.path.exists(path + '.idx'):
+                write_index(path)
+
+        self.file = open(path, 'ab')
+        if new:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+        self.index = open(path + '.idx', 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, record):
+        """Appends record to the archive."""
+        self.index.write(OFFSET.pack(self.file.tell()))
+        self.file.write(record.pack())
+
+    def finished(self, record):
+        self.write(record)
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+
+def check_header(path):
+    """Raises ValueError if path isn't a game archive of this version."""
+    with open(path, 'rb') as f:
+        header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header) != (MAGIC, VERSION):
+        raise ValueError("{} is not a version {} game archive".format(path, VERSION))
+
+
+def scan_offsets(buffer):
+    """The offset of every game in the archive in buffer, found by walking
+    it."""
+    offsets = array.array('Q')
+    offset = FILE_HEADER.size
+    while offset + GAME_HEADER.size <= len(buffer):
+        offsets.append(offset)
+        offset += GAME_HEADER.size + GAME_HEADER.unpack_from(buffer, offset)[0]
+    return offsets
+
+
+def write_index(path):
+    """Rebuilds the index file of the archive at path."""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            offsets = scan_offsets(mapped)
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    with open(path + '.idx', 'wb') as f:
+        offsets.tofile(f)
+
+
+def read_games(path):
+    """Generates the records of the archive at path in order, reading the
+    file as a stream instead of mapping it."""
+    check_header(path)
+    with open(path, 'rb') as f:
+        f.seek(FILE_HEADER.size)
+        while True:
+            header = f.read(GAME_HEADER.size)
+            if len(header) < GAME_HEADER.size:
+                break
+            moves = f.read(GAME_HEADER.unpack(header)[0])
+            yield GameRecord.unpack_from(header + moves)[0]
+
+
+class GameArchive():
+    """Random access to the games of an archive by index, through
+    memory-mapped views of the archive and its index file. Without an
+    index file the offsets are found with one pass over the archive."""
+
+    def __init__(self, path):
+        check_header(path)
+        with open(path, 'rb') as f:
+            self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.index_mapped = None
+        index_path = path + '.idx'
+        if os.path.exists(index_path) and os.path.getsize(index_path) > 0:
+            with open(index_path, 'rb') as f:
+                self.index_mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if sys.byteorder == 'little':
+                self.offsets = memoryview(self.index_mapped).cast('Q')
+            else:
+                self.offsets = array.array('Q', self.index_mapped)
+                self.offsets.byteswap()
+        else:
+            self.offsets = scan_offsets(self.mapped)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("game index out of range")
+        return GameRecord.unpack_from(self.mapped, self.offsets[index])[0]
+
+    def __iter__(self):
+        offset = FILE_HEADER.size
+        while offset + GAME_HEADER.size <= len(self.mapped):
+            record, offset = GameRecord.unpack_from(self.mapped, offset)
+            yield record
+
+    def close(self):
+        if isinstance(self.offsets, memoryview):
+            self.offsets.release()
+        self.mapped.close()
+        if self.index_mapped is not None:
+            self.index_mapped.close()
@@ -0,0 +1,265 @@
+"""
+CS 375
+Search engine shared by the Othello search players.
+
+The engine runs iterative-deepening negamax with alpha-beta pruning,
+principal variation search and aspiration windows. Scores are always from
+the point of view of the player to move. It works on any state with the
+OthelloState interface plus make_move/unmake_move and a zobrist hash.
+"""
+
+import time
+
+from ordering import MoveOrderer
+from symmetry import distinct_moves
+from transposition import TranspositionTable, bound_flag, EXACT
+
+# Larger than any evaluation; a won game scores WIN_SCORE plus the margin
+INFINITY = 10 ** 9
+WIN_SCORE = 10 ** 7
+
+# How many nodes to search between looks at the clock
+NODES_PER_TIME_CHECK = 64
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the deadline has passed."""
+    pass
+
+
+class SearchResult():
+    """The outcome of a search: the best move, its score, the deepest
+    completed depth, and how many nodes and seconds it took."""
+
+    def __init__(self, move, score, depth, nodes, elapsed):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return "SearchResult({}, score={}, depth={}, nodes={}, {:0.2f}s)".format(
+            self.move, self.score, self.depth, self.nodes, self.elapsed)
+
+
+def final_score(state):
+    """Score of a finished game for the player to move."""
+    mine = state.count(state.current)
+    theirs = state.count('white' if state.current == 'black' else 'black')
+    diff = mine - theirs
+    if diff > 0:
+        return WIN_SCORE + diff
+    if diff < 0:
+        return -WIN_SCORE + diff
+    return 0
+
+
+class SearchEngine():
+    """Iterative-deepening negamax search.
+
+    evaluate(state) scores a position for state.current. pvs turns on
+    principal variation search; aspiration_window is the half-width of the
+    window each iteration starts with around the last score, or None to
+    always search with a full window. orderer ranks the moves at each node.
+
+    evaluate_batch(states), if given, scores a list of states at once; nodes
+    one ply above the leaves then score all their children in one call.
+    States must have a cheap apply_move for this to pay off."""
+
+    def __init__(self, evaluate, table=None, pvs=True, aspiration_window=None,
+                 orderer=None, evaluate_batch=None):
+        self.evaluate = evaluate
+        self.evaluate_batch = evaluate_batch
+        self.table = table if table is not None else TranspositionTable()
+        self.orderer = orderer if orderer is not None else MoveOrderer()
+        self.pvs = pvs
+        self.aspiration_window = aspiration_window
+
+        self.nodes = 0
+        self.deadline = None
+
+        # Anything with is_set(), such as a multiprocessing.Event; once set
+        # the search stops as if the deadline had passed
+        self.cancel = None
+
+        # An instrumentation.SearchTracer told about every iteration, or None
+        self.tracer = None
+
+    def stopped(self):
+        """True once the deadline has passed or the search was cancelled."""
+        if self.cancel is not None and self.cancel.is_set():
+            return True
+        return self.deadline is not None and time.time() > self.deadline
+
+    def search(self, state, max_depth, time_limit=None, clock=None):
+        """Searches state, which is modified during the search but restored
+        before returning, one depth at a time up to max_depth or until
+        time_limit seconds have passed. clock is an optional started
+        TimeManager that decides when to stop instead. Returns a
+        SearchResult for the deepest iteration that finished."""
+        start_time = time.time()
+        if clock is not None:
+            self.deadline = clock.deadline
+        elif time_limit is not None:
+            self.deadline = start_time + time_limit
+        else:
+            self.deadline = None
+        self.nodes = 0
+        self.table.new_search()
+        self.orderer.new_search()
+
+        moves = state.available_moves()
+        if not moves:
+            return SearchResult(None, final_score(state), 0, 0, 0.0)
+
+        # In a symmetric position some moves are mirror images of others
+        moves = distinct_moves(*state.bitboards(), moves)
+        best_move, best_score, completed = moves[0], None, 0
+        if self.tracer is not None:
+            self.tracer.search_started(self, state)
+
+        reason = 'max depth'
+        for depth in range(1, max_depth + 1):
+            try:
+                best_move, best_score = self.aspiration_search(state, moves, depth, best_move, best_score)
+            except SearchTimeout:
+                reason = 'cancelled' if self.cancel is not None and self.cancel.is_set() else 'deadline'
+                break
+            completed = depth
+            if self.tracer is not None:
+                self.tracer.iteration_done(self, state, depth, best_move, best_score)
+
+            # Nothing left to find once every line reaches the end of the game
+            if abs(best_score) >= WIN_SCORE:
+                reason = 'game decided'
+                break
+            if depth >= state.count('empty'):
+                reason = 'end of game'
+                break
+
+            if clock is not None:
+                clock.iteration_done(depth, self.nodes)
+                if not clock.can_start_next():
+                    reason = 'time budget'
+                    break
+
+        result = SearchResult(best_move, best_score, completed, self.nodes,
+                              time.time() - start_time)
+        if self.tracer is not None:
+            self.tracer.search_done(self, state, result, reason)
+        return result
+
+    def aspiration_search(self, state, moves, depth, best_move, guess):
+        """Searches the root with a narrow window around guess, widening it
+        to a full window if the score falls outside."""
+        window = self.aspiration_window
+        if window is None or guess is None:
+            return self.search_root(state, moves, depth, -INFINITY, INFINITY, best_move)
+
+        alpha, beta = guess - window, guess + window
+        move, score = self.search_root(state, moves, depth, alpha, beta, best_move)
+        if score <= alpha or score >= beta:
+            move, score = self.search_root(state, moves, depth, -INFINITY, INFINITY, best_move)
+        return move, score
+
+    def search_root(self, state, moves, depth, alpha, beta, first_move):
+        """Searches every root move, first_move first. Returns (move, score)."""
+        ordered = self.orderer.order(moves, 0, first_move.pair)
+        best_move, best_score = first_move, -INFINITY
+        window = (alpha, beta)
+
+        for i, move in enumerate(ordered):
+            score = self.search_move(state, move, depth - 1, 1, alpha, beta, i == 0)
+            if score > best_score:
+                best_move, best_score = move, score
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                self.orderer.cutoff(move, 0, depth, i)
+                break
+
+        self.table.store(state.zobrist, depth, best_score,
+                         bound_flag(best_score, *window), best_move.pair)
+        return best_move, best_score
+
+    def search_move(self, state, move, depth, ply, alpha, beta, first):
+        """Plays move and searches the result, ply moves from the root, with
+        window (alpha, beta) from the mover's point of view. Moves after the first are searched with a
+        null window first and only re-searched if they beat alpha."""
+        player = state.current
+        undo = state.make_move(move)
+        try:
+            # After a pass the same player moves again, so there is no negation
+            if state.current == player:
+                if first or not self.pvs:
+                    return self.negamax(state, depth, ply, alpha, beta)
+                score = self.negamax(state, depth, ply, alpha, alpha + 1)
+                if alpha < score < beta:
+                    score = self.negamax(state, depth, ply, score, beta)
+                return score
+
+            if first or not self.pvs:
+                return -self.negamax(state, depth, ply, -beta, -alpha)
+            score = -self.negamax(state, depth, ply, -alpha - 1, -alpha)
+            if alpha < score < beta:
+                score = -self.negamax(state, depth, ply, -beta, -score)
+            return score
+        finally:
+            state.unmake_move(undo)
+
+    def negamax(self, state, depth, ply, alpha, beta):
+        """Value of state for the player to move, searched depth plies. ply
+        is the distance from the root."""
+        self.nodes += 1
+        if self.nodes % NODES_PER_TIME_CHECK == 0 and self.stopped():
+            raise SearchTimeout()
+
+        moves = state.available_moves()
+        if not moves:
+            return final_score(state)
+        if depth <= 0:
+            return self.evaluate(state)
+
+        # Reuse what an earlier search found out about this position
+        key = state.zobrist
+        cached, alpha, beta, hash_move = self.table.lookup(key, depth, alpha, beta)
+        if cached is not None:
+            return cached
+        window = (alpha, beta)
+
+        if depth == 1 and self.evaluate_batch is not None:
+            best_move, best_score = self.frontier(state, moves)
+            self.table.store(key, depth, best_score, EXACT, best_move.pair)
+            return best_score
+
+        best_move, best_score = None, -INFINITY
+        for i, move in enumerate(self.orderer.order(moves, ply, hash_move)):
+            score = self.search_move(state, move, depth - 1, ply + 1, alpha, beta, i == 0)
+            if score > best_score:
+                best_move, best_score = move, score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.orderer.cutoff(move, ply, depth, i)
+                        break
+
+        self.table.store(key, depth, best_score, bound_flag(best_score, *window), best_move.pair)
+        return best_score
+
+    def frontier(self, state, moves):
+        """Searches state one ply deep by scoring every child in one
+        evaluate_batch call. Returns (move, score)."""
+        player = state.current
+        children = [state.apply_move(move) for move in moves]
+        self.nodes += len(children)
+        scores = self.evaluate_batch(children)
+
+        best_move, best_score = None, -INFINITY
+        for move, child, score in zip(moves, children, scores):
+            if child.game_over():
+                score = final_score(child)
+            if child.current != player:
+                score = -score
+            if score > best_score:
+                best_move, best_score = move, score
+        return best_move, best_score
@@ -0,0 +1,308 @@
+"""
+CS 375
+Long-running engine server for the Othello players.
+
+One process keeps an EnginePlayer, with its transposition table and opening
+book, warm across requests and answers a line-based protocol on standard
+input/output and, optionally, on a local TCP or Unix socket. Searches run
+in a worker thread, so the server keeps reading while one is going: stop
+cuts it short, and searches from several clients wait their turn in
+order.
+
+Commands, one per line; squares are written like f5, the letter being the
+column and the digit the row counting from 1:
+
+    position startpos [moves f5 d6 ...]
+    position <64 squares> <X|O> [moves ...]    squares as in analysis.py
+    go [depth N] [movetime S] [time S]
+    stop
+    info
+    isready
+    quit
+
+go searches the client's position. With depth and/or movetime it runs a
+fixed search; with time (the seconds left on a game clock) it plays as the
+player would in a game, using the book, time management and the endgame
+solver. While searching the server sends "info depth ... score ... nodes
+... time ... pv ..." for each finished iteration, then "bestmove f5" (or
+"bestmove none" when there is no move). info reports the server's
+counters; isready answers readyok; anything else gets "error ...".
+
+    python server.py
+    python server.py --port 5375 --player PatternPlayer
+
+With --port 0 the OS picks the port; the server announces where it
+listens with "info listening ..." on standard output. See harness.py for
+an end-to-end check.
+"""
+
+import argparse, asyncio, sys, threading, time
+
+from analysis import parse_position
+from instrumentation import principal_variation
+from othello import OthelloMove, OthelloState
+from project2 import AlphaBetaPlayer, OldTournamentPlayer, TournamentPlayer, PatternPlayer
+
+# Players the server can run, by name
+PLAYERS = {
+    'AlphaBetaPlayer': AlphaBetaPlayer,
+    'OldTournamentPlayer': OldTournamentPlayer,
+    'TournamentPlayer': TournamentPlayer,
+    'PatternPlayer': PatternPlayer,
+}
+
+# Longest principal variation sent in info lines
+PV_LENGTH = 12
+
+
+def square_name(pair):
+    """The name of the (r, c) square, like f5."""
+    return "{}{}".format(chr(ord('a') + pair[1]), pair[0] + 1)
+
+
+def parse_square(name):
+    """The (r, c) pair of a square name like f5; raises ValueError."""
+    if len(name) != 2 or not 'a' <= name[0].lower() <= 'h' or not '1' <= name[1] <= '8':
+        raise ValueError("bad square {!r}".format(name))
+    return int(name[1]) - 1, ord(name[0].lower()) - ord('a')
+
+
+def parse_setup(words):
+    """The OthelloState for the words after "position"; raises ValueError."""
+    if 'moves' in words:
+        split = words.index('moves')
+        setup, moves = words[:split], words[split + 1:]
+    else:
+        setup, moves = words, []
+
+    if setup == ['startpos']:
+        state = OthelloState()
+    else:
+        state = parse_position(' '.join(setup))
+
+    for name in moves:
+        r, c = parse_square(name)
+        move = OthelloMove(r, c, state.current)
+        if move not in state.available_moves():
+            raise ValueError("{} is not a legal move for {}".format(name, state.current))
+        state = state.apply_move(move)
+    return state
+
+
+def parse_limits(words):
+    """{'depth', 'movetime', 'time'} limits for the words after "go"."""
+    limits = {}
+    for key, value in zip(words[::2], words[1::2]):
+        if key == 'depth':
+            limits[key] = int(value)
+        elif key in ('movetime', 'time'):
+            limits[key] = float(value)
+        else:
+            raise ValueError("unknown limit {!r}".format(key))
+    if len(words) % 2:
+        raise ValueError("missing value for {!r}".format(words[-1]))
+    return limits
+
+
+class InfoReporter():
+    """Engine tracer that sends an info line for every finished
+    iteration."""
+
+    def __init__(self, send):
+        self.send = send
+
+    def search_started(self, engine, state):
+        self.start_time = time.time()
+
+    def iteration_done(self, engine, state, depth, move, score):
+        pv = principal_variation(state, engine.table, PV_LENGTH)
+        self.send("info depth {} score {} nodes {} time {:0.3f} pv {}".format(
+            depth, score, engine.nodes, time.time() - self.start_time,
+            ' '.join(square_name(pair) for pair in pv)))
+
+    def search_done(self, engine, state, result, reason):
+        pass
+
+
+class EngineServer():
+    """The warm player shared by every client. Searches run one at a time
+    in a worker thread, in the order they were asked for."""
+
+    def __init__(self, player_class):
+        self.name = player_class.__name__
+        self.player = player_class('black')
+        self.lock = asyncio.Lock()
+        self.searching = False
+        self.queued = 0
+        self.searches = 0
+        self.clients = 0
+
+    async def search(self, state, limits, cancel, send):
+        """Searches state in a worker thread once no other search is
+        running. Returns the move, or None."""
+        self.queued += 1
+        try:
+            await self.lock.acquire()
+        finally:
+            self.queued -= 1
+        self.searching = True
+        try:
+            loop = asyncio.get_running_loop()
+            threadsafe_send = lambda line: loop.call_soon_threadsafe(send, line)
+            return await loop.run_in_executor(None, self.run_search, state, limits,
+                                              cancel, threadsafe_send)
+        finally:
+            self.searching = False
+            self.searches += 1
+            self.lock.release()
+
+    def run_search(self, state, limits, cancel, send):
+        """Runs in the worker thread."""
+        player = self.player
+        player.color = state.current
+        player.cancel = player.engine.cancel = player.solver.cancel = cancel
+        player.engine.tracer = InfoReporter(send)
+        try:
+            if 'time' in limits and 'depth' not in limits and 'movetime' not in limits:
+                return player.make_move(state, limits['time'])
+            root = player.STATE_CLASS.from_state(state)
+            return player.engine.search(root, limits.get('depth', player.MAX_DEPTH),
+                                        time_limit=limits.get('movetime')).move
+        finally:
+            player.engine.tracer = None
+
+    def info(self):
+        """The server's counters as an info line."""
+        engine = self.player.engine
+        book = self.player.book
+        return ("info player {} clients {} searches {} searching {} queued {} "
+                "table_probes {} table_hits {} book_lookups {} book_hits {}").format(
+                    self.name, self.clients, self.searches, 'yes' if self.searching else 'no',
+                    self.queued, engine.table.probes, engine.table.hits,
+                    book.lookups if book is not None else 0, book.hits if book is not None else 0)
+
+
+class Session():
+    """One client's position and search. send writes a line back to the
+    client."""
+
+    def __init__(self, server, send):
+        self.server = server
+        self.send = send
+        self.state = OthelloState()
+        self.task = None
+        self.cancel = None
+
+    async def handle(self, line):
+        """Carries out one command. Returns False once the client quits."""
+        words = line.split()
+        if not words:
+            return True
+        command, words = words[0], words[1:]
+        try:
+            if command == 'position':
+                self.state = parse_setup(words)
+            elif command == 'go':
+                limits = parse_limits(words)
+                if self.task is not None and not self.task.done():
+                    raise ValueError("already searching")
+                self.cancel = threading.Event()
+                self.task = asyncio.ensure_future(self.go(self.state, limits, self.cancel))
+            elif command == 'stop':
+                if self.cancel is not None:
+                    self.cancel.set()
+            elif command == 'info':
+                self.send(self.server.info())
+            elif command == 'isready':
+                self.send('readyok')
+            elif command == 'quit':
+                return False
+            else:
+                raise ValueError("unknown command {!r}".format(command))
+        except ValueError as error:
+            self.send("error {}".format(error))
+        return True
+
+    async def go(self, state, limits, cancel):
+        move = await self.server.search(state, limits, cancel, self.send)
+        self.send("bestmove {}".format(square_name(move.pair) if move is not None else 'none'))
+
+    async def close(self):
+        """Stops this client's search and waits for it to finish."""
+        if self.task is not None:
+            self.cancel.set()
+            await self.task
+
+
+async def serve_lines(server, reader, send):
+    """Answers the commands read from reader until quit or end of input.
+    Returns True if the client quit."""
+    server.clients += 1
+    session = Session(server, send)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return False
+            if not await session.handle(line.decode().strip()):
+                return True
+    finally:
+        await session.close()
+        server.clients -= 1
+
+
+async def serve_stdin(server):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    def send(line):
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+    return await serve_lines(server, reader, send)
+
+
+async def serve_socket(server, reader, writer):
+    def send(line):
+        if not writer.is_closing():
+            writer.write((line + '\n').encode())
+    try:
+        await serve_lines(server, reader, send)
+    finally:
+        writer.close()
+
+
+async def main_async(args):
+    server = EngineServer(PLAYERS[args.player])
+    handler = lambda reader, writer: serve_socket(server, reader, writer)
+
+    listener = None
+    if args.port is not None:
+        listener = await asyncio.start_server(handler, args.host, args.port)
+        host, port = listener.sockets[0].getsockname()[:2]
+        print("info listening tcp {} {}".format(host, port), flush=True)
+    elif args.unix is not None:
+        listener = await asyncio.start_unix_server(handler, args.unix)
+        print("info listening unix {}".format(args.unix), flush=True)
+
+    # quit on standard input stops the server; if standard input just
+    # closes, the socket is still served
+    if not await serve_stdin(server) and listener is not None:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an engine server.")
+    parser.add_argument('--player', choices=sorted(PLAYERS), default='TournamentPlayer')
+    parser.add_argument('--port', type=int, help="also listen on this TCP port")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--unix', help="also listen on this Unix socket")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+CS 375
+Board symmetries for the Othello board game.
+
+The board has 8 symmetries, numbered 0 to 7. Bit 0 of the number mirrors
+the columns, bit 1 flips the rows and bit 2 reflects in the (0, 0)-(7, 7)
+diagonal, applied in that order; 0 is the identity. Bitboards are mapped
+through precomputed tables with one 64-bit image per row byte, so any
+symmetry costs eight lookups, and squares through per-symmetry square
+tables.
+
+A position's canonical orientation is the image with the smallest
+(black, white) bitboards. Symmetric positions share it, so caches, books
+and training data keyed on it hold one entry for all of them.
+"""
+
+
+def flip_vertical(bits):
+    """bits with the rows in reverse order: (r, c) goes to (7 - r, c)."""
+    return int.from_bytes(bits.to_bytes(8, 'little'), 'big')
+
+
+def mirror_horizontal(bits):
+    """bits with the columns in reverse order: (r, c) goes to (r, 7 - c)."""
+    bits = ((bits >> 1) & 0x5555555555555555) | ((bits & 0x5555555555555555) << 1)
+    bits = ((bits >> 2) & 0x3333333333333333) | ((bits & 0x3333333333333333) << 2)
+    return ((bits >> 4) & 0x0F0F0F0F0F0F0F0F) | ((bits & 0x0F0F0F0F0F0F0F0F) << 4)
+
+
+def flip_diagonal(bits):
+    """bits reflected in the (0, 0)-(7, 7) diagonal: (r, c) goes to (c, r)."""
+    t = 0x0F0F0F0F00000000 & (bits ^ (bits << 28))
+    bits ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (bits ^ (bits << 14))
+    bits ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (bits ^ (bits << 7))
+    return bits ^ t ^ (t >> 7)
+
+
+def _compose(bits, index):
+    """symmetry(bits, index) from the three reflections; used to build the
+    tables."""
+    if index & 1:
+        bits = mirror_horizontal(bits)
+    if index & 2:
+        bits = flip_vertical(bits)
+    if index & 4:
+        bits = flip_diagonal(bits)
+    return bits
+
+# SYMMETRY_BYTES[index][r][byte] is the image under symmetry index of the
+# squares set in byte on row r
+SYMMETRY_BYTES = [[[_compose(byte << (r * 8), index) for byte in range(256)]
+                   for r in range(8)] for index in range(8)]
+
+# SYMMETRY_SQUARES[index][sq] is the square sq goes to under symmetry index,
+# and INVERSE_SYMMETRY_SQUARES[index] undoes it
+SYMMETRY_SQUARES = [[_compose(1 << sq, index).bit_length() - 1 for sq in range(64)]
+                    for index in range(8)]
+INVERSE_SYMMETRY_SQUARES = [[table.index(sq) for sq in range(64)] for table in SYMMETRY_SQUARES]
+
+# INVERSE[index] is the symmetry that undoes symmetry index
+INVERSE = [SYMMETRY_SQUARES.index(table) for table in INVERSE_SYMMETRY_SQUARES]
+
+
+def symmetry(bits, index):
+    """bits under symmetry index."""
+    rows = SYMMETRY_BYTES[index]
+    return (rows[0][bits & 0xFF] | rows[1][bits >> 8 & 0xFF] |
+            rows[2][bits >> 16 & 0xFF] | rows[3][bits >> 24 & 0xFF] |
+            rows[4][bits >> 32 & 0xFF] | rows[5][bits >> 40 & 0xFF] |
+            rows[6][bits >> 48 & 0xFF] | rows[7][bits >> 56])
+
+
+def symmetries(bits):
+    """symmetry(bits, index) for every index, in order. Sharing the
+    reflections between images is cheaper than eight table lookups."""
+    mirrored = mirror_horizontal(bits)
+    images = [bits, mirrored, flip_vertical(bits), flip_vertical(mirrored)]
+    return images + [flip_diagonal(image) for image in images]
+
+
+def canonical_boards(black, white):
+    """The canonical orientation of a position as (black, white, index),
+    where index is the symmetry that maps the position onto it."""
+    best, best_index = (black, white), 0
+    for index, boards in enumerate(zip(symmetries(black), symmetries(white))):
+        if boards < best:
+            best, best_index = boards, index
+    return best[0], best[1], best_index
+
+
+def transform_pair(pair, index):
+    """The (r, c) that pair goes to under symmetry index."""
+    sq = SYMMETRY_SQUARES[index][pair[0] * 8 + pair[1]]
+    return sq >> 3, sq & 7
+
+
+def self_symmetries(black, white):
+    """The symmetries, other than the identity, that map the position onto
+    itself."""
+    return [index for index, boards in enumerate(zip(symmetries(black), symmetries(white)))
+            if index and boards == (black, white)]
+
+
+def distinct_moves(black, white, moves):
+    """moves without those that lead to the same position as an earlier
+    one up to a symmetry of the position itself. Searching only these
+    gives the same result, since the rest are mirror images."""
+    indexes = self_symmetries(black, white)
+    if not indexes:
+        return moves
+
+    seen, distinct = set(), []
+    for move in moves:
+        r, c = move.pair
+        sq = r * 8 + c
+        if sq not in seen:
+            distinct.append(move)
+            seen.update(SYMMETRY_SQUARES[index][sq] for index in indexes)
+            seen.add(sq)
+    return distinct
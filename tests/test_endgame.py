@@ -0,0 +1,65 @@
+"""
+CS 375
+Tests for the exact endgame solver against brute-force minimax.
+"""
+
+import random, unittest
+
+from endgame import EndgameSolver
+from othello import OthelloState
+
+
+def minimax(state):
+    """Final disc difference for the player to move with best play, found
+    by trying every line."""
+    if state.game_over():
+        return state.count(state.current) - state.count(
+            'white' if state.current == 'black' else 'black')
+    best = None
+    for move in state.available_moves():
+        child = state.apply_move(move)
+        score = minimax(child)
+        if child.current != state.current:
+            score = -score
+        best = score if best is None else max(best, score)
+    return best
+
+
+def endgame_positions(count, empties, seed=375):
+    """count positions from random games with at most empties squares empty
+    and moves left for the player to move."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = OthelloState()
+        target = rng.randint(1, empties)
+        while not state.game_over() and state.count('empty') > target:
+            state = state.apply_move(rng.choice(state.available_moves()))
+        if not state.game_over():
+            positions.append(state)
+    return positions
+
+
+class EndgameSolverTest(unittest.TestCase):
+    def test_matches_minimax(self):
+        solver = EndgameSolver()
+        for state in endgame_positions(40, 8):
+            expected = minimax(state)
+            result = solver.solve(state)
+            self.assertEqual(result.score, expected, str(state))
+            self.assertIn(result.move, state.available_moves())
+
+            # The move played must keep the score
+            child = state.apply_move(result.move)
+            score = minimax(child)
+            self.assertEqual(score if child.current == state.current else -score, expected)
+
+    def test_win_loss_draw(self):
+        solver = EndgameSolver(exact=False)
+        for state in endgame_positions(20, 8, seed=376):
+            expected = minimax(state)
+            self.assertEqual(solver.solve(state).score, (expected > 0) - (expected < 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+CS 375
+Round trips through the game record, opening book and pattern file
+formats.
+"""
+
+import copy, os, pickle, random, shutil, tempfile, unittest
+
+from bitboard import BitboardState
+from book import OpeningBook, book_entry, position_key, write_book
+from othello import OthelloState
+from patterns import PatternEvaluator, PATTERNS, default_tables, load_tables
+from records import GameArchive, GameRecord, GameWriter, read_games
+
+
+def random_record(rng, name):
+    """A GameRecord of a random game to the end."""
+    state = OthelloState()
+    moves = bytearray()
+    while not state.game_over():
+        move = rng.choice(state.available_moves())
+        moves.append(move.pair[0] * 8 + move.pair[1])
+        state = state.apply_move(move)
+    return GameRecord(name, 'RandomPlayer', moves, state.winner(), rng.random() * 150, 12.5), state
+
+
+class FileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+class RecordsTest(FileTest):
+    def test_round_trip(self):
+        rng = random.Random(375)
+        games = [random_record(rng, 'Player{}'.format(i)) for i in range(20)]
+        records = [record for record, final in games]
+
+        # A game from a position other than the start
+        midgame = games[0][0]
+        start = list(midgame.states())[10]
+        records.append(GameRecord('a', 'b', midgame.moves[10:], midgame.winner,
+                                  start=start.bitboards() + (start.current, start.move_number)))
+
+        path = self.path('games.othg')
+        with GameWriter(path) as writer:
+            for record in records[:10]:
+                writer.write(record)
+        with GameWriter(path) as writer:
+            for record in records[10:]:
+                writer.write(record)
+
+        self.assertEqual(list(read_games(path)), records)
+        archive = GameArchive(path)
+        try:
+            self.assertEqual(len(archive), len(records))
+            self.assertEqual([archive[i] for i in range(len(archive))], records)
+            self.assertEqual(archive[-1], records[-1])
+        finally:
+            archive.close()
+
+        # Without the index the games are found by scanning
+        os.remove(path + '.idx')
+        archive = GameArchive(path)
+        try:
+            self.assertEqual(list(archive), records)
+        finally:
+            archive.close()
+
+        for (record, final), stored in zip(games, records):
+            self.assertEqual(list(stored.states())[-1].bitboards(), final.bitboards())
+
+
+class BookTest(FileTest):
+    def test_round_trip(self):
+        rng = random.Random(376)
+        entries, expected = {}, []
+        state = BitboardState()
+        for _ in range(12):
+            move = rng.choice(state.available_moves())
+            key, entry = book_entry(state, move.pair, rng.randint(-500, 500), rng.randint(0, 99))
+            entries[key] = entry
+            expected.append((state, move))
+            state = state.apply_move(move)
+
+        path = self.path('book.bin')
+        write_book(path, entries)
+        book = OpeningBook(path)
+        try:
+            self.assertEqual(len(book), len(entries))
+            for position, move in expected:
+                self.assertEqual(book.lookup(position), move)
+
+                # Any orientation of the position finds the same move, or one
+                # the position's own symmetries make equivalent
+                after = position_key(position.apply_move(move))[0]
+                for index in range(8):
+                    image = position.transform(index)
+                    found = book.lookup(image)
+                    self.assertEqual(position_key(image.apply_move(found))[0], after)
+            self.assertIsNone(book.lookup(state))
+
+            copied = pickle.loads(pickle.dumps(book))
+            self.assertEqual(copied.lookup(expected[0][0]), expected[0][1])
+            self.assertEqual(copied.lookups, book.lookups + 1)
+            copied.close()
+        finally:
+            book.close()
+
+
+class PatternFileTest(FileTest):
+    def test_round_trip(self):
+        tables = default_tables()
+        tables.feature_weights = (11, -7, 3)
+        path = self.path('patterns.bin')
+        tables.write(path)
+
+        loaded = load_tables(path)
+        self.assertEqual(loaded.scale, tables.scale)
+        self.assertEqual(loaded.feature_weights, tables.feature_weights)
+        for name, instances in PATTERNS:
+            self.assertEqual(list(loaded.tables[name]), list(tables.tables[name]))
+
+        evaluator, reference = PatternEvaluator(loaded), PatternEvaluator(tables)
+        copied = copy.deepcopy(evaluator)
+        state = OthelloState()
+        for _ in range(20):
+            if state.game_over():
+                break
+            self.assertEqual(evaluator(state), reference(state))
+            self.assertEqual(copied(state), reference(state))
+            state = state.apply_move(state.available_moves()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+CS 375
+Tests for the game states: perft counts, make/unmake, Zobrist hashing and
+agreement between OthelloState, BitboardState and PatternState.
+"""
+
+import random, unittest
+
+from benchmarks import perft, START_PERFT, POSITIONS
+from bitboard import BitboardState
+from othello import OthelloState
+from patterns import PatternState, compute_codes
+
+STATE_CLASSES = [OthelloState, BitboardState, PatternState]
+
+
+def random_states(games, seed=375):
+    """Generates an OthelloState for every position of games random games."""
+    rng = random.Random(seed)
+    for _ in range(games):
+        state = OthelloState()
+        yield state
+        while not state.game_over():
+            state = state.apply_move(rng.choice(state.available_moves()))
+            yield state
+
+
+def convert(state, cls):
+    """state, an OthelloState, as an instance of cls."""
+    return state.copy() if cls is OthelloState else cls.from_state(state)
+
+
+def snapshot(state):
+    """Everything a make/unmake pair must put back."""
+    result = (state.bitboards(), state.current, state.move_number, state.zobrist,
+              sorted(move.pair for move in state.available_moves()))
+    if isinstance(state, PatternState):
+        result += (list(state.codes),)
+    return result
+
+
+class PerftTest(unittest.TestCase):
+    def test_start_position(self):
+        for cls in STATE_CLASSES:
+            for depth in range(6):
+                self.assertEqual(perft(cls(), depth), START_PERFT[depth], (cls.__name__, depth))
+
+    def test_fixed_positions(self):
+        for name, black, white, current, move_number, depth, leaves in POSITIONS:
+            if leaves > 200000:
+                continue
+            state = OthelloState.from_bitboards(black, white, current, move_number)
+            for cls in STATE_CLASSES:
+                self.assertEqual(perft(convert(state, cls), depth), leaves, (cls.__name__, name))
+
+
+class MakeUnmakeTest(unittest.TestCase):
+    def test_unmake_restores_state(self):
+        for state in random_states(20):
+            if state.game_over():
+                continue
+            for cls in STATE_CLASSES:
+                position = convert(state, cls)
+                before = snapshot(position)
+                for move in position.available_moves():
+                    undo = position.make_move(move)
+                    self.assertEqual(position.bitboards(), state.apply_move(move).bitboards())
+                    position.unmake_move(undo)
+                    self.assertEqual(snapshot(position), before, cls.__name__)
+
+    def test_zobrist_is_kept_up_to_date(self):
+        for state in random_states(20, seed=376):
+            self.assertEqual(state.zobrist, state.compute_zobrist())
+            self.assertEqual(BitboardState.from_state(state).zobrist, state.zobrist)
+
+    def test_board_view_writes_update_state(self):
+        state = OthelloState()
+        state.available_moves()
+        state.board[2][3] = 'white'
+        state.board[3][3] = 'black'
+        self.assertEqual(state.available_moves(), state.generate_moves())
+        self.assertEqual(state.zobrist, state.compute_zobrist())
+
+        state.board = [['empty'] * 8 for _ in range(8)]
+        self.assertEqual(state.available_moves(), [])
+        self.assertEqual(state.zobrist, state.compute_zobrist())
+
+
+class AgreementTest(unittest.TestCase):
+    def test_state_classes_agree_on_random_games(self):
+        rng = random.Random(377)
+        for _ in range(30):
+            states = [cls() for cls in STATE_CLASSES]
+            while True:
+                moves = [sorted(move.pair for move in state.available_moves()) for state in states]
+                self.assertTrue(all(m == moves[0] for m in moves))
+                self.assertEqual(len({state.current for state in states}), 1)
+                self.assertEqual(len({state.bitboards() for state in states}), 1)
+                self.assertEqual(len({state.zobrist for state in states}), 1)
+                self.assertEqual(len({state.game_over() for state in states}), 1)
+                if states[0].game_over():
+                    self.assertEqual(len({state.winner() for state in states}), 1)
+                    break
+                move = rng.choice(states[0].available_moves())
+                states = [state.apply_move(move) for state in states]
+                self.assertEqual(states[2].codes, compute_codes(*states[2].bitboards()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+CS 375
+Time management for the Othello search players.
+
+Each move gets a soft budget, which the search should not start a new
+iteration past, and a hard budget, after which the search is aborted. Both
+come from the player's remaining time, the move number and the number of
+empty squares left.
+"""
+
+import time
+
+# Seconds always kept back for process startup and other overhead
+RESERVE_SECONDS = 3.0
+
+# Never plan less than this for a move
+MIN_SECONDS = 0.05
+
+# Moves before this are opening moves and get a smaller share of the clock
+OPENING_MOVES = 10
+
+# Once this few squares are empty the endgame has started
+ENDGAME_EMPTIES = 20
+
+# Branching factor assumed before two iterations have finished
+DEFAULT_BRANCHING = 5.0
+
+
+class TimeManager():
+    """Plans the time for each move and predicts whether another iteration
+    of iterative deepening can finish before the hard budget runs out."""
+
+    def __init__(self, reserve=RESERVE_SECONDS, max_fraction=0.3):
+        self.reserve = reserve
+        self.max_fraction = max_fraction
+
+        self.start_time = None
+        self.soft = None
+        self.hard = None
+        self.deadline = None
+        self.iterations = []
+
+    def budget(self, remaining_time, move_number, empties):
+        """Returns the (soft, hard) seconds to plan for a move."""
+        usable = remaining_time - self.reserve
+        if usable <= MIN_SECONDS:
+            return MIN_SECONDS, MIN_SECONDS
+
+        # Each player makes about half of the remaining moves
+        moves_left = max(1, (empties + 1) // 2)
+        soft = usable / moves_left
+
+        # Opening positions are alike from game to game; the middlegame is
+        # where the extra depth pays off
+        if move_number < OPENING_MOVES:
+            soft *= 0.5
+        elif empties > ENDGAME_EMPTIES:
+            soft *= 1.5
+
+        hard = min(soft * 2.5, usable * self.max_fraction)
+        soft = min(soft, hard)
+        return max(soft, MIN_SECONDS), max(hard, MIN_SECONDS)
+
+    def start(self, remaining_time, move_number, empties):
+        """Starts the clock for a move."""
+        self.soft, self.hard = self.budget(remaining_time, move_number, empties)
+        self.start_time = time.time()
+        self.deadline = self.start_time + self.hard
+        self.iterations = []
+
+    def elapsed(self):
+        """Seconds since start."""
+        return time.time() - self.start_time
+
+    def iteration_done(self, depth, nodes):
+        """Records that the iteration to depth finished after searching
+        nodes nodes in total since start."""
+        self.iterations.append((depth, self.elapsed(), nodes))
+
+    def branching_factor(self):
+        """Effective branching factor of the last two iterations."""
+        if len(self.iterations) < 2:
+            return DEFAULT_BRANCHING
+        previous_nodes = self.iterations[-2][2]
+        if len(self.iterations) > 2:
+            previous_nodes -= self.iterations[-3][2]
+        last_nodes = self.iterations[-1][2] - self.iterations[-2][2]
+        if previous_nodes <= 0:
+            return DEFAULT_BRANCHING
+        return max(1.0, last_nodes / previous_nodes)
+
+    def predicted_next(self):
+        """Predicted seconds for the next iteration."""
+        if not self.iterations:
+            return 0.0
+        last_time = self.iterations[-1][1]
+        if len(self.iterations) > 1:
+            last_time -= self.iterations[-2][1]
+        return last_time * self.branching_factor()
+
+    def can_start_next(self):
+        """True if the next iteration is worth starting: the soft budget is
+        not used up and the next iteration is predicted to finish in time."""
+        elapsed = self.elapsed()
+        if elapsed >= self.soft:
+            return False
+        return elapsed + self.predicted_next() <= self.hard
+
+
+class PonderClock():
+    """Stands in for a TimeManager in a search on the opponent's time. It
+    sets no limit until attach() hands it the clock of the move the search
+    turned out to be for; from then on that clock decides."""
+
+    def __init__(self):
+        self.clock = None
+        self.deadline = None
+
+    def attach(self, clock):
+        """Puts the search on clock, a started TimeManager."""
+        self.clock = clock
+        self.deadline = clock.deadline
+
+    def iteration_done(self, depth, nodes):
+        if self.clock is not None:
+            self.clock.iteration_done(depth, nodes)
+
+    def can_start_next(self):
+        return self.clock is None or self.clock.can_start_next()
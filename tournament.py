@@ -0,0 +1,211 @@
+"""
+CS 375
+Headless match runner for the Othello players.
+
+Plays many games between two registered players across a pool of worker
+processes, with logging off, and reports the result as win/draw/loss, the
+Elo difference with a confidence interval, and games per second. Games come
+in pairs that start from the same opening with the colors swapped, so an
+unbalanced opening favors neither player.
+
+    python tournament.py TournamentPlayer AlphaBetaPlayer -n 200 --seconds 10
+    python tournament.py PatternPlayer TournamentPlayer --book openings.txt
+
+A book file has one opening per line, written as squares like "f5 d6 c3",
+where the letter is the column and the digit the row counting from 1.
+Without a book, openings are random moves from a fixed seed. With
+--record every game is appended to a game archive; see records.py.
+"""
+
+import argparse, math, multiprocessing, os, random, time
+
+from othello import OthelloGame, OthelloMove, OthelloState
+from project2 import (RandomPlayer, AlphaBetaPlayer, OldTournamentPlayer,
+                      TournamentPlayer, PatternPlayer, MCTSPlayer)
+from records import GameRecorder, GameWriter
+
+# Player configurations the runner can play, by name. Games run in
+# play_game in pool workers, where a pondering player would think on its
+# opponent's clock, so PonderingPlayer isn't one of them
+PLAYERS = {
+    'RandomPlayer': RandomPlayer,
+    'AlphaBetaPlayer': AlphaBetaPlayer,
+    'OldTournamentPlayer': OldTournamentPlayer,
+    'TournamentPlayer': TournamentPlayer,
+    'PatternPlayer': PatternPlayer,
+    'MCTSPlayer': MCTSPlayer,
+}
+
+# z for a two-sided 95% confidence interval
+Z_95 = 1.96
+
+
+def parse_opening(line):
+    """The (r, c) pairs of an opening written like "f5 d6 c3"."""
+    pairs = []
+    for word in line.split():
+        pairs.append((int(word[1]) - 1, ord(word[0].lower()) - ord('a')))
+    return pairs
+
+
+def read_book(path):
+    """The openings in the book file at path, skipping blank lines and
+    lines starting with #."""
+    with open(path) as f:
+        return [parse_opening(line) for line in f
+                if line.strip() and not line.startswith('#')]
+
+
+def random_openings(count, plies, seed):
+    """count openings of plies random moves each."""
+    rng = random.Random(seed)
+    openings = []
+    while len(openings) < count:
+        state, pairs = OthelloState(), []
+        for _ in range(plies):
+            if state.game_over():
+                break
+            move = rng.choice(state.available_moves())
+            state = state.apply_move(move)
+            pairs.append(move.pair)
+        openings.append(pairs)
+    return openings
+
+
+def opening_state(pairs):
+    """The state after playing the opening pairs from the start."""
+    state = OthelloState()
+    for r, c in pairs:
+        state = state.apply_move(OthelloMove(r, c, state.current))
+    return state
+
+
+def play_one(task):
+    """Plays one game in a worker process. task is (index, first, second,
+    opening, first_is_black, seconds, seed, record). Returns (index, score,
+    game record or None) with the score for the first player: 1 for a win,
+    0.5 for a draw and 0 for a loss."""
+    index, first, second, opening, first_is_black, seconds, seed, record = task
+    random.seed(seed + index)
+    OthelloGame.SECONDS_PER_PLAYER = seconds
+
+    if first_is_black:
+        black, white = PLAYERS[first]('black'), PLAYERS[second]('white')
+    else:
+        black, white = PLAYERS[second]('black'), PLAYERS[first]('white')
+
+    recorder = GameRecorder() if record else None
+    game = OthelloGame(black, white, verbose=False, recorder=recorder)
+    game.board = opening_state(opening)
+    winner = game.play_game()
+
+    if winner == 'draw':
+        score = 0.5
+    else:
+        score = 1.0 if (winner == 'black') == first_is_black else 0.0
+    return index, score, recorder.record if record else None
+
+
+def elo(score):
+    """Elo difference for an expected score between 0 and 1."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+class MatchResult():
+    """Wins, draws and losses of the first player, and the seconds the
+    match took."""
+
+    def __init__(self, wins, draws, losses, elapsed):
+        self.wins = wins
+        self.draws = draws
+        self.losses = losses
+        self.elapsed = elapsed
+
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def score(self):
+        """Average score per game for the first player."""
+        return (self.wins + 0.5 * self.draws) / self.games()
+
+    def elo(self):
+        """Returns (elo, low, high): the Elo difference and its 95%
+        confidence interval."""
+        n = self.games()
+        score = self.score()
+        variance = (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 +
+                    self.losses * score ** 2) / n
+        margin = Z_95 * math.sqrt(variance / n)
+        return elo(score), elo(score - margin), elo(score + margin)
+
+    def games_per_second(self):
+        return self.games() / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        value, low, high = self.elo()
+        return ("{} games: +{} ={} -{}  score {:0.3f}\n"
+                "Elo {:+0.1f}  95% CI [{:+0.1f}, {:+0.1f}]\n"
+                "{:0.1f}s, {:0.2f} games/s").format(
+                    self.games(), self.wins, self.draws, self.losses, self.score(),
+                    value, low, high, self.elapsed, self.games_per_second())
+
+
+def run_match(first, second, games, openings, seconds=150.0, workers=None, seed=375,
+              writer=None):
+    """Plays games games of first against second, both names in PLAYERS,
+    and returns a MatchResult for first. Each opening is played twice with
+    the colors swapped; openings are reused in order as needed. Finished
+    games are written to writer, a GameWriter, if given."""
+    tasks = []
+    for index in range(games):
+        opening = openings[index // 2 % len(openings)] if openings else []
+        tasks.append((index, first, second, opening, index % 2 == 0, seconds, seed,
+                      writer is not None))
+
+    start_time = time.time()
+    scores = [None] * games
+    with multiprocessing.Pool(workers or os.cpu_count() or 1) as pool:
+        for index, score, record in pool.imap_unordered(play_one, tasks):
+            scores[index] = score
+            if writer is not None:
+                writer.write(record)
+
+    return MatchResult(scores.count(1.0), scores.count(0.5), scores.count(0.0),
+                       time.time() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a match between two players.")
+    parser.add_argument('first', choices=sorted(PLAYERS))
+    parser.add_argument('second', choices=sorted(PLAYERS))
+    parser.add_argument('-n', '--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--seconds', type=float, default=OthelloGame.SECONDS_PER_PLAYER,
+                        help="clock for each player for each game")
+    parser.add_argument('--book', help="file of openings to start games from")
+    parser.add_argument('--plies', type=int, default=4,
+                        help="length of random openings when there is no book")
+    parser.add_argument('--seed', type=int, default=375)
+    parser.add_argument('--record', help="game archive to append the games to")
+    args = parser.parse_args()
+
+    if args.book:
+        openings = read_book(args.book)
+    else:
+        openings = random_openings((args.games + 1) // 2, args.plies, args.seed)
+
+    writer = GameWriter(args.record) if args.record else None
+    try:
+        result = run_match(args.first, args.second, args.games, openings,
+                           args.seconds, args.workers, args.seed, writer)
+    finally:
+        if writer is not None:
+            writer.close()
+    print("{} vs {}".format(args.first, args.second))
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
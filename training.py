@@ -0,0 +1,342 @@
+"""
+CS 375
+Self-play training data and evaluation fitting for the Othello players.
+
+Positions come from self-play games played in a pool of worker processes:
+a few random opening moves, then a greedy one-ply player on the current
+square weights that plays a random move some of the time. Every position
+after the opening is labelled with the final disc difference of its game.
+Games are played on bitboards and streamed to a file as they finish,
+little-endian:
+
+    4s    magic b'OTHD'
+    H     format version, 1
+    then one record per position until the end of the file:
+    Q black bitboard, Q white bitboard, B 1 if white is to move,
+    b final disc difference for black
+
+The file is read back as a NumPy memmap, so fitting works on millions of
+positions in chunks without loading them all. The square table is fitted
+by least squares, one weight for each group of squares that the board
+symmetries map onto each other, accumulating the normal equations chunk by
+chunk. The pattern tables and the mobility, potential mobility and frontier
+weights of patterns.py are fitted by gradient descent. Fitted values are in
+hundredths of a disc, and are written to the files the players load at
+startup (see evaluation.py and patterns.py):
+
+    python training.py generate positions.othd --games 20000
+    python training.py fit positions.othd --weights weights.bin --patterns patterns.bin
+
+Fitting needs NumPy; generating does not.
+"""
+
+import argparse, multiprocessing, os, random, struct, time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bitboard import move_mask, flip_mask, neighbors, popcount, BLACK_START, WHITE_START, FULL
+from evaluation import SquareTableEvaluator, TOURNAMENT_WEIGHTS, load_weights, write_weights
+from mcts import random_square
+from patterns import PATTERNS, INSTANCES, PatternTables, DEFAULT_SCALE
+from symmetry import SYMMETRY_SQUARES
+
+MAGIC = b'OTHD'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+POSITION = struct.Struct('<QQBb')
+
+# Evaluation units per disc of the fitted weights
+DISC_UNIT = 100
+
+# SQUARE_GROUPS[sq] is the group of sq: squares the symmetries map onto
+# each other share a group, and a weight
+_smallest = [min(SYMMETRY_SQUARES[index][sq] for index in range(8)) for sq in range(64)]
+SQUARE_GROUPS = [sorted(set(_smallest)).index(smallest) for smallest in _smallest]
+GROUPS = max(SQUARE_GROUPS) + 1
+
+
+def self_play(task):
+    """Pool worker: plays one game. task is (seed, weights, random_plies,
+    epsilon). Returns the game's positions packed as records."""
+    seed, weights, random_plies, epsilon = task
+    rng = random.Random(seed)
+    score = SquareTableEvaluator(weights).score_bits
+
+    player, opponent, white = BLACK_START, WHITE_START, 0
+    positions = []
+    ply = 0
+    while True:
+        moves = move_mask(player, opponent)
+        if not moves:
+            moves = move_mask(opponent, player)
+            if not moves:
+                break
+            player, opponent, white = opponent, player, 1 - white
+
+        if ply >= random_plies:
+            positions.append((opponent, player, 1) if white else (player, opponent, 0))
+
+        if ply < random_plies or rng.random() < epsilon:
+            sq = random_square(moves, rng)
+        else:
+            # The move leaving the best score for the player making it
+            best = None
+            while moves:
+                bit = moves & -moves
+                moves ^= bit
+                flips = flip_mask(player, opponent, bit.bit_length() - 1)
+                value = score(player | flips | bit, opponent & ~flips)
+                if best is None or value > best:
+                    best, sq = value, bit.bit_length() - 1
+
+        bit = 1 << sq
+        flips = flip_mask(player, opponent, sq)
+        player, opponent, white = opponent & ~flips, player | flips | bit, 1 - white
+        ply += 1
+
+    black, other = (opponent, player) if white else (player, opponent)
+    result = popcount(black) - popcount(other)
+    return b''.join(POSITION.pack(b, w, side, result) for b, w, side in positions)
+
+
+def generate(path, games, weights=TOURNAMENT_WEIGHTS, random_plies=8, epsilon=0.1,
+             workers=None, seed=375):
+    """Plays games self-play games across workers processes and appends
+    their positions to the file at path. Returns the number of positions
+    written."""
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    if not new:
+        check_header(path)
+
+    tasks = [(seed * 1000003 + index, weights, random_plies, epsilon) for index in range(games)]
+    written = 0
+    with open(path, 'ab') as f:
+        if new:
+            f.write(HEADER.pack(MAGIC, VERSION))
+        with multiprocessing.Pool(workers or os.cpu_count() or 1) as pool:
+            for records in pool.imap(self_play, tasks, chunksize=16):
+                f.write(records)
+                written += len(records) // POSITION.size
+    return written
+
+
+def check_header(path):
+    with open(path, 'rb') as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("{} is not a version {} position file".format(path, VERSION))
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("fitting evaluation weights needs NumPy")
+
+
+def read_positions(path):
+    """The positions in the file at path as a structured NumPy memmap with
+    fields black, white, white_to_move and score."""
+    _require_numpy()
+    check_header(path)
+    dtype = np.dtype([('black', '<u8'), ('white', '<u8'), ('white_to_move', 'u1'),
+                      ('score', 'i1')])
+    count = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
+
+
+def unpack_squares(bitboards):
+    """An (N, 64) array of 0/1 squares for N bitboards."""
+    boards = np.ascontiguousarray(bitboards, dtype='<u8').reshape(-1, 1)
+    return np.unpackbits(boards.view(np.uint8), axis=1, bitorder='little')
+
+
+def popcount_array(bitboards):
+    """The number of set bits of each of an array of bitboards."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int64)
+    return unpack_squares(bitboards).sum(axis=1, dtype=np.int64)
+
+
+def chunks(positions, chunk_size):
+    for start in range(0, len(positions), chunk_size):
+        yield positions[start:start + chunk_size]
+
+
+def fit_square_table(positions, ridge=1.0, chunk_size=200000):
+    """Least-squares square weights for the final disc difference, as an
+    8x8 table for SquareTableEvaluator."""
+    _require_numpy()
+    grouping = np.zeros((64, GROUPS))
+    grouping[np.arange(64), SQUARE_GROUPS] = 1
+
+    xtx = np.zeros((GROUPS, GROUPS))
+    xty = np.zeros(GROUPS)
+    for part in chunks(positions, chunk_size):
+        discs = (unpack_squares(part['black']).astype(np.float64) -
+                 unpack_squares(part['white']))
+        x = discs @ grouping
+        xtx += x.T @ x
+        xty += x.T @ part['score'].astype(np.float64)
+    fitted = np.linalg.solve(xtx + ridge * np.eye(GROUPS), xty)
+
+    # SquareTableEvaluator adds one for every disc itself
+    return [[int(round(fitted[SQUARE_GROUPS[r * 8 + c]] * DISC_UNIT)) - 1 for c in range(8)]
+            for r in range(8)]
+
+
+def pattern_inputs(part, offsets):
+    """(table indexes, features) for a chunk of positions: the index of
+    every instance's code in the flat parameter vector, and the mobility,
+    potential mobility and frontier differences for black."""
+    black = np.ascontiguousarray(part['black'], dtype=np.uint64)
+    white = np.ascontiguousarray(part['white'], dtype=np.uint64)
+    black_squares, white_squares = unpack_squares(black), unpack_squares(white)
+    digits = black_squares.astype(np.int32) + 2 * white_squares.astype(np.int32)
+
+    indexes = np.empty((len(part), len(INSTANCES)), dtype=np.int64)
+    for index, (name, sqs) in enumerate(INSTANCES):
+        powers = 3 ** np.arange(len(sqs), dtype=np.int64)
+        indexes[:, index] = digits[:, sqs] @ powers + offsets[index]
+
+    # The bitboard functions work unchanged on arrays of uint64
+    empty = ~(black | white) & np.uint64(FULL)
+    features = np.stack([
+        popcount_array(move_mask(black, white)) - popcount_array(move_mask(white, black)),
+        popcount_array(empty & neighbors(white)) - popcount_array(empty & neighbors(black)),
+        popcount_array(black & neighbors(empty)) - popcount_array(white & neighbors(empty)),
+    ], axis=1).astype(np.float64)
+    return indexes, features
+
+
+def fit_patterns(positions, epochs=10, rate=0.5, scale=DEFAULT_SCALE, chunk_size=200000):
+    """Pattern tables and feature weights for the final disc difference, by
+    gradient descent. Each step moves every table entry by rate times the
+    mean error of the positions that used it. Returns (PatternTables,
+    root mean square error in discs for each epoch)."""
+    _require_numpy()
+    sizes = [3 ** len(instances[0]) for name, instances in PATTERNS]
+    starts = dict(zip([name for name, instances in PATTERNS], np.cumsum([0] + sizes[:-1])))
+    offsets = [starts[name] for name, sqs in INSTANCES]
+    parameters = np.zeros(sum(sizes))
+    feature_weights = np.zeros(3)
+
+    errors = []
+    for epoch in range(epochs):
+        total = 0.0
+        # Inputs are rebuilt chunk by chunk each epoch, so only one chunk's
+        # are in memory. Targets are in stored units: evaluations are
+        # stored values times scale
+        for part in chunks(positions, chunk_size):
+            indexes, features = pattern_inputs(part, offsets)
+            targets = part['score'] * (DISC_UNIT / scale)
+            residuals = targets - parameters[indexes].sum(axis=1) - features @ feature_weights
+            total += float(residuals @ residuals)
+
+            # Split each step between the instances sharing the position
+            sums = np.bincount(indexes.ravel(), weights=np.repeat(residuals, indexes.shape[1]),
+                               minlength=len(parameters))
+            counts = np.bincount(indexes.ravel(), minlength=len(parameters))
+            parameters += rate * sums / np.maximum(counts, 1) / indexes.shape[1]
+            feature_weights += rate * (features.T @ residuals) / np.maximum(
+                (features * features).sum(axis=0), 1)
+        errors.append((total / max(len(positions), 1)) ** 0.5 * scale / DISC_UNIT)
+
+    stored = np.clip(np.rint(parameters), -0x8000, 0x7FFF).astype(int).tolist()
+    tables = {name: stored[starts[name]:starts[name] + size]
+              for (name, instances), size in zip(PATTERNS, sizes)}
+    weights = [int(round(w)) for w in np.clip(feature_weights, -0x8000, 0x7FFF)]
+    return PatternTables(tables, scale, weights), errors
+
+
+def pattern_error(positions, tables, chunk_size=200000):
+    """Root mean square error in discs of PatternTables on positions."""
+    _require_numpy()
+    flat = np.concatenate([np.asarray(tables.tables[name], dtype=np.float64)
+                           for name, instances in PATTERNS])
+    starts = np.cumsum([0] + [len(tables.tables[name]) for name, instances in PATTERNS][:-1])
+    offsets = [starts[[name for name, instances in PATTERNS].index(name)]
+               for name, sqs in INSTANCES]
+    feature_weights = np.array(tables.feature_weights, dtype=np.float64)
+    total = 0.0
+    for part in chunks(positions, chunk_size):
+        indexes, features = pattern_inputs(part, offsets)
+        predictions = (flat[indexes].sum(axis=1) + features @ feature_weights) * tables.scale
+        residuals = predictions / DISC_UNIT - part['score']
+        total += float(residuals @ residuals)
+    return (total / max(len(positions), 1)) ** 0.5
+
+
+def square_table_error(positions, weights, chunk_size=200000):
+    """Root mean square error in discs of a square table on positions."""
+    _require_numpy()
+    vector = np.array([w + 1 for row in weights for w in row], dtype=np.float64)
+    total = 0.0
+    for part in chunks(positions, chunk_size):
+        discs = (unpack_squares(part['black']).astype(np.float64) -
+                 unpack_squares(part['white']))
+        residuals = discs @ vector / DISC_UNIT - part['score']
+        total += float(residuals @ residuals)
+    return (total / max(len(positions), 1)) ** 0.5
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate self-play positions and fit "
+                                                 "evaluation weights.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help="append self-play positions to a file")
+    generate_parser.add_argument('positions')
+    generate_parser.add_argument('--games', type=int, default=10000)
+    generate_parser.add_argument('--weights', help="square weights the games are played "
+                                                   "with (default: the tournament weights)")
+    generate_parser.add_argument('--random-plies', type=int, default=8)
+    generate_parser.add_argument('--epsilon', type=float, default=0.1,
+                                 help="chance of a random move after the opening")
+    generate_parser.add_argument('--workers', type=int, default=None)
+    generate_parser.add_argument('--seed', type=int, default=375)
+
+    fit_parser = commands.add_parser('fit', help="fit weights to a position file")
+    fit_parser.add_argument('positions')
+    fit_parser.add_argument('--weights', help="write fitted square weights here")
+    fit_parser.add_argument('--patterns', help="write fitted pattern tables here")
+    fit_parser.add_argument('--epochs', type=int, default=10)
+    fit_parser.add_argument('--rate', type=float, default=0.5)
+    fit_parser.add_argument('--ridge', type=float, default=1.0)
+    fit_parser.add_argument('--holdout', type=float, default=0.1,
+                            help="fraction of positions, from the end, kept out of the fit")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.command == 'generate':
+        weights = load_weights(args.weights) if args.weights else TOURNAMENT_WEIGHTS
+        written = generate(args.positions, args.games, weights, args.random_plies,
+                           args.epsilon, args.workers, args.seed)
+        print("{} positions from {} games in {:0.1f}s".format(
+            written, args.games, time.time() - start_time))
+        return
+
+    positions = read_positions(args.positions)
+    split = len(positions) - int(len(positions) * args.holdout)
+    train, test = positions[:split], positions[split:]
+    print("{} positions, {} held out".format(len(positions), len(test)))
+
+    if args.weights:
+        weights = fit_square_table(train, args.ridge)
+        write_weights(args.weights, weights)
+        print("Square table: error {:0.2f} discs, {:0.2f} held out; written to {}".format(
+            square_table_error(train, weights), square_table_error(test, weights), args.weights))
+    if args.patterns:
+        tables, errors = fit_patterns(train, args.epochs, args.rate)
+        tables.write(args.patterns)
+        print("Patterns: error {:0.2f} discs, {:0.2f} held out, after {} epochs; "
+              "written to {}".format(pattern_error(train, tables), pattern_error(test, tables),
+                                     len(errors), args.patterns))
+    print("{:0.1f}s".format(time.time() - start_time))
+
+
+if __name__ == "__main__":
+    main()
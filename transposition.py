@@ -0,0 +1,116 @@
+"""
+CS 375
+Transposition table for the Othello search players.
+"""
+
+# How a stored value relates to the true value of the position
+EXACT = 0   # The value is exact
+LOWER = 1   # The search failed high; the true value is at least this
+UPPER = 2   # The search failed low; the true value is at most this
+
+# Rough number of bytes one stored entry costs in CPython: the slot pointer,
+# the entry tuple and the ints inside it.
+ENTRY_BYTES = 160
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def bound_flag(value, alpha, beta):
+    """The kind of bound a search returning value inside the window
+    (alpha, beta) has established."""
+    if value <= alpha:
+        return UPPER
+    if value >= beta:
+        return LOWER
+    return EXACT
+
+
+class TranspositionTable():
+    """A fixed-size hash table from Zobrist keys to search results.
+
+    Each slot holds one entry (key, depth, value, flag, move, generation).
+    When two positions map to the same slot the deeper search is kept,
+    unless the old entry is left over from an earlier search."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        # Use the largest power of two number of slots that fits in max_bytes
+        size = 1
+        while size * 2 * ENTRY_BYTES <= max_bytes:
+            size *= 2
+
+        self.max_bytes = max_bytes
+        self.size = size
+        self.mask = size - 1
+        self.slots = [None] * size
+        self.generation = 0
+
+        # Statistics
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def __getstate__(self):
+        """Only the configuration is pickled; copying a full table to another
+        process costs more than refilling it."""
+        return {'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state['max_bytes'])
+
+    def __len__(self):
+        return self.size - self.slots.count(None)
+
+    def clear(self):
+        """Removes every entry."""
+        self.slots = [None] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        """Marks the start of a new search so entries from older searches
+        are replaced first."""
+        self.generation += 1
+
+    def probe(self, key):
+        """Returns the entry stored for key, or None."""
+        self.probes += 1
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, value, flag, move=None):
+        """Stores the result of a depth deep search of the position key.
+        move is the best move found, as an (r, c) pair, if any."""
+        index = key & self.mask
+        old = self.slots[index]
+
+        # Depth-preferred replacement
+        if old is None or old[5] != self.generation or depth >= old[1]:
+            if move is None and old is not None and old[0] == key:
+                move = old[4]
+            self.slots[index] = (key, depth, value, flag, move, self.generation)
+            self.stores += 1
+
+    def lookup(self, key, depth, alpha, beta):
+        """Probes key for a search depth deep with window (alpha, beta).
+        Returns (value, alpha, beta, move): value is not None if the stored
+        result already decides the node, alpha and beta are narrowed by any
+        stored bound, and move is the stored best move or None."""
+        entry = self.probe(key)
+        if entry is None:
+            return None, alpha, beta, None
+
+        move = entry[4]
+        if entry[1] >= depth:
+            value, flag = entry[2], entry[3]
+            if flag == EXACT:
+                return value, alpha, beta, move
+            if flag == LOWER:
+                alpha = max(alpha, value)
+            elif flag == UPPER:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value, alpha, beta, move
+
+        return None, alpha, beta, move